@@ -1,45 +1,610 @@
+import contextvars
+import functools
+import http.cookiejar
+import logging
 import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
 import requests
+import urllib3
+
+from ajerlo import balancer, ledger, metrics, profiling, ratelimit, tracing
+
+logger = logging.getLogger(__name__)
 
 # ----------------------------
 # KUBERNETES SERVICE ENDPOINTS
 # ----------------------------
-ACCOUNTS_API = os.getenv(
+# One URL, a comma-separated list of replicas or dns+http://... (see ajerlo.balancer)
+ACCOUNTS_API = balancer.register("accounts", os.getenv(
     "ACCOUNTS_API_BASE",
     "http://accounts-service:8001/api"
-)
+))
 
-RENTALS_API = os.getenv(
+RENTALS_API = balancer.register("rentals", os.getenv(
     "RENTALS_API_BASE",
     "http://rentals-service:8002/api/rentals"
-)
+))
+
+
+USER_LOOKUP_TTL = int(os.getenv("USER_LOOKUP_TTL", "300"))
+USER_LOOKUP_CACHE_SIZE = int(os.getenv("USER_LOOKUP_CACHE_SIZE", "2048"))
+USER_LOOKUP_BATCH = 200  # matches the accounts service per-call limit
+# Shared with the accounts service, which only answers users/lookup to callers presenting it
+SERVICE_TOKEN = os.getenv("SERVICE_TOKEN", "")
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "10"))
+UPSTREAM_MSGPACK = os.getenv("UPSTREAM_MSGPACK", "true").lower() in {"1", "true", "yes", "on"}
+
+try:
+    import msgpack
+except ImportError:  # optional: the services answer JSON
+    msgpack = None
+
+MSGPACK = "application/msgpack"
+
+
+class _NoCookies(http.cookiejar.DefaultCookiePolicy):
+    """The session is shared by every user's calls, so it must never keep cookies."""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class _UpstreamAdapter(balancer.BalancingAdapter):
+    """Tells the upstream how long this attempt will wait for its response.
+
+    The rentals service drops requests whose budget ran out before it got to
+    them (``rentals_service.admission``). The budget is relative, so the two
+    hosts' clocks need not agree.
+    """
+
+    def send(self, request, timeout=None, **kwargs):
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        if read_timeout:
+            request.headers["X-Request-Budget-Ms"] = str(int(read_timeout * 1000))
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+def _session():
+    session = requests.Session()
+    session.cookies.set_policy(_NoCookies())
+    # Compact upstream payloads (see the services' payloads module): MessagePack
+    # when available, compressed with whatever urllib3 can decode (zstd, gzip)
+    session.headers["Accept"] = (
+        f"{MSGPACK}, application/json;q=0.9" if msgpack is not None and UPSTREAM_MSGPACK else "application/json"
+    )
+    session.headers["Accept-Encoding"] = urllib3.util.make_headers(accept_encoding=True)["accept-encoding"]
+    # One connection pool per endpoint host, UPSTREAM_POOL_SIZE connections each
+    adapter = _UpstreamAdapter(pool_connections=16, pool_maxsize=UPSTREAM_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Keep-alive connections to the upstreams, shared by all threads of the process
+_http = _session()
+
+
+def decode(response):
+    """The body of an upstream response, MessagePack or JSON according to its ``Content-Type``."""
+    if msgpack is not None and response.headers.get("Content-Type", "").startswith(MSGPACK):
+        return msgpack.unpackb(response.content, strict_map_key=False)
+    return response.json()
+
+
+def warm_connections():
+    """Open a pooled connection to every upstream endpoint (a ``WARMUP_HOOKS`` entry)."""
+    for name, base in (("accounts", ACCOUNTS_API), ("rentals", RENTALS_API)):
+        for url in balancer.endpoint_urls(name, base):
+            try:
+                _http.head(f"{url}/", headers=_headers(), timeout=2)
+            except requests.RequestException:
+                pass
+
+
+# ----------------------------
+# UPSTREAM READINESS
+# ----------------------------
+UPSTREAM_READY_TTL = float(os.getenv("UPSTREAM_READY_TTL", "2"))
+UPSTREAM_PROBE_TIMEOUT = float(os.getenv("UPSTREAM_PROBE_TIMEOUT", "1"))
+
+
+class UpstreamUnavailable(requests.ConnectionError):
+    """Raised instead of calling an upstream whose ``/readyz`` is failing."""
+
+
+class _Readiness:
+    """The ``/readyz`` state of one upstream, probed at most every ``ttl`` seconds.
+
+    Calls go straight through while the upstream behaves. Once a call cannot
+    connect or times out, every later call first consults the probe and fails
+    immediately with ``UpstreamUnavailable`` until ``/readyz`` answers 200
+    again, instead of each one waiting out its own timeout.
+
+    A balanced upstream is probed on each of its endpoints: it is ready while
+    any of them is, and the balancer ejects the ones that are not.
+    """
+
+    def __init__(self, name, base, ttl=UPSTREAM_READY_TTL):
+        self.name = name
+        self.base = base
+        self.ttl = ttl
+        self.suspect = False
+        self.status = None  # last probe's HTTP status, None if it could not connect
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.status == 200
+
+    def probe(self):
+        """Refresh the cached status if it is older than ``ttl``; returns it."""
+        if time.monotonic() - self._checked < self.ttl:
+            return self.status
+        # One thread probes; the others use the last known status meanwhile.
+        if not self._lock.acquire(blocking=False):
+            return self.status
+        try:
+            self.status = self._probe_endpoints()
+            self._checked = time.monotonic()
+            if self.ready:
+                self.suspect = False
+        finally:
+            self._lock.release()
+        return self.status
+
+    def _probe_endpoints(self):
+        """200 if any endpoint is ready, else the first status answered (None if none answered)."""
+        statuses = []
+        for url in balancer.endpoint_urls(self.name, self.base):
+            try:
+                status = _http.get(f"{url}/readyz", headers=_headers(), timeout=UPSTREAM_PROBE_TIMEOUT).status_code
+            except requests.RequestException:
+                status = None
+            if status != 200:
+                balancer.eject(self.name, url)
+            statuses.append(status)
+        if 200 in statuses:
+            return 200
+        return next((status for status in statuses if status is not None), None)
+
+    def before_call(self):
+        if self.suspect and self.probe() != 200:
+            raise UpstreamUnavailable(f"{self.name} is not ready")
+
+    def call_failed(self):
+        if not self.suspect:
+            self.suspect = True
+            self._checked = 0.0
+
+
+_upstreams = {"accounts": _Readiness("accounts", ACCOUNTS_API), "rentals": _Readiness("rentals", RENTALS_API)}
+
+
+def upstream_readiness():
+    """A ``READINESS_CHECKS`` entry: every upstream answers its ``/readyz``.
+
+    Reachability is what counts (a 503 from an upstream still passes): taking
+    the gateway out of rotation would not help while an upstream's own
+    dependency is down, and the fail-fast above already avoids the timeouts.
+    """
+    detail = {}
+    for name, upstream in _upstreams.items():
+        status = upstream.probe()
+        detail[name] = "unreachable" if status is None else ("ready" if status == 200 else f"not ready ({status})")
+    return all(value != "unreachable" for value in detail.values()), detail
+
+
+# ----------------------------
+# TIMEOUTS, CIRCUIT BREAKERS AND RETRIES
+# ----------------------------
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "0.5"))
+# (connect, read) seconds per endpoint class; every function declares its class in @_timed(kind=...)
+TIMEOUTS = {
+    "read": (UPSTREAM_CONNECT_TIMEOUT, float(os.getenv("UPSTREAM_READ_TIMEOUT", "3"))),
+    "write": (UPSTREAM_CONNECT_TIMEOUT, float(os.getenv("UPSTREAM_WRITE_TIMEOUT", "8"))),
+    "upload": (UPSTREAM_CONNECT_TIMEOUT, float(os.getenv("UPSTREAM_UPLOAD_TIMEOUT", "30"))),
+}
+# "read" calls (GETs) are idempotent and retried; so are calls declared
+# @_timed(idempotency_key=True), which send one Idempotency-Key for all their attempts
+RETRY_KINDS = {"read"}
+RETRY_STATUSES = {502, 503, 504}
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "1"))
+UPSTREAM_RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.05"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATIO = float(os.getenv("BREAKER_ERROR_RATIO", "0.5"))
+BREAKER_SLOW_RATIO = float(os.getenv("BREAKER_SLOW_RATIO", "0.8"))
+BREAKER_SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_SECONDS", "2"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "5"))
+BREAKER_HALF_OPEN_SUCCESSES = int(os.getenv("BREAKER_HALF_OPEN_SUCCESSES", "2"))
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class _CircuitBreaker:
+    """Per-upstream circuit breaker over the last ``BREAKER_WINDOW`` calls.
+
+    *closed*: calls go through. Once at least ``BREAKER_MIN_CALLS`` are in the
+    window and the share of failures (connection errors, timeouts, 5xx)
+    reaches ``BREAKER_ERROR_RATIO``, or the share slower than
+    ``BREAKER_SLOW_SECONDS`` reaches ``BREAKER_SLOW_RATIO``, it opens.
+
+    *open*: calls raise ``CircuitOpen`` at once for ``BREAKER_OPEN_SECONDS``,
+    then it turns half-open.
+
+    *half_open*: one trial call at a time goes through, the rest are rejected.
+    ``BREAKER_HALF_OPEN_SUCCESSES`` good trials close it; a bad one reopens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    STATES = (CLOSED, OPEN, HALF_OPEN)
+
+    def __init__(self, name):
+        self.name = name
+        self.state = self.CLOSED
+        self._window = deque(maxlen=BREAKER_WINDOW)  # (failed, slow) per call
+        self._opened_at = 0.0
+        self._trial = False
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Return True if this call is a half-open trial; raise ``CircuitOpen`` if it may not run."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < BREAKER_OPEN_SECONDS:
+                    raise CircuitOpen(f"{self.name} circuit is open")
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._trial:
+                    raise CircuitOpen(f"{self.name} circuit is half-open, trial call in progress")
+                self._trial = True
+                return True
+            return False
+
+    def record(self, trial, failed, slow):
+        with self._lock:
+            if trial:
+                self._trial = False
+                if self.state != self.HALF_OPEN:
+                    return
+                if failed or slow:
+                    self._open()
+                else:
+                    self._successes += 1
+                    if self._successes >= BREAKER_HALF_OPEN_SUCCESSES:
+                        self._transition(self.CLOSED)
+                return
+            if self.state != self.CLOSED:
+                return  # a call that started before the breaker opened
+            self._window.append((failed, slow))
+            calls = len(self._window)
+            if calls < BREAKER_MIN_CALLS:
+                return
+            failures = sum(1 for f, _ in self._window if f)
+            slows = sum(1 for _, s in self._window if s)
+            if failures / calls >= BREAKER_ERROR_RATIO or slows / calls >= BREAKER_SLOW_RATIO:
+                self._open()
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._transition(self.OPEN)
+        logger.warning("Circuit for %s opened for %ss", self.name, BREAKER_OPEN_SECONDS)
+
+    def _transition(self, state):
+        self.state = state
+        self._window.clear()
+        self._successes = 0
+        metrics.record_circuit_transition(self.name, state)
+
+
+class _RetryBudget:
+    """Retries allowed across all upstream calls of the process.
+
+    Every call deposits ``ratio`` of a token and ``min_per_second`` tokens
+    accrue over time (up to ``cap``); a retry spends one. So retries stay
+    around ``ratio`` of the traffic and cannot multiply load during an outage.
+    """
+
+    def __init__(self, ratio, min_per_second, cap=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.cap = cap
+        self._tokens = cap
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, extra=0.0):
+        now = time.monotonic()
+        self._tokens = min(self.cap, self._tokens + (now - self._updated) * self.min_per_second + extra)
+        self._updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+_breakers = {name: _CircuitBreaker(name) for name in _upstreams}
+_retry_budget = _RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_SECOND)
+
+
+def _breaker_states():
+    for name, breaker in _breakers.items():
+        for state in _CircuitBreaker.STATES:
+            yield "gauge", "upstream_circuit_state", (("upstream", name), ("state", state)), int(breaker.state == state)
+
+
+metrics.registry.add_collector(_breaker_states)
+
+
+def _failure(exc=None, result=None):
+    """Whether an outcome counts against the upstream: no response, or a 5xx."""
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(exc, "response", None) if exc is not None else result
+    return isinstance(response, requests.Response) and response.status_code >= 500
+
+
+def _retryable(exc):
+    if isinstance(exc, UpstreamUnavailable):
+        return False
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(exc, "response", None)
+    return isinstance(response, requests.Response) and response.status_code in RETRY_STATUSES
+
+
+class _TTLCache:
+    """Small thread-safe LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize, ttl, name="cache"):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                expires, value = entry
+                if expires < now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                found[key] = value
+        metrics.record_cache(self.name, hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def set_many(self, items):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = (expires, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_user_cache = _TTLCache(USER_LOOKUP_CACHE_SIZE, USER_LOOKUP_TTL, name="user_lookup")
+
+
+class _Flight:
+    __slots__ = ("done", "response", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class _SingleFlight:
+    """Concurrent identical calls share one execution.
+
+    The first caller for a key runs ``fn``; callers arriving while it is in
+    flight wait for it and get the same return value or exception. Nothing is
+    kept once the call completes, so this is deduplication, not a cache.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return ``(result, shared)``; ``shared`` is True for callers that waited."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response, True
+        try:
+            flight.response = fn()
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.response, False
+
+
+_inflight = _SingleFlight()
+# True when the current call's response (or error) came from another caller's request
+_coalesced = contextvars.ContextVar("coalesced", default=False)
+_idempotency_key = contextvars.ContextVar("idempotency_key", default=None)
+UPSTREAM_COALESCE = os.getenv("UPSTREAM_COALESCE", "true").lower() in {"1", "true", "yes", "on"}
+
+
+def _timed(fn=None, *, name=None, kind="write", idempotency_key=False):
+    """Record an upstream call in the metrics, the request's ledger and as a trace span.
+
+    ``kind`` is the endpoint class (``TIMEOUTS``). Calls fail fast while the
+    upstream is known not to be ready (``_Readiness``) or its circuit is open
+    (``_CircuitBreaker``); failed ``read`` calls are retried, with jittered
+    backoff, while the retry budget allows. With ``idempotency_key`` the call
+    gets a fresh ``Idempotency-Key`` (sent by ``_headers``) that its retries
+    reuse, so writes are retried too: the upstream answers a retry of a
+    request it already handled with the stored response.
+    """
+    def decorator(fn):
+        call = name or fn.__name__
+        upstream = call.split("_", 1)[0]
+        readiness, breaker = _upstreams[upstream], _breakers[upstream]
+        retries = UPSTREAM_RETRIES if kind in RETRY_KINDS or idempotency_key else 0
+
+        def attempt(args, kwargs):
+            readiness.before_call()
+            trial = breaker.before_call()
+            start = time.perf_counter()
+            failed = True
+            coalesced = _coalesced.set(False)
+            try:
+                result = fn(*args, **kwargs)
+                # Some helpers hand back the raw response; only 5xx count as failures there.
+                failed = _failure(result=result)
+                return result
+            except Exception as exc:
+                failed = _failure(exc)
+                if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+                    readiness.call_failed()
+                raise
+            finally:
+                # A shared upstream request counts once, for the caller that sent it
+                if trial or not _coalesced.get():
+                    breaker.record(trial, failed, time.perf_counter() - start > BREAKER_SLOW_SECONDS)
+                _coalesced.reset(coalesced)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            ok = False
+            _retry_budget.deposit()
+            key_token = _idempotency_key.set(uuid.uuid4().hex) if idempotency_key else None
+            with tracing.span("upstream", call) as span:
+                try:
+                    for retry in range(retries + 1):
+                        try:
+                            result = attempt(args, kwargs)
+                            break
+                        except requests.RequestException as exc:
+                            if isinstance(exc, UpstreamUnavailable):
+                                reason = "circuit_open" if isinstance(exc, CircuitOpen) else "not_ready"
+                                metrics.record_upstream_rejected(call, reason)
+                                raise
+                            if retry == retries or not _retryable(exc):
+                                raise
+                            if not _retry_budget.withdraw():
+                                metrics.record_upstream_retry(call, "budget_exhausted")
+                                raise
+                            metrics.record_upstream_retry(call, "retried")
+                            time.sleep(random.uniform(0, UPSTREAM_RETRY_BACKOFF * 2 ** retry))
+                    ok = not _failure(result=result)
+                    return result
+                finally:
+                    if key_token is not None:
+                        _idempotency_key.reset(key_token)
+                    elapsed = time.perf_counter() - start
+                    span["ok"] = ok
+                    metrics.record_upstream(call, elapsed, ok)
+                    ledger.record_call(call, elapsed, key=(call, repr(args), repr(sorted(kwargs.items()))))
+        return wrapper
+    return decorator(fn) if fn else decorator
 
 
 def _headers(token=None):
     h = {"Host": "ajerlo.local"}     # <- FIX: never use localhost in Kubernetes
+    h.update(tracing.propagation_headers())
+    h.update(profiling.propagation_headers())
+    h.update(ratelimit.propagation_headers())
+    key = _idempotency_key.get()
+    if key:
+        h["Idempotency-Key"] = key
     if token:
         h["Authorization"] = f"Bearer {token}"
     return h
 
 
+def _anonymous_get(call, url, params=None, timeout=None):
+    """GET a public resource; identical concurrent calls in this worker share one request.
+
+    Only calls without a user token (the response cannot depend on the user)
+    are coalesced, and not while profiling or when the client sent its own
+    trace id: those need their own upstream request. Followers get the
+    leader's ``Response``; each caller decodes it itself, so no one sees
+    another's mutations. Only the leader's request id, parent span and
+    ``X-Forwarded-For`` reach the upstream, and only its outcome counts
+    towards the circuit breaker.
+    """
+    headers = _headers()
+    if not UPSTREAM_COALESCE or profiling.propagation_headers() or tracing.traced_by_client():
+        return _http.get(url, params=params, headers=headers, timeout=timeout)
+    key = (url, tuple(sorted((k, str(v)) for k, v in (params or {}).items())))
+
+    def lead():
+        _coalesced.set(False)
+        return _http.get(url, params=params, headers=headers, timeout=timeout)
+
+    _coalesced.set(True)
+    response, shared = _inflight.do(key, lead)
+    if shared:
+        metrics.record_upstream_coalesced(call)
+    return response
+
+
 # ----------------------------
 # ACCOUNTS SERVICE
 # ----------------------------
+@_timed(kind="read")
 def accounts_me(token):
-    r = requests.get(f"{ACCOUNTS_API}/auth/me/", headers=_headers(token), timeout=10)
+    r = _http.get(f"{ACCOUNTS_API}/auth/me/", headers=_headers(token), timeout=TIMEOUTS["read"])
     r.raise_for_status()
-    return r.json().get("user")
+    return decode(r).get("user")
 
 
+@_timed(kind="write")
 def accounts_login(username, password):
-    r = requests.post(
+    r = _http.post(
         f"{ACCOUNTS_API}/auth/login/",
         json={"username": username, "password": password},
-        timeout=10,
+        timeout=TIMEOUTS["write"],
         headers=_headers(),
     )
     try:
-        data = r.json()
+        data = decode(r)
     except Exception:
         data = None
     if r.status_code != 200:
@@ -47,15 +612,16 @@ def accounts_login(username, password):
     return data, None
 
 
+@_timed(kind="write")
 def accounts_signup(payload):
-    r = requests.post(
+    r = _http.post(
         f"{ACCOUNTS_API}/auth/signup/",
         json=payload,
-        timeout=10,
+        timeout=TIMEOUTS["write"],
         headers=_headers(),
     )
     try:
-        data = r.json()
+        data = decode(r)
     except Exception:
         data = None
     if r.status_code not in (200, 201):
@@ -68,120 +634,185 @@ def accounts_signup(payload):
     return data, None
 
 
+def accounts_users_lookup(token, user_ids):
+    """Return ``{user_id: user_dict}`` for the given ids with one upstream call.
+
+    Ids already in the local TTL cache are served without a request; unknown
+    ids are simply absent from the result.
+    """
+    ids = {int(uid) for uid in user_ids if uid is not None and str(uid).isdigit()}
+    if not ids:
+        return {}
+    found = _user_cache.get_many(ids)
+    missing = sorted(ids - found.keys())
+    for i in range(0, len(missing), USER_LOOKUP_BATCH):
+        fetched = _fetch_users(token, missing[i:i + USER_LOOKUP_BATCH])
+        _user_cache.set_many(fetched)
+        found.update(fetched)
+    return found
+
+
+@_timed(name="accounts_users_lookup", kind="read")
+def _fetch_users(token, chunk):
+    r = _http.get(
+        f"{ACCOUNTS_API}/users/lookup/",
+        params={"ids": ",".join(str(uid) for uid in chunk)},
+        headers={**_headers(token), "X-Service-Token": SERVICE_TOKEN},
+        timeout=TIMEOUTS["read"],
+    )
+    r.raise_for_status()
+    return {int(k): v for k, v in decode(r).get("results", {}).items()}
+
+
 # ----------------------------
 # RENTALS SERVICE
 # ----------------------------
+@_timed(kind="read")
 def rentals_list(params=None, token=None):
-    r = requests.get(f"{RENTALS_API}/cars/", params=params or {}, headers=_headers(token), timeout=10)
+    url = f"{RENTALS_API}/cars/"
+    if token:
+        r = _http.get(url, params=params or {}, headers=_headers(token), timeout=TIMEOUTS["read"])
+    else:
+        r = _anonymous_get("rentals_list", url, params=params or {}, timeout=TIMEOUTS["read"])
     r.raise_for_status()
-    return r.json()
+    return decode(r)
 
 
+@_timed(kind="read")
 def rentals_detail(car_id, token=None):
-    r = requests.get(f"{RENTALS_API}/cars/{car_id}/", headers=_headers(token), timeout=10)
+    url = f"{RENTALS_API}/cars/{car_id}/"
+    if token:
+        r = _http.get(url, headers=_headers(token), timeout=TIMEOUTS["read"])
+    else:
+        r = _anonymous_get("rentals_detail", url, timeout=TIMEOUTS["read"])
     r.raise_for_status()
-    return r.json()
+    return decode(r)
 
 
+@_timed(kind="write", idempotency_key=True)
 def rentals_booking_create(token, payload):
-    r = requests.post(f"{RENTALS_API}/bookings/", json=payload, headers=_headers(token), timeout=10)
+    r = _http.post(f"{RENTALS_API}/bookings/", json=payload, headers=_headers(token), timeout=TIMEOUTS["write"])
     return r
 
 
+@_timed(kind="read")
 def rentals_my_bookings(token):
-    r = requests.get(f"{RENTALS_API}/bookings/mine/", headers=_headers(token), timeout=10)
+    r = _http.get(f"{RENTALS_API}/bookings/mine/", headers=_headers(token), timeout=TIMEOUTS["read"])
     r.raise_for_status()
-    return r.json()["results"]
+    return decode(r)["results"]
 
 
+@_timed(kind="write", idempotency_key=True)
 def rentals_toggle_favorite(token, car_id):
-    r = requests.post(
+    r = _http.post(
         f"{RENTALS_API}/favorites/toggle/",
         json={"car_id": car_id},
         headers=_headers(token),
-        timeout=10
+        timeout=TIMEOUTS["write"]
     )
     return r
 
 
+@_timed(kind="read")
 def rentals_favorites(token):
-    r = requests.get(f"{RENTALS_API}/favorites/", headers=_headers(token), timeout=10)
+    r = _http.get(f"{RENTALS_API}/favorites/", headers=_headers(token), timeout=TIMEOUTS["read"])
     r.raise_for_status()
-    return r.json()["results"]
+    return decode(r)["results"]
 
 
+@_timed(kind="write")
 def rentals_dealer_apply(token, payload):
-    return requests.post(
+    return _http.post(
         f"{RENTALS_API}/dealer/apply/",
         json=payload,
         headers=_headers(token),
-        timeout=10
+        timeout=TIMEOUTS["write"]
     )
 
 
+@_timed(kind="read")
 def rentals_dealer_dashboard(token):
-    r = requests.get(f"{RENTALS_API}/dealer/dashboard/", headers=_headers(token), timeout=10)
+    r = _http.get(f"{RENTALS_API}/dealer/dashboard/", headers=_headers(token), timeout=TIMEOUTS["read"])
     r.raise_for_status()
-    return r.json()
+    return decode(r)
 
 
+@_timed(kind="read")
 def rentals_dealer_car_list(token):
-    r = requests.get(f"{RENTALS_API}/dealer/cars/", headers=_headers(token), timeout=10)
+    r = _http.get(f"{RENTALS_API}/dealer/cars/", headers=_headers(token), timeout=TIMEOUTS["read"])
     r.raise_for_status()
-    return r.json()
+    return decode(r)
 
 
+@_timed(kind="upload", idempotency_key=True)
 def rentals_dealer_car_create(token, payload, files=None):
-    return requests.post(
+    for upload in (files or {}).values():
+        upload.seek(0)  # a retry sends the files again
+    return _http.post(
         f"{RENTALS_API}/dealer/cars/",
         headers=_headers(token),
         data=payload,
         files=files or {},
-        timeout=10
+        timeout=TIMEOUTS["upload"]
+    )
+
+
+@_timed(kind="write")
+def rentals_upload_session_create(token, payload):
+    return _http.post(
+        f"{RENTALS_API}/dealer/uploads/",
+        headers=_headers(token),
+        json=payload,
+        timeout=TIMEOUTS["write"]
     )
 
 
+@_timed(kind="upload")
 def rentals_dealer_car_update(token, car_id, payload, files=None):
-    return requests.patch(
+    return _http.patch(
         f"{RENTALS_API}/dealer/cars/{car_id}/",
         headers=_headers(token),
         data=payload,
         files=files or {},
-        timeout=10
+        timeout=TIMEOUTS["upload"]
     )
 
 
+@_timed(kind="write")
 def rentals_dealer_car_delete(token, car_id):
-    return requests.delete(
+    return _http.delete(
         f"{RENTALS_API}/dealer/cars/{car_id}/",
         headers=_headers(token),
-        timeout=10
+        timeout=TIMEOUTS["write"]
     )
 
 
+@_timed(kind="write")
 def rentals_dealer_price(token, car_id, payload):
-    return requests.post(
+    return _http.post(
         f"{RENTALS_API}/dealer/cars/{car_id}/price/",
         headers=_headers(token),
         json=payload,
-        timeout=10
+        timeout=TIMEOUTS["write"]
     )
 
 
+@_timed(kind="read")
 def rentals_dealer_car_bookings(token, car_id):
-    r = requests.get(
+    r = _http.get(
         f"{RENTALS_API}/dealer/cars/{car_id}/bookings/",
         headers=_headers(token),
-        timeout=10
+        timeout=TIMEOUTS["read"]
     )
     r.raise_for_status()
-    return r.json()
+    return decode(r)
 
 
+@_timed(kind="write")
 def rentals_dealer_booking_status(token, booking_id, action):
-    return requests.post(
+    return _http.post(
         f"{RENTALS_API}/dealer/bookings/{booking_id}/status/",
         headers=_headers(token),
         json={"action": action},
-        timeout=10
+        timeout=TIMEOUTS["write"]
     )
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ajerlo.settings')
 
 application = get_asgi_application()
+
+# Imports, templates and validators before the first request; see ajerlo.warmup
+from ajerlo import warmup  # noqa: E402
+
+warmup.warm_process()
@@ -0,0 +1,224 @@
+"""
+Client-side load balancing across the replicas of an upstream (gateway).
+
+An upstream base URL in ``ACCOUNTS_API_BASE`` / ``RENTALS_API_BASE`` can be
+
+* one URL: used as is, nothing here is involved;
+* a comma-separated list of URLs with the same path
+  (``http://10.0.0.5:8000/api,http://10.0.0.6:8000/api``);
+* ``dns+http://<host>:<port>/<path>``: every address ``<host>`` resolves to,
+  re-resolved every ``UPSTREAM_DNS_TTL`` seconds (point it at a headless
+  Kubernetes Service to get one entry per pod).
+
+For the last two ``register()`` returns a logical base URL
+(``http://<upstream>/<path>``) and ``BalancingAdapter``, mounted on
+``api_client``'s session, sends each request to one endpoint:
+
+* ``p2c`` (default): the less loaded of two random endpoints;
+  ``least_outstanding``: the least loaded of all. Load is requests in flight
+  from this worker, ties broken by the latency moving average.
+* After ``UPSTREAM_EJECT_AFTER`` consecutive failures (no response or a 5xx)
+  an endpoint is ejected for ``UPSTREAM_EJECT_SECONDS``, doubling on every
+  repeated ejection up to ``UPSTREAM_EJECT_MAX_SECONDS``; it is re-admitted
+  when that runs out and its first success resets the backoff. If every
+  endpoint is ejected, all of them are used.
+* ``api_client`` probes ``/readyz`` on every endpoint rather than on the
+  logical host, and ejects the endpoints that are not ready (``eject()``).
+
+Per-endpoint latency, outcomes, in-flight requests and ejections are in
+``/metrics``.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+from ajerlo import metrics
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_BALANCER = os.getenv("UPSTREAM_BALANCER", "p2c")
+UPSTREAM_DNS_TTL = float(os.getenv("UPSTREAM_DNS_TTL", "10"))
+UPSTREAM_EJECT_AFTER = int(os.getenv("UPSTREAM_EJECT_AFTER", "3"))
+UPSTREAM_EJECT_SECONDS = float(os.getenv("UPSTREAM_EJECT_SECONDS", "5"))
+UPSTREAM_EJECT_MAX_SECONDS = float(os.getenv("UPSTREAM_EJECT_MAX_SECONDS", "60"))
+EWMA_WEIGHT = 0.2
+
+metrics.registry.describe("upstream_endpoint_duration_seconds", "histogram",
+                          "Upstream responses by endpoint (time to headers).", metrics.LATENCY_BUCKETS)
+metrics.registry.describe("upstream_endpoint_requests_total", "counter", "Upstream requests by endpoint and outcome.")
+metrics.registry.describe("upstream_endpoint_in_flight", "gauge", "Upstream requests in flight by endpoint.")
+metrics.registry.describe("upstream_endpoint_ejected", "gauge", "Worker processes that currently eject the endpoint.")
+metrics.registry.describe("upstream_endpoint_ejections_total", "counter", "Endpoint ejections after failures.")
+
+
+class Endpoint:
+    def __init__(self, upstream, url):
+        parts = urlsplit(url)
+        self.upstream = upstream
+        self.scheme, self.netloc = parts.scheme, parts.netloc
+        self.labels = (("upstream", upstream), ("endpoint", self.netloc))
+        self.in_flight = 0
+        self.ewma = 0.0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"{self.scheme}://{self.netloc}"
+
+    def available(self, now):
+        return self.ejected_until <= now
+
+    def load(self):
+        return (self.in_flight, self.ewma)
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+        metrics.registry.gauge_add("upstream_endpoint_in_flight", 1, self.labels)
+
+    def finished(self, seconds, ok):
+        metrics.registry.gauge_add("upstream_endpoint_in_flight", -1, self.labels)
+        metrics.registry.observe("upstream_endpoint_duration_seconds", seconds, self.labels)
+        metrics.registry.inc("upstream_endpoint_requests_total", self.labels + (("outcome", "ok" if ok else "error"),))
+        with self._lock:
+            self.in_flight -= 1
+            self.ewma = seconds if not self.ewma else (1 - EWMA_WEIGHT) * self.ewma + EWMA_WEIGHT * seconds
+            if ok:
+                self.failures = 0
+                self.ejections = 0
+                return
+            self.failures += 1
+            if self.failures < UPSTREAM_EJECT_AFTER:
+                return
+        self.eject()
+
+    def eject(self):
+        """Take the endpoint out of rotation, for longer on every repeated ejection."""
+        with self._lock:
+            if not self.available(time.monotonic()):
+                return
+            eject_for = min(UPSTREAM_EJECT_SECONDS * 2 ** self.ejections, UPSTREAM_EJECT_MAX_SECONDS)
+            self.ejections += 1
+            self.failures = 0
+            self.ejected_until = time.monotonic() + eject_for
+        metrics.registry.inc("upstream_endpoint_ejections_total", self.labels)
+        logger.warning("Ejected %s endpoint %s for %ss", self.upstream, self.netloc, eject_for)
+
+
+class Balancer:
+    """The endpoints of one upstream, from a static list or DNS."""
+
+    def __init__(self, name, urls=(), dns=None):
+        self.name = name
+        self.dns = dns  # (scheme, host, port) to re-resolve, or None
+        self.endpoints = [Endpoint(name, url) for url in urls]
+        self._resolved_at = 0.0
+        self._lock = threading.Lock()
+        if dns:
+            self._resolve()
+
+    def _resolve(self):
+        scheme, host, port = self.dns
+        try:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as exc:
+            logger.warning("Could not resolve %s upstream %s: %s", self.name, host, exc)
+            self._resolved_at = time.monotonic()
+            return
+        netlocs = sorted({f"[{info[4][0]}]:{port}" if ":" in info[4][0] else f"{info[4][0]}:{port}" for info in infos})
+        current = {endpoint.netloc: endpoint for endpoint in self.endpoints}
+        # Keep the stats of addresses that are still there
+        self.endpoints = [current.get(netloc) or Endpoint(self.name, f"{scheme}://{netloc}") for netloc in netlocs]
+        self._resolved_at = time.monotonic()
+
+    def pick(self):
+        if self.dns and time.monotonic() - self._resolved_at > UPSTREAM_DNS_TTL and self._lock.acquire(blocking=False):
+            try:
+                self._resolve()
+            finally:
+                self._lock.release()
+        endpoints = self.endpoints
+        if not endpoints:
+            raise requests.ConnectionError(f"No endpoints for upstream {self.name}")
+        now = time.monotonic()
+        candidates = [e for e in endpoints if e.available(now)] or endpoints
+        if UPSTREAM_BALANCER == "least_outstanding" or len(candidates) <= 2:
+            return min(candidates, key=Endpoint.load)
+        return min(random.sample(candidates, 2), key=Endpoint.load)
+
+    def ejected(self):
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            yield endpoint, not endpoint.available(now)
+
+
+_balancers = {}
+
+
+def register(name, spec):
+    """Return the base URL ``api_client`` should use for ``spec`` (see the module docstring)."""
+    spec = spec.strip()
+    if spec.startswith("dns+"):
+        parts = urlsplit(spec[len("dns+"):])
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        _balancers[name] = Balancer(name, dns=(parts.scheme, parts.hostname, port))
+        return urlunsplit((parts.scheme, name, parts.path.rstrip("/"), "", ""))
+    urls = [url.strip() for url in spec.split(",") if url.strip()]
+    if len(urls) == 1:
+        return urls[0]
+    _balancers[name] = Balancer(name, urls=urls)
+    return urlunsplit((urlsplit(urls[0]).scheme, name, urlsplit(urls[0]).path.rstrip("/"), "", ""))
+
+
+def endpoint_urls(name, base):
+    """Every concrete ``scheme://host:port`` behind ``base`` (just ``base``'s own without a balancer)."""
+    if name in _balancers:
+        return [endpoint.url for endpoint in _balancers[name].endpoints]
+    parts = urlsplit(base)
+    return [f"{parts.scheme}://{parts.netloc}"]
+
+
+def eject(name, url):
+    """Eject the endpoint of upstream ``name`` at ``url`` (``scheme://host:port``), if balanced."""
+    for endpoint in getattr(_balancers.get(name), "endpoints", ()):
+        if endpoint.url == url:
+            endpoint.eject()
+
+
+def _ejected_gauges():
+    for balancer in _balancers.values():
+        for endpoint, ejected in balancer.ejected():
+            yield "gauge", "upstream_endpoint_ejected", endpoint.labels, int(ejected)
+
+
+metrics.registry.add_collector(_ejected_gauges)
+
+
+class BalancingAdapter(requests.adapters.HTTPAdapter):
+    """Sends requests for a registered upstream's logical host to one of its endpoints."""
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        balancer = _balancers.get(parts.netloc)
+        if balancer is None:
+            return super().send(request, **kwargs)
+        endpoint = balancer.pick()
+        request.url = urlunsplit((endpoint.scheme, endpoint.netloc, parts.path, parts.query, parts.fragment))
+        endpoint.started()
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = super().send(request, **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            endpoint.finished(time.perf_counter() - start, ok)
@@ -0,0 +1,102 @@
+"""
+Liveness (``/healthz``) and readiness (``/readyz``) endpoints.
+
+``/healthz`` only says the process is serving requests: it touches no
+database or upstream, so a dependency outage never gets a pod restarted.
+
+``/readyz`` answers 200 when the process can do useful work and 503
+otherwise, with one entry per check in the body:
+
+* ``warmup``: this process has run ``warmup.warm_worker()`` (the first probe
+  runs it if the gunicorn hook did not);
+* ``databases``: ``SELECT 1`` on every configured alias. Only the default
+  database is required; a failing replica is reported but the router skips it;
+* ``caches``: a read from every configured cache;
+* the ``READINESS_CHECKS`` callables (dotted paths), e.g. the gateway's
+  upstream reachability. Each returns ``(ok, detail)``.
+
+The result is cached for ``HEALTH_CACHE_SECONDS`` per process so frequent
+probes (and the gateway's own upstream probes) add no database load.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+from . import warmup
+
+_lock = threading.Lock()
+_cached = (0.0, None)  # (expires, (ok, checks))
+
+
+def _warmup():
+    return warmup.is_warm(), "warm" if warmup.is_warm() else "cold"
+
+
+def _databases():
+    ok, detail = True, {}
+    for alias in connections:
+        if connections[alias].settings_dict["ENGINE"].endswith((".dummy", ".nodb")):
+            continue
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            detail[alias] = "ok"
+        except Exception as exc:
+            detail[alias] = f"error: {exc.__class__.__name__}"
+            ok = ok and alias != DEFAULT_DB_ALIAS
+    return ok, detail
+
+
+def _caches():
+    detail = {}
+    for alias in settings.CACHES:
+        try:
+            caches[alias].get("readyz")
+            detail[alias] = "ok"
+        except Exception as exc:
+            detail[alias] = f"error: {exc.__class__.__name__}"
+    return all(value == "ok" for value in detail.values()), detail
+
+
+def _checks():
+    checks = [("warmup", _warmup), ("databases", _databases), ("caches", _caches)]
+    for path in getattr(settings, "READINESS_CHECKS", []):
+        checks.append((path.rsplit(".", 1)[-1], import_string(path)))
+    return checks
+
+
+def readiness():
+    """``(ok, {check: {"ok": ..., "detail": ...}})``, cached for ``HEALTH_CACHE_SECONDS``."""
+    global _cached
+    expires, result = _cached
+    if result is not None and time.monotonic() < expires:
+        return result
+    with _lock:
+        expires, result = _cached
+        if result is not None and time.monotonic() < expires:
+            return result
+        checks = {}
+        for name, check in _checks():
+            try:
+                ok, detail = check()
+            except Exception as exc:
+                ok, detail = False, f"error: {exc.__class__.__name__}"
+            checks[name] = {"ok": ok, "detail": detail}
+        result = (all(c["ok"] for c in checks.values()), checks)
+        _cached = (time.monotonic() + getattr(settings, "HEALTH_CACHE_SECONDS", 2), result)
+    return result
+
+
+def healthz_view(request):
+    return JsonResponse({"status": "ok"})
+
+
+def readyz_view(request):
+    warmup.warm_worker()  # a no-op once the post_worker_init hook has run
+    ok, checks = readiness()
+    return JsonResponse({"status": "ready" if ok else "unavailable", "checks": checks}, status=200 if ok else 503)
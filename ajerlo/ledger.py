@@ -0,0 +1,147 @@
+"""
+Per-request ledger of upstream calls and template rendering (gateway).
+
+``api_client`` records every upstream call here and ``TimedDjangoTemplates``
+records template render time. At the end of the request the middleware
+
+* adds a ``Server-Timing`` header (one entry per upstream function, plus
+  ``render`` and ``total``) when ``SERVER_TIMING`` is on, and
+* flags pages that go over ``PAGE_UPSTREAM_CALL_BUDGET`` calls or
+  ``PAGE_UPSTREAM_TIME_BUDGET_MS`` of upstream time (per-view overrides in
+  ``PAGE_UPSTREAM_BUDGET_OVERRIDES``), or that repeat the exact same upstream
+  call, with a warning log and the
+  ``upstream_budget_exceeded_total`` metric.
+"""
+import contextvars
+import logging
+import time
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+from ajerlo import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+metrics.registry.describe(
+    "upstream_budget_exceeded_total", "counter", "Pages over their upstream call budget by view and reason."
+)
+
+_ledger = contextvars.ContextVar("upstream_ledger", default=None)
+
+
+class Ledger:
+    __slots__ = ("calls", "render_seconds", "keys", "duplicates")
+
+    def __init__(self):
+        self.calls = {}  # function name -> [count, seconds]
+        self.render_seconds = 0.0
+        self.keys = set()
+        self.duplicates = set()
+
+    @property
+    def call_count(self):
+        return sum(count for count, _ in self.calls.values())
+
+    @property
+    def upstream_seconds(self):
+        return sum(seconds for _, seconds in self.calls.values())
+
+
+def record_call(name, seconds, key=None):
+    ledger = _ledger.get()
+    if ledger is None:
+        return
+    entry = ledger.calls.setdefault(name, [0, 0.0])
+    entry[0] += 1
+    entry[1] += seconds
+    if key is not None:
+        if key in ledger.keys:
+            ledger.duplicates.add(name)
+        ledger.keys.add(key)
+
+
+def record_render(seconds):
+    ledger = _ledger.get()
+    if ledger is not None:
+        ledger.render_seconds += seconds
+
+
+def server_timing(ledger, total_seconds):
+    parts = []
+    for name, (count, seconds) in ledger.calls.items():
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if count > 1:
+            entry += f';desc="{count} calls"'
+        parts.append(entry)
+    if ledger.render_seconds:
+        parts.append(f"render;dur={ledger.render_seconds * 1000:.1f}")
+    parts.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def over_budget(ledger, view):
+    """Reasons (possibly none) this request broke the page budget for ``view``."""
+    override = settings.PAGE_UPSTREAM_BUDGET_OVERRIDES.get(view, {})
+    reasons = []
+    if ledger.call_count > override.get("calls", settings.PAGE_UPSTREAM_CALL_BUDGET):
+        reasons.append("calls")
+    if ledger.upstream_seconds * 1000 > override.get("time_ms", settings.PAGE_UPSTREAM_TIME_BUDGET_MS):
+        reasons.append("latency")
+    if ledger.duplicates:
+        reasons.append("duplicate")
+    return reasons
+
+
+class UpstreamLedgerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        ledger = Ledger()
+        token = _ledger.set(ledger)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _ledger.reset(token)
+        total = time.perf_counter() - start
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = server_timing(ledger, total)
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name if match else "") or "unmatched"
+        reasons = over_budget(ledger, view)
+        if reasons:
+            for reason in reasons:
+                metrics.registry.inc("upstream_budget_exceeded_total", (("view", view), ("reason", reason)))
+            logger.warning(
+                "Upstream budget exceeded on %s (%s) request_id=%s: %d calls, %.0f ms upstream%s; %s",
+                view, ",".join(reasons), tracing.current_request_id(), ledger.call_count,
+                ledger.upstream_seconds * 1000,
+                f", repeated: {','.join(sorted(ledger.duplicates))}" if ledger.duplicates else "",
+                ", ".join(f"{name} x{count}" for name, (count, _) in ledger.calls.items()),
+            )
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            record_render(time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The stock Django backend, with top-level render time recorded in the ledger."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,402 @@
+"""
+Prometheus metrics.
+
+``MetricsMiddleware`` records per-view latency, status codes, in-flight
+requests and SQL count/time per request; ``metrics_view`` serves everything
+at ``/metrics`` in the Prometheus text format.
+
+Recording never takes a lock: every thread writes to its own shard and shards
+are only merged when scraped. Under gunicorn each worker process has its own
+registry; when ``METRICS_DIR`` is set, workers periodically dump their totals
+to ``<METRICS_DIR>/<pid>.json`` and whichever worker answers the scrape adds
+up all files, so the numbers cover the whole service. Counters of workers
+that have exited are kept, their in-flight gauges are dropped.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, asynccontextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class _Shard:
+    __slots__ = ("counters", "gauges", "histograms")
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+
+class Registry:
+    def __init__(self):
+        self._meta = {}
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._collectors = []
+
+    def describe(self, name, kind, help_text, buckets=None):
+        self._meta[name] = (kind, help_text, buckets)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def add_collector(self, fn):
+        """``fn()`` yields ``(kind, name, labels, value)`` read at snapshot time (pool stats etc.)."""
+        self._collectors.append(fn)
+
+    # -- recording (hot path) -------------------------------------------------
+
+    def inc(self, name, labels=(), value=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def gauge_add(self, name, value, labels=()):
+        gauges = self._shard().gauges
+        key = (name, labels)
+        gauges[key] = gauges.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        entry = histograms.get(key)
+        if entry is None:
+            entry = histograms[key] = [0] * (len(self._meta[name][2]) + 1) + [0.0]
+        entry[bisect_left(self._meta[name][2], value)] += 1
+        entry[-1] += value
+
+    # -- aggregation ----------------------------------------------------------
+
+    def snapshot(self):
+        """This process's totals as JSON-friendly lists."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        counters, gauges, histograms = {}, {}, {}
+        for shard in shards:
+            # list() copies are atomic under the GIL; values may be a few events stale.
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, value in list(shard.gauges.items()):
+                gauges[key] = gauges.get(key, 0) + value
+            for key, entry in list(shard.histograms.items()):
+                merged = histograms.get(key)
+                histograms[key] = list(entry) if merged is None else [a + b for a, b in zip(merged, entry)]
+        for collector in self._collectors:
+            for kind, name, labels, value in collector():
+                target = counters if kind == "counter" else gauges
+                target[(name, labels)] = target.get((name, labels), 0) + value
+        return {
+            "pid": os.getpid(),
+            "counters": [[n, list(map(list, l)), v] for (n, l), v in counters.items()],
+            "gauges": [[n, list(map(list, l)), v] for (n, l), v in gauges.items()],
+            "histograms": [[n, list(map(list, l)), v] for (n, l), v in histograms.items()],
+        }
+
+    def flush(self, force=False):
+        """Write this worker's snapshot to METRICS_DIR (at most every METRICS_FLUSH_INTERVAL s)."""
+        directory = getattr(settings, "METRICS_DIR", "")
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < getattr(settings, "METRICS_FLUSH_INTERVAL", 5):
+            return
+        self._last_flush = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, path)
+
+    def collect(self):
+        """Totals across all workers sharing METRICS_DIR (or just this process)."""
+        directory = getattr(settings, "METRICS_DIR", "")
+        snapshots = [self.snapshot()]
+        if directory:
+            self.flush(force=True)
+            snapshots = []
+            for name in os.listdir(directory):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(directory, name)) as fh:
+                        snapshots.append(json.load(fh))
+                except (OSError, ValueError):
+                    continue
+        counters, gauges, histograms = {}, {}, {}
+        for snap in snapshots:
+            alive = _pid_alive(snap["pid"])
+            for n, l, v in snap["counters"]:
+                key = (n, tuple(map(tuple, l)))
+                counters[key] = counters.get(key, 0) + v
+            if alive:
+                for n, l, v in snap["gauges"]:
+                    key = (n, tuple(map(tuple, l)))
+                    gauges[key] = gauges.get(key, 0) + v
+            for n, l, v in snap["histograms"]:
+                key = (n, tuple(map(tuple, l)))
+                merged = histograms.get(key)
+                histograms[key] = v if merged is None else [a + b for a, b in zip(merged, v)]
+        return counters, gauges, histograms
+
+    def render(self):
+        counters, gauges, histograms = self.collect()
+        series = {}
+        for (name, labels), value in [*counters.items(), *gauges.items()]:
+            series.setdefault(name, {})[labels] = [f"{name}{_labels(labels)} {value}"]
+        for (name, labels), entry in histograms.items():
+            lines = series.setdefault(name, {})[labels] = []
+            cumulative = 0
+            for bound, count in zip(self._meta[name][2], entry):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _num(bound)),))} {cumulative}")
+            cumulative += entry[-2]
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {round(entry[-1], 6)}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        out = []
+        for name, (kind, help_text, _) in self._meta.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels in sorted(series.get(name, {})):
+                out.extend(series[name][labels])
+        return "\n".join(out) + "\n"
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _num(value):
+    return repr(float(value))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+registry.describe("http_requests_total", "counter", "Requests by view, method and status code.")
+registry.describe("http_requests_in_flight", "gauge", "Requests currently being handled.")
+registry.describe("http_request_duration_seconds", "histogram", "Request latency by view.", LATENCY_BUCKETS)
+registry.describe("db_queries_per_request", "histogram", "SQL statements per request by view.", QUERY_COUNT_BUCKETS)
+registry.describe("db_query_duration_seconds_total", "counter", "Time spent in SQL by view.")
+registry.describe("upstream_request_duration_seconds", "histogram",
+                  "Upstream service calls by api_client function.", LATENCY_BUCKETS)
+registry.describe("upstream_requests_total", "counter", "Upstream service calls by function and outcome.")
+registry.describe("cache_requests_total", "counter", "Cache lookups by cache and result (hit/miss).")
+registry.describe("upstream_rejected_total", "counter",
+                  "Upstream calls failed fast without a request, by function and reason.")
+registry.describe("upstream_retries_total", "counter",
+                  "Upstream call retries by function and result (retried/budget_exhausted).")
+registry.describe("upstream_coalesced_total", "counter",
+                  "Upstream calls answered by an identical request already in flight, by function.")
+registry.describe("upstream_circuit_state", "gauge",
+                  "Worker processes whose circuit breaker for an upstream is in each state.")
+registry.describe("upstream_circuit_transitions_total", "counter", "Circuit breaker state changes by upstream.")
+
+# psycopg pool stat -> (metric, scale); see DB_POOL in the services' settings
+POOL_GAUGES = {
+    "pool_size": "db_pool_connections",
+    "pool_available": "db_pool_idle_connections",
+    "requests_waiting": "db_pool_waiting_requests",
+}
+POOL_COUNTERS = {
+    "requests_num": ("db_pool_checkouts_total", 1),
+    "requests_wait_ms": ("db_pool_checkout_wait_seconds_total", 0.001),
+    "requests_errors": ("db_pool_checkout_errors_total", 1),
+    "connections_num": ("db_pool_connections_opened_total", 1),
+    "connections_ms": ("db_pool_connect_seconds_total", 0.001),
+    "connections_lost": ("db_pool_connections_lost_total", 1),
+    "returns_bad": ("db_pool_bad_returns_total", 1),
+}
+registry.describe("db_pool_connections", "gauge", "Connections held by the pool (in use + idle).")
+registry.describe("db_pool_idle_connections", "gauge", "Idle connections ready for checkout.")
+registry.describe("db_pool_waiting_requests", "gauge", "Checkouts waiting for a connection.")
+registry.describe("db_pool_checkouts_total", "counter", "Connections handed out by the pool.")
+registry.describe("db_pool_checkout_wait_seconds_total", "counter", "Time spent waiting for a pooled connection.")
+registry.describe("db_pool_checkout_errors_total", "counter", "Checkouts that timed out or failed.")
+registry.describe("db_pool_connections_opened_total", "counter", "New server connections opened by the pool.")
+registry.describe("db_pool_connect_seconds_total", "counter", "Time spent opening server connections.")
+registry.describe("db_pool_connections_lost_total", "counter", "Pooled connections found broken on checkout.")
+registry.describe("db_pool_bad_returns_total", "counter", "Connections returned in a bad state and discarded.")
+
+
+def _pool_stats():
+    # Only pools already opened by this process; reading .pool would open one.
+    for alias in connections:
+        pool = getattr(connections[alias], "_connection_pools", {}).get(alias)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        labels = (("db", alias),)
+        for key, name in POOL_GAUGES.items():
+            yield "gauge", name, labels, stats.get(key, 0)
+        for key, (name, scale) in POOL_COUNTERS.items():
+            yield "counter", name, labels, stats.get(key, 0) * scale
+
+
+registry.add_collector(_pool_stats)
+
+
+# --------------------------------------------------------------------------
+# Helpers used by the rest of the code base
+# --------------------------------------------------------------------------
+
+def record_upstream(call, seconds, ok=True):
+    registry.observe("upstream_request_duration_seconds", seconds, (("call", call),))
+    registry.inc("upstream_requests_total", (("call", call), ("outcome", "ok" if ok else "error")))
+
+
+def record_upstream_rejected(call, reason):
+    registry.inc("upstream_rejected_total", (("call", call), ("reason", reason)))
+
+
+def record_upstream_retry(call, result):
+    registry.inc("upstream_retries_total", (("call", call), ("result", result)))
+
+
+def record_upstream_coalesced(call):
+    registry.inc("upstream_coalesced_total", (("call", call),))
+
+
+def record_circuit_transition(upstream, state):
+    registry.inc("upstream_circuit_transitions_total", (("upstream", upstream), ("state", state)))
+
+
+def record_cache(cache, hits=0, misses=0):
+    if hits:
+        registry.inc("cache_requests_total", (("cache", cache), ("result", "hit")), hits)
+    if misses:
+        registry.inc("cache_requests_total", (("cache", cache), ("result", "miss")), misses)
+
+
+class _QueryTimer:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+def watch_queries(wrapper):
+    """Install ``wrapper`` on every connection of this thread; close the returned stack to remove it."""
+    stack = ExitStack()
+    for conn in connections.all():
+        stack.enter_context(conn.execute_wrapper(wrapper))
+    return stack
+
+
+@asynccontextmanager
+async def awatch_queries(wrapper):
+    """``watch_queries`` for async requests: the async ORM runs queries on the request's
+    thread-sensitive executor thread, so the wrapper is installed (and removed) there."""
+    stack = await sync_to_async(watch_queries)(wrapper)
+    try:
+        yield
+    finally:
+        await sync_to_async(stack.close)()
+
+
+class MetricsMiddleware:
+    """Outermost middleware: latency, status, in-flight and SQL per request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "METRICS_ENABLED", True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _skip(self, request):
+        return not self.enabled or request.path.rstrip("/") == "/metrics"
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self._acall(request)
+        if self._skip(request):
+            return self.get_response(request)
+        registry.gauge_add("http_requests_in_flight", 1)
+        queries = _QueryTimer()
+        start = time.perf_counter()
+        status = 500
+        try:
+            with watch_queries(queries):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            self._record(request, queries, start, status)
+
+    async def _acall(self, request):
+        if self._skip(request):
+            return await self.get_response(request)
+        registry.gauge_add("http_requests_in_flight", 1)
+        queries = _QueryTimer()
+        start = time.perf_counter()
+        status = 500
+        try:
+            async with awatch_queries(queries):
+                response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            self._record(request, queries, start, status)
+
+    def _record(self, request, queries, start, status):
+        elapsed = time.perf_counter() - start
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name if match else "") or "unmatched"
+        registry.gauge_add("http_requests_in_flight", -1)
+        registry.inc("http_requests_total", (("view", view), ("method", request.method), ("status", str(status))))
+        registry.observe("http_request_duration_seconds", elapsed, (("view", view),))
+        registry.observe("db_queries_per_request", queries.count, (("view", view),))
+        if queries.seconds:
+            registry.inc("db_query_duration_seconds_total", (("view", view),), queries.seconds)
+        registry.flush()
+
+
+def metrics_view(request):
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,16 +1,24 @@
+import math
 import os
 import jwt
 from types import SimpleNamespace
+from django.contrib.auth.models import AnonymousUser
+from django.shortcuts import render
 from django.utils.deprecation import MiddlewareMixin
 
+from ajerlo import api_client
+
 
 class GatewayJWTMiddleware(MiddlewareMixin):
     """
     Decode auth_token cookie (JWT from accounts service) and attach a lightweight user object.
     Keeps Django's request.user contract by setting a stub with is_authenticated flag.
+    Without AuthenticationMiddleware (GATEWAY_STATELESS) anonymous requests get AnonymousUser.
     """
 
     def process_request(self, request):
+        if not hasattr(request, "user"):
+            request.user = AnonymousUser()
         token = request.COOKIES.get("auth_token")
         if not token:
             return
@@ -37,3 +45,18 @@ class GatewayJWTMiddleware(MiddlewareMixin):
             user.dealer_profile = SimpleNamespace(active=True)
         request.user = user
         request.auth_claims = payload
+
+
+class UpstreamUnavailableMiddleware(MiddlewareMixin):
+    """
+    Render a 503 page when a view lets ``UpstreamUnavailable`` escape (an upstream
+    is down, not ready, or its circuit is open) instead of a 500. Views that can
+    serve something useful without the upstream (``home``) catch it themselves.
+    """
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, api_client.UpstreamUnavailable):
+            return None
+        response = render(request, "503.html", status=503)
+        response["Retry-After"] = str(math.ceil(api_client.BREAKER_OPEN_SECONDS))
+        return response
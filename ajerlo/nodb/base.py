@@ -0,0 +1,33 @@
+"""
+Database backend for the stateless gateway (``GATEWAY_STATELESS``).
+
+Django's dummy backend with an error that says why: the gateway keeps no data
+of its own, so anything on the request path that reaches the ORM is a bug and
+fails loudly instead of quietly opening a SQLite file.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.dummy import base as dummy
+
+
+def complain(*args, **kwargs):
+    raise ImproperlyConfigured(
+        "The gateway runs without a database (GATEWAY_STATELESS); "
+        "read and write through the accounts and rentals services instead."
+    )
+
+
+class DatabaseOperations(dummy.DatabaseOperations):
+    quote_name = complain
+
+
+class DatabaseWrapper(dummy.DatabaseWrapper):
+    vendor = "nodb"
+    display_name = "none (stateless gateway)"
+
+    _cursor = complain
+    ensure_connection = complain
+    _commit = complain
+    _savepoint_commit = complain
+    _set_autocommit = complain
+
+    ops_class = DatabaseOperations
@@ -0,0 +1,206 @@
+"""
+On-demand request profiling.
+
+A request is profiled when it carries a valid ``X-Profile`` token (see
+``make_token``; signed with ``PROFILING_SECRET``, shared by all services so
+the gateway can pass it on to upstream calls) or is picked by
+``PROFILING_SAMPLE_RATE``. Without a ``PROFILING_SECRET`` no token is valid.
+The request runs under cProfile and tracemalloc, and two files land in
+``PROFILING_DIR``: ``<id>.prof`` (pstats, open it with snakeviz or
+``python -m pstats``) and ``<id>.json`` with the request details, the slowest
+functions and the top allocation sites. Only the newest
+``PROFILING_MAX_FILES`` profiles are kept. ``manage.py profiles`` lists and
+summarises them.
+
+tracemalloc is process-wide, so a worker profiles one request at a time;
+requests arriving meanwhile run normally. Async requests (ASGI) are not
+profiled: cProfile would mix in every other request on the event loop.
+"""
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILE_HEADER = "X-Profile"
+SIGNING_SALT = "profiling"
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 15
+
+_busy = threading.Lock()
+_active_token = contextvars.ContextVar("profile_token", default=None)
+
+
+def _signer():
+    return signing.TimestampSigner(key=settings.PROFILING_SECRET, salt=SIGNING_SALT)
+
+
+def make_token():
+    """A header value that turns on profiling for ``PROFILING_TOKEN_MAX_AGE`` seconds."""
+    if not settings.PROFILING_SECRET:
+        raise ImproperlyConfigured("PROFILING_SECRET is not set; header-triggered profiling is off.")
+    return _signer().sign("profile")
+
+
+def _valid(token):
+    if not settings.PROFILING_SECRET:
+        return False
+    try:
+        return _signer().unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE) == "profile"
+    except signing.BadSignature:
+        return False
+
+
+def propagation_headers():
+    """Pass the caller's profile token on to upstream services."""
+    token = _active_token.get()
+    return {PROFILE_HEADER: token} if token else {}
+
+
+def _top_functions(profiler):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, lineno, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{lineno}({func})",
+            "calls": nc,
+            "own_ms": round(tt * 1000, 3),
+            "cumulative_ms": round(ct * 1000, 3),
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+def _top_allocations(snapshot):
+    rows = []
+    for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        rows.append({"site": f"{frame.filename}:{frame.lineno}", "size_kb": round(stat.size / 1024, 1),
+                     "count": stat.count})
+    return rows
+
+
+def _store(request, response, profiler, snapshot, peak, elapsed, reason):
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    match = getattr(request, "resolver_match", None)
+    view = (match.view_name if match else "") or "unmatched"
+    now = datetime.now(timezone.utc)
+    profile_id = f"{now:%Y%m%dT%H%M%S}-{settings.SERVICE_NAME}-{view.replace(':', '_')}-{os.getpid()}-" \
+                 f"{random.randrange(16 ** 4):04x}"
+    profiler.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+    summary = {
+        "id": profile_id,
+        "service": settings.SERVICE_NAME,
+        "created_at": now.isoformat(),
+        "request_id": getattr(request, "request_id", None),
+        "reason": reason,
+        "method": request.method,
+        "path": request.get_full_path(),
+        "view": view,
+        "status": getattr(response, "status_code", None),
+        "duration_ms": round(elapsed * 1000, 3),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "top_functions": _top_functions(profiler),
+        "top_allocations": _top_allocations(snapshot),
+    }
+    with open(os.path.join(directory, f"{profile_id}.json"), "w") as fh:
+        json.dump(summary, fh, indent=2)
+    _prune(directory)
+    return profile_id
+
+
+def _prune(directory):
+    """Delete the oldest profiles beyond ``PROFILING_MAX_FILES`` (ids sort by time)."""
+    names = sorted(n for n in os.listdir(directory) if n.endswith(".json"))
+    for name in names[:max(len(names) - settings.PROFILING_MAX_FILES, 0)]:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(directory, name[:-len(".json")] + suffix))
+            except FileNotFoundError:
+                pass  # another worker pruned it first
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _reason(self, request):
+        token = request.headers.get(PROFILE_HEADER)
+        if token and _valid(token):
+            return "header"
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate and random.random() < rate:
+            return "sampled"
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        reason = self._reason(request)
+        if reason is None or not _busy.acquire(blocking=False):
+            return self.get_response(request)
+        token = _active_token.set(request.headers.get(PROFILE_HEADER) if reason == "header" else None)
+        started_tracemalloc = not tracemalloc.is_tracing()
+        try:
+            if started_tracemalloc:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            response = None
+            try:
+                response = profiler.runcall(self.get_response, request)
+            finally:
+                elapsed = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                if started_tracemalloc:
+                    tracemalloc.stop()
+                profile_id = _store(request, response, profiler, snapshot, peak, elapsed, reason)
+            response["X-Profile-Id"] = profile_id
+            return response
+        finally:
+            _active_token.reset(token)
+            _busy.release()
+
+
+# --------------------------------------------------------------------------
+# Reading stored profiles (manage.py profiles)
+# --------------------------------------------------------------------------
+
+def list_profiles(limit=None):
+    """Stored profile summaries, newest first."""
+    directory = settings.PROFILING_DIR
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((n for n in os.listdir(directory) if n.endswith(".json")), reverse=True)
+    summaries = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(directory, name)) as fh:
+                summaries.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return summaries
+
+
+def load_profile(profile_id):
+    with open(os.path.join(settings.PROFILING_DIR, f"{profile_id}.json")) as fh:
+        return json.load(fh)
@@ -38,6 +38,8 @@ SITE_TAGLINE = "Book cars with confidence"
 # --- Service endpoints (gateway)
 ACCOUNTS_API_BASE = os.getenv("ACCOUNTS_API_BASE", "http://accounts-service:8001/api")
 RENTALS_API_BASE = os.getenv("RENTALS_API_BASE", "http://rentals-service:8002/api")
+# Public (browser-facing) prefix that nginx proxies to the rentals service's /api/uploads/
+RENTALS_UPLOAD_PUBLIC_BASE = os.getenv("RENTALS_UPLOAD_PUBLIC_BASE", "/uploads")
 ACCOUNTS_JWT_SECRET = os.getenv("ACCOUNTS_JWT_SECRET", SECRET_KEY)
 ACCOUNTS_JWT_ALG = os.getenv("ACCOUNTS_JWT_ALG", "HS256")
 
@@ -55,6 +57,10 @@ INSTALLED_APPS = [
 
 # --- Middleware ---
 MIDDLEWARE = [
+    'ajerlo.metrics.MetricsMiddleware',
+    'ajerlo.tracing.RequestIdMiddleware',
+    'ajerlo.profiling.ProfilingMiddleware',
+    'ajerlo.ledger.UpstreamLedgerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +69,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'ajerlo.middleware.GatewayJWTMiddleware',
+    'ajerlo.middleware.UpstreamUnavailableMiddleware',
+    'ajerlo.ratelimit.RateLimitMiddleware',
 ]
 
 # --- URLs / Templates ---
@@ -70,7 +78,7 @@ ROOT_URLCONF = 'ajerlo.urls'
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "ajerlo.ledger.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -105,11 +113,30 @@ else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
             'OPTIONS': {'timeout': 20},
         }
     }
 
+# --- Stateless mode (ajerlo.stateless) ---
+# No database, sessions or admin: the user comes from the auth_token cookie,
+# flash messages live in a signed cookie and any ORM query raises. Lets gateway
+# pods scale out with nothing shared between them.
+GATEWAY_STATELESS = env_bool("GATEWAY_STATELESS", False)
+if GATEWAY_STATELESS:
+    INSTALLED_APPS = [
+        app for app in INSTALLED_APPS if app not in ('django.contrib.admin', 'django.contrib.sessions')
+    ]
+    MIDDLEWARE = [
+        m for m in MIDDLEWARE
+        if m not in (
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+        )
+    ]
+    DATABASES = {'default': {'ENGINE': 'ajerlo.nodb'}}
+    MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 # --- Password validation (min length = 9) ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -129,11 +156,101 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# The image collects static files at build time with hashed names (STATIC_MANIFEST=true in
+# the Dockerfile); docker/entrypoint.sh only collects again if staticfiles.json is stale.
+# Off by default: with DEBUG off, {% static %} needs the manifest to exist.
+if env_bool("STATIC_MANIFEST", False):
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'},
+    }
 
 # --- Media uploads ---
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# --- Metrics (/metrics, Prometheus text format) ---
+METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+# Shared by all gunicorn workers of this service so a scrape sees their combined totals
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+# --- Upstream ledger (ajerlo.ledger): Server-Timing header and per-page budgets ---
+SERVER_TIMING = env_bool("SERVER_TIMING", DEBUG)
+PAGE_UPSTREAM_CALL_BUDGET = int(os.getenv("PAGE_UPSTREAM_CALL_BUDGET", "5"))
+PAGE_UPSTREAM_TIME_BUDGET_MS = float(os.getenv("PAGE_UPSTREAM_TIME_BUDGET_MS", "300"))
+# Password hashing in the accounts service makes these slow by design
+PAGE_UPSTREAM_BUDGET_OVERRIDES = {
+    "login": {"time_ms": 1500},
+    "signup": {"time_ms": 1500},
+}
+
+# --- Tracing: X-Request-ID propagation and span records (see ajerlo.tracing) ---
+SERVICE_NAME = "gateway"
+TRACE_SPANS = env_bool("TRACE_SPANS", False)
+# Append span records (JSON lines) here; empty = log them to stdout
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_SQL_THRESHOLD_MS = float(os.getenv("TRACE_SQL_THRESHOLD_MS", "25"))
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"raw": {"format": "%(message)s"}},
+    "handlers": {"spans": {"class": "logging.StreamHandler", "formatter": "raw"}},
+    "loggers": {
+        "spans": {"handlers": ["spans"], "level": "INFO", "propagate": False},
+        "ajerlo.warmup": {"handlers": ["spans"], "level": "INFO", "propagate": False},
+    },
+}
+
+# --- Profiling (ajerlo.profiling, manage.py profiles) ---
+PROFILING_DIR = os.getenv("PROFILING_DIR", f"/tmp/profiles/{SERVICE_NAME}")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+# Keep at most this many profiles; older ones are deleted as new ones land
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
+# Shared by all services so the gateway can forward X-Profile upstream.
+# Empty (the default) turns header-triggered profiling off.
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILING_TOKEN_MAX_AGE = int(os.getenv("PROFILING_TOKEN_MAX_AGE", "3600"))
+
+# --- Start-up warm-up (ajerlo.warmup, gunicorn.conf.py) ---
+STARTUP_WARMUP = env_bool("STARTUP_WARMUP", True)
+# Run in every worker after its database connections are opened
+WARMUP_HOOKS = ["ajerlo.api_client.warm_connections"]
+
+# --- Health endpoints (ajerlo.health): /healthz and /readyz ---
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "2"))
+READINESS_CHECKS = ["ajerlo.api_client.upstream_readiness"]
+
+# --- Rate limiting (ajerlo.ratelimit): token buckets per client and route class ---
+RATE_LIMIT_ENABLED = env_bool("RATE_LIMIT_ENABLED", True)
+# Requests per second and burst per client; override with RATE_LIMIT_<CLASS>="rate,burst"
+RATE_LIMITS = {
+    name: tuple(float(v) for v in os.getenv(f"RATE_LIMIT_{name.upper()}", default).split(","))
+    for name, default in {"browse": "5,40", "booking": "0.5,10", "dealer_write": "1,20", "auth": "0.1,5"}.items()
+}
+RATE_LIMIT_ROUTES = {
+    "home": "browse",
+    "car_list": "browse",
+    "car_detail": "browse",
+    "POST create_booking": "booking",
+    "POST toggle_favorite": "booking",
+    "POST add_car": "dealer_write",
+    "POST dealer_apply": "dealer_write",
+    "POST dealer_add_car": "dealer_write",
+    "POST dealer_upload_session": "dealer_write",
+    "POST dealer_update_price": "dealer_write",
+    "POST dealer_edit_car": "dealer_write",
+    "POST dealer_delete_car": "dealer_write",
+    "POST dealer_update_booking_status": "dealer_write",
+    "POST login": "auth",
+    "POST signup": "auth",
+}
+# "ajerlo.ratelimit.CacheStore" shares the buckets through RATE_LIMIT_CACHE (e.g. Redis)
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "ajerlo.ratelimit.LocalStore")
+RATE_LIMIT_CACHE = os.getenv("RATE_LIMIT_CACHE", "default")
+# Proxies in front of the gateway that append to X-Forwarded-For (1 behind nginx or the k8s ingress)
+RATE_LIMIT_NUM_PROXIES = int(os.getenv("RATE_LIMIT_NUM_PROXIES", "0"))
+
 # --- Defaults ---
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,47 @@
+"""
+Stateless gateway mode (``GATEWAY_STATELESS``).
+
+In this mode the gateway has no database: the user comes from the
+``auth_token`` cookie, flash messages live in a signed cookie and the
+database is the ``ajerlo.nodb`` backend, which raises on any query. Pods then
+share nothing and can be scaled out freely.
+
+``verify()`` runs when the apps load (any ``manage.py`` command, every
+gunicorn worker) and refuses to start if a setting would still put a database
+or a session store on the request path.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+NODB_ENGINE = "ajerlo.nodb"
+STATEFUL_APPS = ("django.contrib.admin", "django.contrib.sessions")
+STATEFUL_MIDDLEWARE = (
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+)
+COOKIE_MESSAGES = "django.contrib.messages.storage.cookie.CookieStorage"
+
+
+def problems():
+    """What keeps a stateless gateway from being stateless; empty otherwise."""
+    if not getattr(settings, "GATEWAY_STATELESS", False):
+        return []
+    found = []
+    engines = {alias: db.get("ENGINE") for alias, db in settings.DATABASES.items()}
+    if any(engine != NODB_ENGINE for engine in engines.values()):
+        found.append(f"DATABASES must all use {NODB_ENGINE}, got {engines}.")
+    for app in STATEFUL_APPS:
+        if app in settings.INSTALLED_APPS:
+            found.append(f"{app} needs a database; remove it from INSTALLED_APPS.")
+    for middleware in STATEFUL_MIDDLEWARE:
+        if middleware in settings.MIDDLEWARE:
+            found.append(f"{middleware} reads the session store; remove it from MIDDLEWARE.")
+    if getattr(settings, "MESSAGE_STORAGE", None) != COOKIE_MESSAGES:
+        found.append(f"MESSAGE_STORAGE must be {COOKIE_MESSAGES} (the default falls back to sessions).")
+    return found
+
+
+def verify():
+    found = problems()
+    if found:
+        raise ImproperlyConfigured("GATEWAY_STATELESS: " + " ".join(found))
@@ -4,9 +4,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rentals.views import home
+from ajerlo.metrics import metrics_view
+from ajerlo.health import healthz_view, readyz_view
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
+    path("healthz", healthz_view, name="healthz"),
+    path("readyz", readyz_view, name="readyz"),
 
     # Home page
     path("", home, name="home"),
@@ -18,5 +22,9 @@ urlpatterns = [
     path("accounts/", include("accounts.urls")),
 ]
 
+# Legacy admin over the local database; not available in GATEWAY_STATELESS mode
+if "django.contrib.admin" in settings.INSTALLED_APPS:
+    urlpatterns.insert(0, path("admin/", admin.site.urls))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,156 @@
+"""
+Start-up warm-up.
+
+The work a fresh process would otherwise do on its first requests is done up
+front, in two phases:
+
+* ``warm_process()`` (from ``wsgi.py``/``asgi.py``; with gunicorn's
+  ``preload_app`` that is the master, so workers inherit the result): import
+  the URLconf and every view, compile all templates into the cached loader and
+  build the password validators (``CommonPasswordValidator`` reads its
+  20k-word list) and hashers.
+* ``warm_worker()`` (gunicorn's ``post_worker_init`` hook, see
+  ``gunicorn.conf.py``): things that must not cross a fork. It opens the
+  database connections (or pools) and runs the ``WARMUP_HOOKS`` callables,
+  e.g. the gateway's upstream connection pool.
+
+``/readyz`` (see ``health``) reports ready only once this process has warmed
+up. Under gunicorn the hook runs before the worker accepts connections;
+elsewhere (``runserver``) the first probe does the warm-up. Steps are best
+effort: a failing step is logged and the rest still run.
+``STARTUP_WARMUP=false`` turns it all off.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIXES = (".html", ".txt")
+
+_lock = threading.Lock()
+_process_warm = False
+_worker_warm = False
+
+
+def _enabled():
+    return getattr(settings, "STARTUP_WARMUP", True)
+
+
+def _run(steps):
+    timings = []
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            detail = step()
+        except Exception:
+            logger.exception("Warm-up step %s failed", name)
+            detail = "failed"
+        ms = (time.perf_counter() - start) * 1000
+        timings.append(f"{name} {ms:.0f} ms" + (f" ({detail})" if detail else ""))
+    return timings
+
+
+def _urls():
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.url_patterns  # imports every urls and views module
+    return f"{len(resolver.reverse_dict)} routes"
+
+
+def _template_names(directory):
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if filename.endswith(TEMPLATE_SUFFIXES):
+                yield os.path.relpath(os.path.join(root, filename), directory)
+
+
+def _templates():
+    from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+
+    compiled = 0
+    for backend in engines.all():
+        engine = getattr(backend, "engine", None)
+        if engine is None:
+            continue
+        directories = []
+        for loader in engine.template_loaders:
+            for inner in getattr(loader, "loaders", [loader]):
+                directories.extend(inner.get_dirs())
+        for directory in dict.fromkeys(map(str, directories)):
+            for name in _template_names(directory):
+                try:
+                    engine.get_template(name)
+                except (TemplateSyntaxError, TemplateDoesNotExist, UnicodeDecodeError):
+                    # Not a template for this engine (a fragment for another backend, a data file)
+                    continue
+                compiled += 1
+    return f"{compiled} templates"
+
+
+def _passwords():
+    from django.contrib.auth import hashers, password_validation
+
+    validators = password_validation.get_default_password_validators()
+    hashers.get_hashers()
+    return f"{len(validators)} validators"
+
+
+def _databases():
+    from django.db import DatabaseError, connections
+
+    opened = []
+    for alias in connections:
+        if connections[alias].settings_dict["ENGINE"].endswith((".dummy", ".nodb")):
+            continue
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as exc:
+            logger.warning("Warm-up could not connect to %s: %s", alias, exc)
+            continue
+        opened.append(alias)
+    return ",".join(opened) or "none"
+
+
+def _hooks():
+    hooks = getattr(settings, "WARMUP_HOOKS", [])
+    for path in hooks:
+        import_string(path)()
+    return f"{len(hooks)} hooks"
+
+
+def warm_process():
+    """Fork-safe warm-up: imports, templates, validators. Idempotent."""
+    global _process_warm
+    if not _enabled():
+        return
+    with _lock:
+        if _process_warm:
+            return
+        timings = _run([("urls", _urls), ("templates", _templates), ("passwords", _passwords)])
+        _process_warm = True
+    logger.info("Warm-up (process %s): %s", os.getpid(), ", ".join(timings))
+
+
+def warm_worker():
+    """Per-worker warm-up: database connections and ``WARMUP_HOOKS``. Idempotent."""
+    global _worker_warm
+    warm_process()
+    if not _enabled():
+        return
+    with _lock:
+        if _worker_warm:
+            return
+        timings = _run([("databases", _databases), ("hooks", _hooks)])
+        _worker_warm = True
+    logger.info("Warm-up (worker %s): %s", os.getpid(), ", ".join(timings))
+
+
+def is_warm():
+    """True once ``warm_worker()`` has run here (always, with ``STARTUP_WARMUP`` off)."""
+    return _worker_warm or not _enabled()
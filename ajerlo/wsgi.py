@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ajerlo.settings')
 
 application = get_wsgi_application()
+
+# Imports, templates and validators before the first request; see ajerlo.warmup
+from ajerlo import warmup  # noqa: E402
+
+warmup.warm_process()
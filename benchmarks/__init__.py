@@ -0,0 +1,13 @@
+"""
+In-process performance benchmarks for the rentals and accounts services.
+
+Usage (from the repo root, against whatever database the service is configured for)::
+
+    python -m benchmarks rentals --iterations 50 --out bench-rentals.json
+    python -m benchmarks accounts --out bench-accounts.json
+    python -m benchmarks.compare bench-before.json bench-after.json
+    python -m benchmarks.loadgen --steps 4,8,16 --out load.json   # whole stack through the gateway
+    python -m benchmarks.waterfall <request id> traces.jsonl       # one request across services
+
+Seed realistic volumes first with ``manage.py seed_scale`` in the rentals service.
+"""
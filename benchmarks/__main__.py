@@ -0,0 +1,28 @@
+import argparse
+
+from benchmarks.harness import SERVICES, run_suite, setup_django
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run service benchmarks.")
+    parser.add_argument("service", choices=sorted(SERVICES))
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", action="append", help="Run scenarios whose name contains this (repeatable).")
+    parser.add_argument("--out", help="Write JSON results to this path.")
+    args = parser.parse_args(argv)
+
+    setup_django(args.service)
+    if args.service == "rentals":
+        from benchmarks.rentals import build_scenarios
+    else:
+        from benchmarks.accounts import build_scenarios
+    scenarios, dataset = build_scenarios()
+    run_suite(
+        args.service, scenarios,
+        iterations=args.iterations, warmup=args.warmup, only=args.only, dataset=dataset, out=args.out,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Accounts service scenarios: login."""
+
+BENCH_USERNAME = "bench_user"
+BENCH_PASSWORD = "bench-password-430"
+
+
+def build_scenarios():
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    from benchmarks.harness import Scenario
+
+    User = get_user_model()
+    user, created = User.objects.get_or_create(
+        username=BENCH_USERNAME, defaults={"email": "bench@example.com"}
+    )
+    if created or not user.check_password(BENCH_PASSWORD):
+        user.set_password(BENCH_PASSWORD)
+        user.save()
+
+    client = Client()
+
+    def login(password):
+        return lambda: client.post(
+            "/api/auth/login/",
+            {"username": BENCH_USERNAME, "password": password},
+            content_type="application/json",
+        )
+
+    scenarios = [
+        Scenario("login_view", login(BENCH_PASSWORD)),
+        Scenario("login_view[bad_password]", login("wrong-password"), expect_status=(401,)),
+    ]
+    return scenarios, {"users": User.objects.count()}
@@ -0,0 +1,204 @@
+"""
+Rentals service under gunicorn sync workers (WSGI) vs uvicorn workers (ASGI).
+
+The browse and "my" list endpoints (``car_list``, ``car_detail``,
+``favorites_list``, ``my_bookings``) are async views; everything else is sync.
+This runs the service against a Postgres database once per mode with the same
+number of worker processes and drives it with ``--concurrency`` closed-loop
+clients for ``--seconds``: mostly reads, plus a share of favorite toggles so
+the sync write path is exercised under ASGI too. Per mode it reports
+throughput, errors and latency per endpoint::
+
+    POSTGRES_HOST=127.0.0.1 POSTGRES_PORT=5433 python -m benchmarks.asgi --workers 2 --concurrency 32
+
+With the database on the same host every statement returns in well under a
+millisecond and the run is CPU-bound. ``--db-rtt-ms`` puts a TCP relay in
+front of Postgres that delays each client-to-server packet, to model a
+database across the network, which is where waiting on the database
+dominates.
+
+The ASGI mode runs with ``DB_POOL`` on: Django's persistent connections
+(``CONN_MAX_AGE``) are per thread, and under ASGI each request gets a fresh
+thread, so they should not be used there.
+"""
+import argparse
+import json
+import random
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+import requests
+
+from benchmarks.dbpool import car_ids, pg_settings
+from benchmarks.harness import git_revision
+from benchmarks.upstreams import LatencyStats, ServiceProcess, manage, service_env
+
+JWT_SECRET = "asgi-bench-secret"
+USERS = range(900_000, 900_050)
+
+MODES = {
+    "wsgi": {"asgi": False, "env": {"DB_POOL": "false"}},
+    "asgi": {"asgi": True, "env": {"DB_POOL": "true"}},
+}
+
+# (name, weight); "toggle" is a POST handled by a sync view.
+MIX = [("car_list", 40), ("car_detail", 35), ("favorites", 10), ("my_bookings", 10), ("toggle", 5)]
+
+
+class DelayRelay:
+    """TCP relay that holds every client-to-server packet for ``delay`` seconds."""
+
+    def __init__(self, target, delay):
+        self.target = target
+        self.delay = delay
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            client, _ = self._server.accept()
+            upstream = socket.create_connection(self.target)
+            for src, dst, delay in ((client, upstream, self.delay), (upstream, client, 0)):
+                threading.Thread(target=self._pipe, args=(src, dst, delay), daemon=True).start()
+
+    @staticmethod
+    def _pipe(src, dst, delay):
+        try:
+            while data := src.recv(65536):
+                if delay:
+                    time.sleep(delay)
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            for sock in (src, dst):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def token(user_id):
+    return jwt.encode({"user_id": user_id}, JWT_SECRET, algorithm="HS256")
+
+
+def run_mode(mode, env, args, ids):
+    config = MODES[mode]
+    service = ServiceProcess(
+        "rentals", {**env, **config["env"]}, workers=args.workers, threads=args.threads, asgi=config["asgi"]
+    ).start()
+    stats = LatencyStats()
+    names, weights = zip(*MIX)
+    tokens = {uid: token(uid) for uid in USERS}
+
+    def request(session, rng, name):
+        uid = rng.choice(USERS)
+        headers = {"Authorization": f"Bearer {tokens[uid]}"}
+        if name == "car_list":
+            return session.get(f"{service.url}/api/cars/?page={rng.randint(1, 5)}", timeout=30)
+        if name == "car_detail":
+            return session.get(f"{service.url}/api/cars/{rng.choice(ids)}/", timeout=30)
+        if name == "favorites":
+            return session.get(f"{service.url}/api/favorites/", headers=headers, timeout=30)
+        if name == "my_bookings":
+            return session.get(f"{service.url}/api/bookings/mine/", headers=headers, timeout=30)
+        return session.post(
+            f"{service.url}/api/favorites/toggle/", json={"car_id": rng.choice(ids)}, headers=headers, timeout=30
+        )
+
+    def client(seed, deadline):
+        rng = random.Random(seed)
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = request(session, rng, name).status_code == 200
+            except requests.RequestException:
+                ok = False
+            stats.add(name, (time.perf_counter() - start) * 1000, ok=ok)
+
+    try:
+        # Warm every worker (imports, connections) before measuring.
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(lambda i: client(args.seed + i, time.perf_counter() + 2), range(args.concurrency)))
+        stats.snapshot()
+        started = time.perf_counter()
+        deadline = started + args.seconds
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(lambda i: client(args.seed + 1000 + i, deadline), range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        service.stop()
+    endpoints = stats.snapshot()
+    total = sum(row["count"] for row in endpoints.values())
+    return {
+        "mode": mode,
+        "requests": total,
+        "errors": sum(row["errors"] for row in endpoints.values()),
+        "rps": round(total / elapsed, 1),
+        "endpoints": endpoints,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.asgi")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated: wsgi,asgi")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker (wsgi mode).")
+    parser.add_argument("--concurrency", type=int, default=32, help="Closed-loop clients.")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--pool-max", type=int, default=8, help="DB_POOL_MAX_SIZE (asgi mode).")
+    parser.add_argument("--db-rtt-ms", type=float, default=0, help="Added latency per database round trip.")
+    parser.add_argument("--seed", type=int, default=430)
+    parser.add_argument("--out", help="Write the JSON report here.")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="asgi-")
+    base = service_env("rentals", workdir, JWT_SECRET, extra={
+        "DB_ENGINE": "postgres",
+        **{f"POSTGRES_{key.upper()}": value for key, value in pg_settings().items() if key != "dbname"},
+        "POSTGRES_DB": pg_settings()["dbname"],
+        "DB_POOL_MAX_SIZE": str(args.pool_max),
+        "DB_N_PLUS_ONE_MODE": "warn",
+        "DB_SLOW_QUERY_MS": "60000",
+    })
+    manage("rentals", base, "migrate", "--noinput", "-v0")
+    ids = car_ids()
+    if not ids:
+        print("seeding rentals ...")
+        manage("rentals", base, "seed_scale", "--cars", "500", "--dealers", "20", "--bookings", "5000",
+               "--images-per-car", "0")
+        ids = car_ids()
+
+    if args.db_rtt_ms:
+        relay = DelayRelay((base["POSTGRES_HOST"], int(base["POSTGRES_PORT"])), args.db_rtt_ms / 1000)
+        base = {**base, "POSTGRES_HOST": "127.0.0.1", "POSTGRES_PORT": str(relay.port)}
+
+    results = []
+    for mode in args.modes.split(","):
+        print(f"running {mode} ...")
+        results.append(run_mode(mode, base, args, ids))
+
+    print(f"\n{'mode':<6} {'endpoint':<12} {'n':>6} {'err':>5} {'p50':>9} {'p90':>9} {'p99':>9}")
+    for r in results:
+        for name, row in r["endpoints"].items():
+            print(
+                f"{r['mode']:<6} {name:<12} {row['count']:>6} {row['errors']:>5} {row['p50_ms']:>7}ms "
+                f"{row['p90_ms']:>7}ms {row['p99_ms']:>7}ms"
+            )
+        print(f"{r['mode']:<6} {'total':<12} {r['requests']:>6} {r['errors']:>5}  {r['rps']} req/s")
+    if args.out:
+        report = {"revision": git_revision(), "args": vars(args), "results": results}
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
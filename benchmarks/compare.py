@@ -0,0 +1,48 @@
+"""Compare two benchmark JSON reports: ``python -m benchmarks.compare base.json new.json``."""
+import argparse
+import json
+import sys
+
+METRICS = [
+    ("p50 ms", lambda r: r["latency_ms"]["p50"]),
+    ("p95 ms", lambda r: r["latency_ms"]["p95"]),
+    ("queries", lambda r: r["sql"]["queries_per_request"]),
+    ("sql ms", lambda r: r["sql"]["sql_ms_mean"]),
+    ("peak KB", lambda r: r["peak_memory_kb"]),
+]
+
+
+def _delta(old, new):
+    if old in (None, 0) or new is None:
+        return "   n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def compare(base, new, stream=sys.stdout):
+    names = [n for n in base["results"] if n in new["results"]]
+    header = f"{'scenario':<32}" + "".join(f"{label:>24}" for label, _ in METRICS)
+    stream.write(header + "\n" + "-" * len(header) + "\n")
+    for name in names:
+        row = f"{name:<32}"
+        for _, get in METRICS:
+            old_v, new_v = get(base["results"][name]), get(new["results"][name])
+            row += f"{old_v:>8} -> {new_v:<8}{_delta(old_v, new_v)}"
+        stream.write(row + "\n")
+    for name in sorted(set(base["results"]) ^ set(new["results"])):
+        stream.write(f"{name:<32} only in {'base' if name in base['results'] else 'new'}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    args = parser.parse_args(argv)
+    with open(args.base) as fh:
+        base = json.load(fh)
+    with open(args.new) as fh:
+        new = json.load(fh)
+    compare(base, new)
+
+
+if __name__ == "__main__":
+    main()
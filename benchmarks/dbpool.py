@@ -0,0 +1,200 @@
+"""
+Connection churn and latency under bursty load: ``CONN_MAX_AGE`` vs ``DB_POOL``.
+
+Runs the rentals service under gunicorn against a Postgres database, once per
+connection mode, and fires bursts of concurrent reads (``car_list`` and
+``car_detail``) separated by idle gaps. Per mode it reports request latency,
+errors, the server connections opened during the run
+(``pg_stat_database.sessions``, Postgres 14+) and the peak number of backends
+on the database::
+
+    # any Postgres the service can migrate, e.g. db_rentals with its port published
+    POSTGRES_HOST=127.0.0.1 POSTGRES_PORT=5433 python -m benchmarks.dbpool --workers 4 --bursts 20
+
+``--lifetime`` sets both ``CONN_MAX_AGE`` and ``DB_POOL_MAX_LIFETIME`` so
+connection ageing shows up within a short run; the default gap is longer than
+it, which is when per-worker connections all reconnect at the next burst.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg
+import requests
+
+from benchmarks.harness import git_revision
+from benchmarks.upstreams import LatencyStats, ServiceProcess, manage, service_env
+
+MODES = {
+    "conn_max_age": {"DB_POOL": "false"},
+    "pool": {"DB_POOL": "true"},
+}
+
+
+def pg_settings():
+    return {
+        "dbname": os.getenv("POSTGRES_DB", "rentals"),
+        "user": os.getenv("POSTGRES_USER", "rentals"),
+        "password": os.getenv("POSTGRES_PASSWORD", "rentals"),
+        "host": os.getenv("POSTGRES_HOST", "127.0.0.1"),
+        "port": os.getenv("POSTGRES_PORT", "5432"),
+    }
+
+
+class BackendSampler:
+    """Polls pg_stat_activity for the peak number of backends on the database."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._conn = psycopg.connect(**pg_settings(), autocommit=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def query(self, sql):
+        with self._conn.cursor() as cur:
+            cur.execute(sql, [pg_settings()["dbname"]])
+            return cur.fetchone()[0]
+
+    def sessions(self):
+        """Sessions ever opened on the database (needs the sampler stopped or not yet started)."""
+        with self._conn.cursor() as cur:
+            cur.execute("SELECT pg_stat_clear_snapshot()")
+        return self.query("SELECT sessions FROM pg_stat_database WHERE datname = %s")
+
+    def _run(self):
+        while not self._stop.is_set():
+            count = self.query(
+                "SELECT count(*) FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid()"
+            )
+            self.peak = max(self.peak, count)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def close(self):
+        self._conn.close()
+
+
+def car_ids():
+    with psycopg.connect(**pg_settings()) as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM rentals_api_car WHERE available ORDER BY id LIMIT 500")
+        return [row[0] for row in cur.fetchall()]
+
+
+def run_mode(mode, env, args, ids):
+    service = ServiceProcess("rentals", env, workers=args.workers, threads=args.threads).start()
+    stats = LatencyStats()
+    rng = random.Random(args.seed)
+    local = threading.local()
+
+    def fetch(path):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            ok = session.get(service.url + path, timeout=30).status_code == 200
+        except requests.RequestException:
+            ok = False
+        stats.add("burst", (time.perf_counter() - start) * 1000, ok=ok)
+
+    try:
+        # One request per worker first, so startup is not part of the numbers.
+        for _ in range(args.workers):
+            requests.get(service.url + "/api/cars/", timeout=30)
+        stats.snapshot()
+        sampler = BackendSampler()
+        sessions_before = sampler.sessions()
+        sampler.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.burst_size) as pool:
+            for burst in range(args.bursts):
+                paths = [
+                    f"/api/cars/{rng.choice(ids)}/" if rng.random() < 0.5 else f"/api/cars/?page={rng.randint(1, 5)}"
+                    for _ in range(args.burst_size)
+                ]
+                list(pool.map(fetch, paths))
+                if burst < args.bursts - 1:
+                    time.sleep(args.gap)
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+        time.sleep(1)  # let the statistics collector catch up
+        sessions = sampler.sessions() - sessions_before
+        sampler.close()
+    finally:
+        service.stop()
+    summary = stats.snapshot().get("burst", {})
+    return {
+        "mode": mode,
+        **summary,
+        "seconds": round(elapsed, 2),
+        "connections_opened": sessions,
+        "peak_backends": sampler.peak,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.dbpool")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated: conn_max_age,pool")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=32, help="Concurrent requests per burst.")
+    parser.add_argument("--gap", type=float, default=6.0, help="Idle seconds between bursts.")
+    parser.add_argument("--lifetime", type=int, default=5, help="CONN_MAX_AGE / DB_POOL_MAX_LIFETIME seconds.")
+    parser.add_argument("--pool-min", type=int, default=1)
+    parser.add_argument("--pool-max", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=430)
+    parser.add_argument("--out", help="Write the JSON report here.")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="dbpool-")
+    base = service_env("rentals", workdir, "dbpool-secret", extra={
+        "DB_ENGINE": "postgres",
+        **{f"POSTGRES_{key.upper()}": value for key, value in pg_settings().items() if key != "dbname"},
+        "POSTGRES_DB": pg_settings()["dbname"],
+        "DB_CONN_MAX_AGE": str(args.lifetime),
+        "DB_POOL_MAX_LIFETIME": str(args.lifetime),
+        "DB_POOL_MIN_SIZE": str(args.pool_min),
+        "DB_POOL_MAX_SIZE": str(args.pool_max),
+    })
+    manage("rentals", base, "migrate", "--noinput", "-v0")
+    ids = car_ids()
+    if not ids:
+        print("seeding rentals ...")
+        manage("rentals", base, "seed_scale", "--cars", "500", "--dealers", "20", "--bookings", "5000",
+               "--images-per-car", "0")
+        ids = car_ids()
+
+    results = []
+    for mode in args.modes.split(","):
+        print(f"running {mode} ...")
+        results.append(run_mode(mode, {**base, **MODES[mode]}, args, ids))
+
+    print(f"\n{'mode':<14} {'n':>6} {'err':>5} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'opened':>7} {'peak':>5}")
+    for r in results:
+        print(
+            f"{r['mode']:<14} {r['count']:>6} {r['errors']:>5} {r['p50_ms']:>7}ms {r['p90_ms']:>7}ms "
+            f"{r['p99_ms']:>7}ms {r['max_ms']:>7}ms {r['connections_opened']:>7} {r['peak_backends']:>5}"
+        )
+    if args.out:
+        report = {"revision": git_revision(), "args": vars(args), "results": results}
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Timing, SQL and memory measurement shared by the service benchmark suites."""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SERVICES = {
+    "rentals": ("services/rentals_service", "rentals_service.settings"),
+    "accounts": ("services/accounts_service", "accounts_service.settings"),
+}
+
+
+def setup_django(service):
+    """Put ``service`` on sys.path and configure Django for it (one service per process)."""
+    path, settings_module = SERVICES[service]
+    sys.path.insert(0, str(REPO_ROOT / path))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+
+    django.setup()
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` hook counting statements and their wall time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+@contextmanager
+def record_queries():
+    from django.db import connection
+
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        yield recorder
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Scenario:
+    """A named benchmark: ``run()`` performs one request and returns the response."""
+
+    def __init__(self, name, run, *, setup=None, expect_status=(200,)):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.expect_status = expect_status
+
+
+def measure(scenario, *, iterations, warmup):
+    if scenario.setup:
+        scenario.setup()
+    for _ in range(warmup):
+        scenario.run()
+
+    latencies, query_counts, query_seconds, errors = [], [], [], 0
+    for _ in range(iterations):
+        with record_queries() as rec:
+            start = time.perf_counter()
+            resp = scenario.run()
+            elapsed = time.perf_counter() - start
+        if getattr(resp, "status_code", 200) not in scenario.expect_status:
+            errors += 1
+        latencies.append(elapsed * 1000)
+        query_counts.append(rec.count)
+        query_seconds.append(rec.seconds * 1000)
+
+    # Peak memory in a separate pass: tracemalloc slows allocation-heavy code
+    # down noticeably, so it must not pollute the latency samples.
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    scenario.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p90": round(percentile(latencies, 90), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3),
+        },
+        "sql": {
+            "queries_per_request": round(statistics.fmean(query_counts), 2),
+            "max_queries": max(query_counts),
+            "sql_ms_mean": round(statistics.fmean(query_seconds), 3),
+        },
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(service, scenarios, *, iterations, warmup, only=None, dataset=None, out=None, stream=sys.stdout):
+    from django.db import connection
+
+    results = {}
+    for scenario in scenarios:
+        if only and not any(token in scenario.name for token in only):
+            continue
+        stream.write(f"{scenario.name:<40} ")
+        stream.flush()
+        result = measure(scenario, iterations=iterations, warmup=warmup)
+        results[scenario.name] = result
+        lat = result["latency_ms"]
+        stream.write(
+            f"p50 {lat['p50']:>8.2f}ms  p95 {lat['p95']:>8.2f}ms  "
+            f"queries {result['sql']['queries_per_request']:>6}  "
+            f"peak {result['peak_memory_kb']:>8.1f}KB"
+            f"{'  errors ' + str(result['errors']) if result['errors'] else ''}\n"
+        )
+
+    report = {
+        "meta": {
+            "service": service,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "db_vendor": connection.vendor,
+            "iterations": iterations,
+            "warmup": warmup,
+            "dataset": dataset or {},
+        },
+        "results": results,
+    }
+    if out:
+        Path(out).write_text(json.dumps(report, indent=2))
+        stream.write(f"Wrote {out}\n")
+    return report
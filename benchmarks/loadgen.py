@@ -0,0 +1,344 @@
+"""
+Load generator for the gateway.
+
+Drives browser-like journeys against a gateway started locally under gunicorn,
+stepping up concurrency (optionally paced to a target RPS per step), and
+reports per-page and per-upstream-call latency, error rate and throughput for
+every step so the saturation point is visible.
+
+Upstreams:
+
+* ``local`` (default): accounts and rentals run under gunicorn on SQLite
+  databases in ``--workdir`` (migrated and seeded with ``seed_scale`` on first
+  use). ``--record rec.json`` saves one response per upstream route.
+* ``stub``: no services run; ``--recording rec.json`` is replayed, with the
+  recorded median latency unless ``--no-stub-latency``.
+
+Examples::
+
+    python -m benchmarks.loadgen --steps 4,8,16,32 --step-seconds 30 --out load.json
+    python -m benchmarks.loadgen --steps 8 --record rec.json
+    python -m benchmarks.loadgen --upstreams stub --recording rec.json --steps 8,16,32 --rps 50,100,200
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import requests
+
+from benchmarks.harness import git_revision
+from benchmarks.upstreams import (
+    LatencyStats,
+    ServiceProcess,
+    UpstreamProxy,
+    load_recordings,
+    prepare_local,
+    save_recordings,
+    service_env,
+)
+
+JWT_SECRET = "loadgen-secret"
+DEFAULT_PASSWORD = "load-password-430"
+CAR_LINK = re.compile(r'href="/rentals/(\d+)/"')
+DEALER_BOOKINGS_LINK = re.compile(r'href="/rentals/dealer/cars/(\d+)/bookings/"')
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+LIST_PARAMS = [{}, {"sort": "price_low"}, {"sort": "price_high"}, {"type": "suv"}, {"page": 2}, {"q": "to"}]
+
+
+class Pacer:
+    """Spaces requests from all threads ``1/rps`` seconds apart (no-op without a target)."""
+
+    def __init__(self, rps=None):
+        self.interval = 1.0 / rps if rps else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Abort(Exception):
+    """Raised to end the current journey after a failed page."""
+
+
+class VirtualUser:
+    """One browser session running journeys against the gateway."""
+
+    def __init__(self, base_url, stats, pacer, users, rng):
+        self.base = base_url.rstrip("/")
+        self.stats = stats
+        self.pacer = pacer
+        self.users = users
+        self.rng = rng
+        # Unseeded: repeated runs against the same workdir must not retry the same dates.
+        self.dates = random.Random()
+        self.session = requests.Session()
+
+    def page(self, name, method, path, *, expect=(200,), **kwargs):
+        self.pacer.wait()
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(method, self.base + path, allow_redirects=False, timeout=30, **kwargs)
+            ok = resp.status_code in expect
+        except requests.RequestException:
+            resp, ok = None, False
+        self.stats.add(name, (time.perf_counter() - start) * 1000, ok=ok)
+        if not ok:
+            raise Abort(name)
+        return resp
+
+    def _csrf(self, html):
+        match = CSRF_INPUT.search(html)
+        return match.group(1) if match else self.session.cookies.get("csrftoken", "")
+
+    def login(self, username):
+        resp = self.page("login", "GET", "/accounts/login/")
+        self.page(
+            "login_submit", "POST", "/accounts/login/", expect=(302,),
+            data={"username": username, "password": self.users["password"],
+                  "csrfmiddlewaretoken": self._csrf(resp.text)},
+            headers={"Referer": self.base + "/accounts/login/"},
+        )
+
+    def browse(self):
+        home = self.page("home", "GET", "/")
+        listing = self.page("car_list", "GET", "/rentals/", params=self.rng.choice(LIST_PARAMS))
+        ids = CAR_LINK.findall(listing.text) or CAR_LINK.findall(home.text)
+        if not ids:
+            raise Abort("car_list")
+        car_id = self.rng.choice(ids)
+        self.page("car_detail", "GET", f"/rentals/{car_id}/")
+        return car_id
+
+    def journey_browse(self):
+        self.session.cookies.clear()
+        self.browse()
+
+    def journey_book(self):
+        self.session.cookies.clear()
+        car_id = self.browse()
+        self.login(self.rng.choice(self.users["customers"]))
+        form = self.page("create_booking", "GET", f"/rentals/{car_id}/book/")
+        # Far-future random window so concurrent users rarely collide.
+        start = date.today() + timedelta(days=self.dates.randint(3650, 36500))
+        self.page(
+            "create_booking_submit", "POST", f"/rentals/{car_id}/book/", expect=(302,),
+            data={"start_date": start.isoformat(), "end_date": (start + timedelta(days=2)).isoformat(),
+                  "csrfmiddlewaretoken": self._csrf(form.text)},
+            headers={"Referer": f"{self.base}/rentals/{car_id}/book/"},
+        )
+        self.page("account_dashboard", "GET", "/accounts/dashboard/")
+
+    def journey_dealer(self):
+        self.session.cookies.clear()
+        self.login(self.users["dealer"])
+        dashboard = self.page("dealer_dashboard", "GET", "/rentals/dealer/dashboard/")
+        ids = DEALER_BOOKINGS_LINK.findall(dashboard.text)
+        if ids:
+            self.page("dealer_car_bookings", "GET", f"/rentals/dealer/cars/{self.rng.choice(ids)}/bookings/")
+        self.page("account_overview", "GET", "/accounts/account/")
+
+    def run(self, journeys, deadline):
+        names, weights = zip(*journeys.items())
+        while time.monotonic() < deadline:
+            journey = getattr(self, f"journey_{self.rng.choices(names, weights)[0]}")
+            try:
+                journey()
+            except Abort:
+                pass
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if not hasattr(VirtualUser, f"journey_{name}"):
+            raise argparse.ArgumentTypeError(f"unknown journey {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_step(base_url, users, mix, concurrency, seconds, rps, proxies, seed):
+    stats = LatencyStats()
+    pacer = Pacer(rps)
+    for proxy in proxies:
+        proxy.stats.snapshot(reset=True)
+    deadline = time.monotonic() + seconds
+    started = time.monotonic()
+    threads = [
+        threading.Thread(
+            target=VirtualUser(base_url, stats, pacer, users, random.Random(seed + i)).run,
+            args=(mix, deadline), daemon=True,
+        )
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    pages = stats.snapshot()
+    upstream = {}
+    for proxy in proxies:
+        upstream.update(proxy.stats.snapshot())
+    total = sum(p["count"] for p in pages.values())
+    errors = sum(p["errors"] for p in pages.values())
+    return {
+        "concurrency": concurrency,
+        "target_rps": rps,
+        "seconds": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "pages": pages,
+        "upstream": upstream,
+    }
+
+
+def find_saturation(steps, max_error_rate=0.01):
+    """Index of the first step where throughput stops scaling or errors appear."""
+    for i, step in enumerate(steps):
+        if step["error_rate"] > max_error_rate:
+            return i
+        if i and steps[i - 1]["throughput_rps"] and (
+            step["throughput_rps"] < steps[i - 1]["throughput_rps"] * 1.1
+        ):
+            return i
+    return None
+
+
+def print_step(step, stream=sys.stdout):
+    target = f" @ {step['target_rps']} rps" if step["target_rps"] else ""
+    stream.write(
+        f"\n== concurrency {step['concurrency']}{target}: "
+        f"{step['throughput_rps']} req/s, error rate {step['error_rate']:.2%}\n"
+    )
+    for section in ("pages", "upstream"):
+        for name, s in step[section].items():
+            stream.write(
+                f"  {name:<44} n={s['count']:<6} p50={s['p50_ms']:>8}ms p90={s['p90_ms']:>8}ms "
+                f"p99={s['p99_ms']:>8}ms err={s['error_rate']:.1%}\n"
+            )
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadgen", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--upstreams", choices=["local", "stub"], default="local")
+    parser.add_argument("--recording", help="Recorded upstream responses to replay (stub mode).")
+    parser.add_argument("--record", help="Save one upstream response per route here (local mode).")
+    parser.add_argument("--no-stub-latency", action="store_true", help="Replay stubs without recorded latency.")
+    parser.add_argument("--workdir", help="Keep SQLite databases here and reuse them on later runs.")
+    parser.add_argument("--steps", type=_int_list, default=[2, 4, 8, 16], help="Concurrency per step, e.g. 4,8,16.")
+    parser.add_argument("--rps", type=_int_list, help="Target RPS per step (same length as --steps).")
+    parser.add_argument("--step-seconds", type=float, default=20)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("browse=6,book=3,dealer=1"))
+    parser.add_argument("--gateway-workers", type=int, default=2)
+    parser.add_argument("--service-workers", type=int, default=2)
+    parser.add_argument("--users", type=int, default=20, help="Customer accounts to create in local mode.")
+    parser.add_argument("--seed-args", default="--dealers 50 --cars 2000 --bookings 40000",
+                        help="Arguments passed to rentals seed_scale when preparing local databases.")
+    parser.add_argument("--seed", type=int, default=430)
+    parser.add_argument("--out", help="Write the JSON report here.")
+    args = parser.parse_args(argv)
+    if args.rps and len(args.rps) != len(args.steps):
+        parser.error("--rps needs one value per --steps entry")
+    if args.upstreams == "stub" and not args.recording:
+        parser.error("stub mode needs --recording")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ajerlo-load-")
+    os.makedirs(workdir, exist_ok=True)
+    processes, proxies = [], []
+    try:
+        if args.upstreams == "local":
+            users = prepare_local(
+                workdir, JWT_SECRET, users=args.users, password=DEFAULT_PASSWORD, seed_args=args.seed_args.split()
+            )
+            for name in ("accounts", "rentals"):
+                service = ServiceProcess(name, service_env(name, workdir, JWT_SECRET), workers=args.service_workers)
+                processes.append(service.start())
+                proxy = UpstreamProxy(name, target=service.url).start()
+                proxy.recording = bool(args.record)
+                proxies.append(proxy)
+        else:
+            recordings = load_recordings(args.recording)
+            users = recordings["meta"]["users"]
+            for name in ("accounts", "rentals"):
+                proxies.append(UpstreamProxy(
+                    name, recordings=recordings.get(name, {}), replay_latency=not args.no_stub_latency,
+                    jwt_secret=JWT_SECRET,
+                ).start())
+
+        upstream_urls = {p.name: p.url for p in proxies}
+        gateway = ServiceProcess("gateway", service_env("gateway", workdir, JWT_SECRET, {
+            "ACCOUNTS_API_BASE": f"{upstream_urls['accounts']}/api",
+            "RENTALS_API_BASE": f"{upstream_urls['rentals']}/api",
+            "GATEWAY_STATELESS": "true",
+        }), workers=args.gateway_workers)
+        processes.append(gateway.start())
+
+        # One pass of every journey warms caches and verifies the setup before measuring.
+        warm = LatencyStats()
+        warm_user = VirtualUser(gateway.url, warm, Pacer(), users, random.Random(args.seed))
+        for name in args.mix:
+            try:
+                getattr(warm_user, f"journey_{name}")()
+            except Abort as exc:
+                sys.stderr.write(f"warning: warm-up journey {name!r} failed at {exc}\n")
+
+        steps = []
+        for index, concurrency in enumerate(args.steps):
+            rps = args.rps[index] if args.rps else None
+            step = run_step(gateway.url, users, args.mix, concurrency, args.step_seconds, rps, proxies, args.seed)
+            print_step(step)
+            steps.append(step)
+
+        saturation = find_saturation(steps)
+        if saturation is not None:
+            print(f"\nSaturation at step {saturation + 1} (concurrency {steps[saturation]['concurrency']}).")
+        report = {
+            "meta": {
+                "upstreams": args.upstreams,
+                "git_revision": git_revision(),
+                "mix": args.mix,
+                "step_seconds": args.step_seconds,
+                "gateway_workers": args.gateway_workers,
+                "service_workers": args.service_workers,
+                "workdir": workdir,
+            },
+            "steps": steps,
+            "saturation_step": saturation,
+        }
+        if args.out:
+            with open(args.out, "w") as fh:
+                json.dump(report, fh, indent=2)
+            print(f"Wrote {args.out}")
+        if args.record:
+            save_recordings(args.record, proxies, {"users": users})
+            print(f"Wrote recordings to {args.record}")
+    finally:
+        for process in reversed(processes):
+            process.stop()
+        for proxy in proxies:
+            proxy.stop()
+
+
+if __name__ == "__main__":
+    main()
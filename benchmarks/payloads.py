@@ -0,0 +1,131 @@
+"""
+Bytes on the wire and client decode cost of the rentals payloads the gateway fetches.
+
+Starts the rentals service (and accounts, for a dealer token) under gunicorn
+on SQLite databases prepared as for ``benchmarks.loadgen``, then fetches
+``car_list`` (``GET /api/cars/``), ``car_detail`` (``GET /api/cars/<id>/``,
+12-month calendar) and ``dealer_dashboard`` in every combination of body
+format (``json``, ``msgpack``) and content encoding (``identity``, ``gzip``,
+``zstd``). Per combination it records:
+
+* ``wire_bytes``: the body as sent, and ``body_bytes`` once decompressed;
+* ``decode_us``: median client CPU to decompress and parse the body, what
+  ``api_client`` spends per call;
+* ``fetch_ms``: median round trip, which includes the service encoding and
+  compressing the body.
+
+::
+
+    python -m benchmarks.payloads --repeat 200 --out payloads.json
+"""
+import argparse
+import gzip
+import json
+import statistics
+import sys
+import tempfile
+import time
+
+import msgpack
+import requests
+
+from benchmarks.harness import git_revision
+from benchmarks.upstreams import ServiceProcess, prepare_local, service_env
+
+if sys.version_info >= (3, 14):
+    from compression import zstd
+else:
+    from backports import zstd
+
+JWT_SECRET = "payloads-secret"
+PASSWORD = "payloads-password-430"
+
+FORMATS = {"json": "application/json", "msgpack": "application/msgpack"}
+ENCODINGS = {"identity": "identity", "gzip": "gzip", "zstd": "zstd"}
+DECOMPRESS = {"identity": lambda body: body, "gzip": gzip.decompress, "zstd": zstd.decompress}
+PARSE = {"json": json.loads, "msgpack": lambda body: msgpack.unpackb(body, strict_map_key=False)}
+
+
+def fetch(url, token, fmt, encoding):
+    """(wire body, round trip ms) without letting requests decompress it."""
+    headers = {"Accept": FORMATS[fmt], "Accept-Encoding": ENCODINGS[encoding]}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    sent = time.perf_counter()
+    response = requests.get(url, headers=headers, timeout=30, stream=True)
+    body = response.raw.read(decode_content=False)
+    elapsed = (time.perf_counter() - sent) * 1000
+    response.raise_for_status()
+    served = response.headers.get("Content-Encoding", "identity")
+    if served != encoding:
+        raise RuntimeError(f"{url}: asked for {encoding}, got {served}")
+    return body, elapsed
+
+
+def measure(url, token, fmt, encoding, repeat):
+    wire, _ = fetch(url, token, fmt, encoding)
+    decompress, parse = DECOMPRESS[encoding], PARSE[fmt]
+    decode = []
+    for _ in range(repeat):
+        start = time.process_time_ns()
+        parse(decompress(wire))
+        decode.append((time.process_time_ns() - start) / 1000)
+    fetch_ms = [fetch(url, token, fmt, encoding)[1] for _ in range(max(repeat // 10, 5))]
+    return {
+        "wire_bytes": len(wire),
+        "body_bytes": len(decompress(wire)),
+        "decode_us": round(statistics.median(decode), 1),
+        "fetch_ms": round(statistics.median(fetch_ms), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.payloads", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=200, help="Decode runs per payload and combination.")
+    parser.add_argument("--workdir", help="Keep SQLite databases here and reuse them on later runs.")
+    parser.add_argument("--seed-args", default="--dealers 20 --cars 500 --bookings 5000")
+    parser.add_argument("--out", help="Write the JSON report here.")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ajerlo-payloads-")
+    users = prepare_local(workdir, JWT_SECRET, users=1, password=PASSWORD, seed_args=args.seed_args.split())
+    accounts = ServiceProcess("accounts", service_env("accounts", workdir, JWT_SECRET), workers=1).start()
+    rentals = ServiceProcess("rentals", service_env("rentals", workdir, JWT_SECRET), workers=1).start()
+    results = []
+    try:
+        token = requests.post(f"{accounts.url}/api/auth/login/", timeout=30, json={
+            "username": users["dealer"], "password": users["password"],
+        }).json()["token"]
+        car_id = requests.get(f"{rentals.url}/api/cars/", timeout=30).json()["results"][0]["id"]
+        payloads = {
+            "car_list": (f"{rentals.url}/api/cars/", None),
+            "car_detail": (f"{rentals.url}/api/cars/{car_id}/", None),
+            "dealer_dashboard": (f"{rentals.url}/api/dealer/dashboard/", token),
+        }
+        for name, (url, auth) in payloads.items():
+            for fmt in FORMATS:
+                for encoding in ENCODINGS:
+                    print(f"{name} {fmt} {encoding} ...")
+                    results.append({
+                        "payload": name, "format": fmt, "encoding": encoding,
+                        **measure(url, auth, fmt, encoding, args.repeat),
+                    })
+    finally:
+        rentals.stop()
+        accounts.stop()
+
+    print(f"\n{'payload':<17} {'format':<8} {'encoding':<9} {'wire':>9} {'body':>9} {'decode':>10} {'fetch':>9}")
+    for r in results:
+        print(
+            f"{r['payload']:<17} {r['format']:<8} {r['encoding']:<9} {r['wire_bytes']:>8}B {r['body_bytes']:>8}B "
+            f"{r['decode_us']:>8.1f}us {r['fetch_ms']:>7.2f}ms"
+        )
+    if args.out:
+        report = {"revision": git_revision(), "args": vars(args), "results": results}
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Rentals service scenarios: browse, detail, dealer pages and bookings."""
+from datetime import timedelta
+
+
+def build_scenarios():
+    import jwt
+    from django.conf import settings
+    from django.db import transaction
+    from django.db.models import Count
+    from django.test import Client
+    from django.utils import timezone
+
+    from rentals_api.models import Booking, Car, Dealer
+
+    dealer = Dealer.objects.filter(active=True).annotate(n=Count("cars")).order_by("-n").first()
+    if dealer is None or dealer.user_id is None:
+        raise SystemExit("No dealers found; seed data first with `manage.py seed_scale`.")
+    car = (
+        Car.objects.filter(dealer=dealer).annotate(n=Count("bookings")).order_by("-n").first()
+        or Car.objects.first()
+    )
+    customer_id = (
+        Booking.objects.values("user_id").annotate(n=Count("id")).order_by("-n")
+        .values_list("user_id", flat=True).first()
+    ) or 1
+    sample = Car.objects.filter(available=True).values("make", "car_type").first() or {}
+    dealer_word = dealer.name.split()[0]
+
+    def client_for(user_id):
+        token = jwt.encode({"user_id": user_id}, settings.ACCOUNTS_JWT_SECRET,
+                           algorithm=settings.ACCOUNTS_JWT_ALGORITHM)
+        return Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    anon = Client()
+    dealer_client = client_for(dealer.user_id)
+    customer = client_for(customer_id)
+
+    def get(client, url, params=None):
+        return lambda: client.get(url, params or {})
+
+    car_list_variants = {
+        "newest": {},
+        "price_low": {"sort": "price_low"},
+        "price_high": {"sort": "price_high"},
+        "q": {"q": sample.get("make", "a")[:3]},
+        "make": {"make": sample.get("make", "")},
+        "dealer": {"dealer": dealer_word},
+        "type": {"type": sample.get("car_type", "sedan")},
+        "price_range": {"min_price": "50", "max_price": "150"},
+        "deep_page": {"page": 50},
+    }
+
+    far_start = timezone.localdate() + timedelta(days=7300)
+
+    def create_booking():
+        # Roll back each booking so repeated runs measure the same state.
+        with transaction.atomic():
+            resp = customer.post(
+                "/api/bookings/",
+                {"car_id": car.pk, "start_date": far_start.isoformat(),
+                 "end_date": (far_start + timedelta(days=3)).isoformat()},
+                content_type="application/json",
+            )
+            transaction.set_rollback(True)
+        return resp
+
+    from benchmarks.harness import Scenario
+
+    scenarios = [
+        Scenario(f"car_list[{name}]", get(anon, "/api/cars/", params))
+        for name, params in car_list_variants.items()
+    ]
+    scenarios += [
+        Scenario("car_detail", get(anon, f"/api/cars/{car.pk}/")),
+        Scenario("dealer_dashboard", get(dealer_client, "/api/dealer/dashboard/")),
+        Scenario("dealer_car_bookings", get(dealer_client, f"/api/dealer/cars/{car.pk}/bookings/")),
+        Scenario("create_booking", create_booking, expect_status=(201,)),
+        Scenario("my_bookings", get(customer, "/api/bookings/mine/")),
+    ]
+    dataset = {
+        "dealers": Dealer.objects.count(),
+        "cars": Car.objects.count(),
+        "bookings": Booking.objects.count(),
+        "bench_dealer_cars": dealer.n,
+        "bench_car_id": car.pk,
+    }
+    return scenarios, dataset
@@ -0,0 +1,148 @@
+"""
+Time to first successful request after a service starts, cold vs warmed.
+
+Each service is started ``--runs`` times per mode under gunicorn on SQLite
+databases (prepared as for ``benchmarks.loadgen``); the gateway runs
+stateless in front of warm accounts and rentals services. Per run it records:
+
+* ``ready``: spawn until ``/readyz`` first answers 200;
+* ``first_ok``: spawn until the service's representative request (rentals
+  ``GET /api/cars/``, accounts ``GET /api/auth/me/``, gateway ``GET /``)
+  first answers 200, and that request's latency (``first_ms``);
+* ``burst_max_ms``: the slowest of ``workers`` concurrent requests, repeated
+  three times, right after; each worker's own first request lands here.
+  ``slowest_ms`` is the larger of the two: what the unluckiest early user saw.
+
+Modes: ``cold`` (no preload, no warm-up: what the entrypoint did before),
+``preload`` (``preload_app`` only) and ``warm`` (the defaults: preload plus
+``STARTUP_WARMUP``). Medians over the runs are reported::
+
+    python -m benchmarks.startup --runs 5 --workers 2 --out startup.json
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.harness import git_revision
+from benchmarks.upstreams import ServiceProcess, prepare_local, service_env
+
+JWT_SECRET = "startup-secret"
+PASSWORD = "startup-password-430"
+
+MODES = {
+    "cold": {"GUNICORN_PRELOAD": "false", "STARTUP_WARMUP": "false"},
+    "preload": {"GUNICORN_PRELOAD": "true", "STARTUP_WARMUP": "false"},
+    "warm": {"GUNICORN_PRELOAD": "true", "STARTUP_WARMUP": "true"},
+}
+
+
+def representative(name, url, token):
+    if name == "rentals":
+        return requests.get(f"{url}/api/cars/", timeout=30)
+    if name == "accounts":
+        # Not login: its password hash would hide the start-up cost
+        return requests.get(f"{url}/api/auth/me/", headers={"Authorization": f"Bearer {token}"}, timeout=30)
+    return requests.get(f"{url}/", timeout=30)
+
+
+def wait_ok(send, started, timeout=60):
+    """Call ``send`` until it returns 200; returns (seconds since ``started``, latency ms)."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        sent = time.perf_counter()
+        try:
+            response = send()
+        except requests.RequestException:
+            response = None
+        if response is not None and response.status_code == 200:
+            now = time.perf_counter()
+            return now - started, (now - sent) * 1000
+        time.sleep(0.01)
+    raise RuntimeError("no successful response before the timeout")
+
+
+def run_once(name, env, workers, token):
+    started = time.perf_counter()
+    service = ServiceProcess(name, env, workers=workers).start(timeout=60)
+    try:
+        ready_s, _ = wait_ok(lambda: requests.get(f"{service.url}/readyz", timeout=30), started)
+        first_s, first_ms = wait_ok(lambda: representative(name, service.url, token), started)
+
+        def timed(_):
+            sent = time.perf_counter()
+            representative(name, service.url, token).raise_for_status()
+            return (time.perf_counter() - sent) * 1000
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            burst = [ms for _ in range(3) for ms in pool.map(timed, range(workers))]
+    finally:
+        service.stop()
+    return {
+        "ready_s": ready_s,
+        "first_ok_s": first_s,
+        "first_ms": first_ms,
+        "burst_max_ms": max(burst),
+        "slowest_ms": max(first_ms, *burst),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--services", default="rentals,accounts,gateway")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated: cold,preload,warm")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--workdir", help="Keep SQLite databases here and reuse them on later runs.")
+    parser.add_argument("--seed-args", default="--dealers 20 --cars 500 --bookings 5000")
+    parser.add_argument("--out", help="Write the JSON report here.")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ajerlo-startup-")
+    users = prepare_local(workdir, JWT_SECRET, users=2, password=PASSWORD, seed_args=args.seed_args.split())
+    envs = {name: service_env(name, workdir, JWT_SECRET) for name in ("accounts", "rentals")}
+    upstreams = [ServiceProcess(name, envs[name]).start() for name in ("accounts", "rentals")]
+    token = requests.post(f"{upstreams[0].url}/api/auth/login/", timeout=30, json={
+        "username": users["customers"][0], "password": users["password"],
+    }).json()["token"]
+    envs["gateway"] = service_env("gateway", workdir, JWT_SECRET, {
+        "ACCOUNTS_API_BASE": f"{upstreams[0].url}/api",
+        "RENTALS_API_BASE": f"{upstreams[1].url}/api",
+        "GATEWAY_STATELESS": "true",
+    })
+
+    results = []
+    try:
+        for name in args.services.split(","):
+            for mode in args.modes.split(","):
+                print(f"{name} {mode} ...")
+                runs = [run_once(name, {**envs[name], **MODES[mode]}, args.workers, token) for _ in range(args.runs)]
+                results.append({
+                    "service": name,
+                    "mode": mode,
+                    **{key: round(statistics.median(r[key] for r in runs), 3) for key in runs[0]},
+                    "runs": runs,
+                })
+    finally:
+        for service in upstreams:
+            service.stop()
+
+    print(f"\n{'service':<9} {'mode':<8} {'ready':>8} {'first ok':>9} {'first':>9} {'burst max':>10} {'slowest':>9}")
+    for r in results:
+        print(
+            f"{r['service']:<9} {r['mode']:<8} {r['ready_s']:>7.2f}s {r['first_ok_s']:>8.2f}s "
+            f"{r['first_ms']:>7.1f}ms {r['burst_max_ms']:>8.1f}ms {r['slowest_ms']:>7.1f}ms"
+        )
+    if args.out:
+        report = {"revision": git_revision(), "args": vars(args), "results": results}
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
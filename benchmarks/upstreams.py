@@ -0,0 +1,382 @@
+"""Local service processes and the recording/replaying proxy used by the load generator.
+
+The gateway under test talks to the accounts and rentals services through an
+``UpstreamProxy`` per service. In ``forward`` mode the proxy relays to a real
+service (optionally recording one response per route); in ``replay`` mode it
+serves those recordings, so the gateway can be loaded without running either
+service. Either way the proxy times every upstream call by route.
+"""
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from benchmarks.harness import REPO_ROOT, percentile
+
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "content-length", "content-encoding",
+}
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-f]{8}-[0-9a-f-]{27})$")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def route_of(method, path):
+    """``GET /api/cars/12/?page=2`` -> ``GET /api/cars/{id}/``."""
+    path = path.split("?", 1)[0]
+    parts = ["{id}" if _ID_SEGMENT.match(p) else p for p in path.split("/")]
+    return f"{method} {'/'.join(parts)}"
+
+
+class LatencyStats:
+    """Thread-safe latency samples and error counts keyed by name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._errors = {}
+
+    def add(self, name, ms, ok=True):
+        with self._lock:
+            self._samples.setdefault(name, []).append(ms)
+            if not ok:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def snapshot(self, reset=True):
+        with self._lock:
+            samples, errors = self._samples, self._errors
+            if reset:
+                self._samples, self._errors = {}, {}
+        return {name: summarize(values, errors.get(name, 0)) for name, values in sorted(samples.items())}
+
+
+def summarize(values, errors=0):
+    values = sorted(values)
+    count = len(values)
+    return {
+        "count": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "p50_ms": round(percentile(values, 50), 2) if values else None,
+        "p90_ms": round(percentile(values, 90), 2) if values else None,
+        "p99_ms": round(percentile(values, 99), 2) if values else None,
+        "max_ms": round(values[-1], 2) if values else None,
+    }
+
+
+# --------------------------------------------------------------------------
+# Proxy
+# --------------------------------------------------------------------------
+
+class UpstreamProxy:
+    """HTTP proxy in front of one upstream service that times (and records or replays) calls."""
+
+    def __init__(self, name, *, target=None, recordings=None, replay_latency=True, jwt_secret=None):
+        self.name = name
+        self.target = target.rstrip("/") if target else None
+        self.recordings = recordings if recordings is not None else {}
+        self.replay_latency = replay_latency
+        self.jwt_secret = jwt_secret
+        self.recording = False
+        self.stats = LatencyStats()
+        self._elapsed = {}
+        self._record_lock = threading.Lock()
+        self._local = threading.local()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                route = route_of(self.command, self.path)
+                start = time.perf_counter()
+                try:
+                    status, headers, payload = proxy.dispatch(self.command, self.path, self.headers, body, route)
+                except requests.RequestException as exc:
+                    status, headers, payload = 502, {"Content-Type": "application/json"}, json.dumps(
+                        {"detail": f"upstream error: {exc.__class__.__name__}"}
+                    ).encode()
+                elapsed = (time.perf_counter() - start) * 1000
+                proxy.stats.add(f"{proxy.name} {route}", elapsed, ok=status < 500)
+                if proxy.recording:
+                    proxy.record(route, status, headers, payload, elapsed)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def dispatch(self, method, path, headers, body, route):
+        if self.target:
+            return self._forward(method, path, headers, body)
+        return self._replay(route)
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _forward(self, method, path, headers, body):
+        forward_headers = {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP and k.lower() != "host"}
+        resp = self._session().request(
+            method, self.target + path, headers=forward_headers, data=body, timeout=30, allow_redirects=False
+        )
+        out = {k: v for k, v in resp.headers.items() if k.lower() not in HOP_BY_HOP}
+        return resp.status_code, out, resp.content
+
+    def _replay(self, route):
+        entry = self.recordings.get(route)
+        if entry is None:
+            return 404, {"Content-Type": "application/json"}, json.dumps(
+                {"detail": f"no recording for {route}"}
+            ).encode()
+        if self.replay_latency and entry.get("elapsed_ms"):
+            time.sleep(entry["elapsed_ms"] / 1000)
+        body = entry["body"]
+        if self.jwt_secret and '"token"' in body:
+            body = _refresh_token(body, self.jwt_secret)
+        return entry["status"], dict(entry["headers"]), body.encode()
+
+    def record(self, route, status, headers, payload, elapsed):
+        with self._record_lock:
+            self._elapsed.setdefault(route, []).append(elapsed)
+            # Keep the first successful response per route; failures only until one succeeds.
+            current = self.recordings.get(route)
+            if current is not None and current["status"] < 400:
+                return
+            headers = {k: v for k, v in headers.items() if k.lower() == "content-type"}
+            if any(v.startswith("application/msgpack") for v in headers.values()):
+                # Recordings stay readable JSON; clients decode by Content-Type
+                import msgpack
+
+                payload = json.dumps(msgpack.unpackb(payload, strict_map_key=False)).encode()
+                headers = {k: "application/json" for k in headers}
+            self.recordings[route] = {
+                "status": status,
+                "headers": headers,
+                "body": payload.decode("utf-8", errors="replace"),
+            }
+
+    def export_recordings(self):
+        for route, entry in self.recordings.items():
+            samples = self._elapsed.get(route)
+            if samples:
+                entry["elapsed_ms"] = round(statistics.median(samples), 2)
+        return self.recordings
+
+
+def _refresh_token(body, secret):
+    """Re-sign a recorded login token so replayed sessions do not expire."""
+    import jwt
+
+    data = json.loads(body)
+    claims = jwt.decode(data["token"], options={"verify_signature": False})
+    now = datetime.now(timezone.utc)
+    claims.update(iat=now, exp=now + timedelta(hours=1))
+    data["token"] = jwt.encode(claims, secret, algorithm="HS256")
+    return json.dumps(data)
+
+
+def load_recordings(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_recordings(path, proxies, meta):
+    data = {"meta": meta, **{p.name: p.export_recordings() for p in proxies}}
+    with open(path, "w") as fh:
+        json.dump(data, fh, indent=2)
+
+
+# --------------------------------------------------------------------------
+# Local service processes
+# --------------------------------------------------------------------------
+
+SERVICE_DIRS = {
+    "gateway": (".", "ajerlo.wsgi:application"),
+    "accounts": ("services/accounts_service", "accounts_service.wsgi:application"),
+    "rentals": ("services/rentals_service", "rentals_service.wsgi:application"),
+}
+
+
+def service_env(name, workdir, jwt_secret, extra=None):
+    env = dict(os.environ)
+    env.update(
+        DB_ENGINE="sqlite",
+        SQLITE_PATH=os.path.join(workdir, f"{name}.sqlite3"),
+        ACCOUNTS_JWT_SECRET=jwt_secret,
+        ACCOUNTS_JWT_ALG="HS256",
+        DEBUG="False",
+        PYTHONDONTWRITEBYTECODE="1",
+        # Every simulated user comes from 127.0.0.1
+        RATE_LIMIT_ENABLED="false",
+    )
+    env.update(extra or {})
+    return env
+
+
+def manage(name, env, *args, input_script=None):
+    """Run ``manage.py`` for service ``name``; returns stdout."""
+    cwd = REPO_ROOT / SERVICE_DIRS[name][0]
+    cmd = [sys.executable, "manage.py", *args]
+    if input_script is not None:
+        cmd += ["shell", "-c", input_script]
+    result = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{name}: manage.py {' '.join(args)} failed:\n{result.stderr[-2000:]}")
+    return result.stdout
+
+
+class ServiceProcess:
+    """A service served by gunicorn on a free localhost port.
+
+    ``asgi=True`` serves the project's ASGI application with uvicorn workers
+    (``threads`` does not apply).
+    """
+
+    def __init__(self, name, env, *, workers=2, threads=1, asgi=False):
+        self.name = name
+        self.env = env
+        self.workers = workers
+        self.threads = threads
+        self.asgi = asgi
+        self.port = free_port()
+        self.proc = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout=30):
+        cwd, wsgi = SERVICE_DIRS[self.name]
+        if self.asgi:
+            server = [wsgi.replace(".wsgi:", ".asgi:"), "--worker-class", "uvicorn.workers.UvicornWorker"]
+        else:
+            server = [wsgi, "--threads", str(self.threads)]
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", *server, "--bind", f"127.0.0.1:{self.port}",
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=REPO_ROOT / cwd, env=self.env,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"{self.name} exited with {self.proc.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.5):
+                    return self
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"{self.name} did not start listening within {timeout}s")
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+_ACCOUNTS_USERS_SCRIPT = """
+import json
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+User = get_user_model()
+password = make_password({password!r})
+ids = {{}}
+for username in {usernames!r}:
+    user, _ = User.objects.update_or_create(
+        username=username, defaults={{"email": username + "@load.local", "password": password}}
+    )
+    ids[username] = user.id
+print(json.dumps(ids))
+"""
+
+_RENTALS_ASSIGN_SCRIPT = """
+from rentals_api.models import Booking, Dealer
+dealer_user, customers, per_user = {dealer_user!r}, {customers!r}, {per_user!r}
+if not Dealer.objects.filter(user_id=dealer_user).exists():
+    dealer = Dealer.objects.order_by("id").first()
+    dealer.user_id = dealer_user
+    dealer.save(update_fields=["user_id"])
+ids = list(Booking.objects.order_by("id").values_list("id", flat=True)[: len(customers) * per_user])
+for index, user_id in enumerate(customers):
+    Booking.objects.filter(id__in=ids[index * per_user:(index + 1) * per_user]).update(user_id=user_id)
+"""
+
+
+def prepare_local(workdir, jwt_secret, *, users, password, seed_args, bookings_per_user=3, log=print):
+    """Migrate and seed SQLite databases for accounts and rentals in ``workdir``.
+
+    The gateway runs stateless (``GATEWAY_STATELESS``) and has no database.
+
+    Returns ``{"customers": [...usernames], "dealer": username, "password": ...}``.
+    Skipped (apart from reading the user list back) when ``workdir`` was prepared before.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    marker = os.path.join(workdir, "users.json")
+    if os.path.exists(marker):
+        with open(marker) as fh:
+            return json.load(fh)
+    envs = {name: service_env(name, workdir, jwt_secret) for name in ("accounts", "rentals")}
+    for name in envs:
+        log(f"migrating {name} ...")
+        manage(name, envs[name], "migrate", "--noinput", "-v0")
+    log("seeding rentals ...")
+    manage("rentals", envs["rentals"], "seed_scale", "--images-per-car", "0", *seed_args)
+
+    customers = [f"load_user_{i}" for i in range(users)]
+    dealer = "load_dealer"
+    out = manage("accounts", envs["accounts"],
+                 input_script=_ACCOUNTS_USERS_SCRIPT.format(password=password, usernames=customers + [dealer]))
+    ids = json.loads(out.strip().splitlines()[-1])
+    manage("rentals", envs["rentals"], input_script=_RENTALS_ASSIGN_SCRIPT.format(
+        dealer_user=ids[dealer], customers=[ids[u] for u in customers], per_user=bookings_per_user,
+    ))
+    info = {"customers": customers, "dealer": dealer, "password": password}
+    with open(marker, "w") as fh:
+        json.dump(info, fh)
+    return info
@@ -0,0 +1,91 @@
+"""
+Rebuild the cross-service waterfall of one request from span records.
+
+Reads JSON span lines written by the services' ``tracing`` module (TRACE_FILE
+files or captured stdout, e.g. ``docker compose logs``; non-span lines and log
+prefixes are skipped)::
+
+    python -m benchmarks.waterfall 3f2a... traces/*.jsonl
+    docker compose logs --no-log-prefix | python -m benchmarks.waterfall 3f2a... -
+"""
+import argparse
+import json
+import sys
+
+BAR_WIDTH = 50
+
+
+def read_spans(paths, request_id):
+    spans = []
+    for path in paths:
+        fh = sys.stdin if path == "-" else open(path)
+        try:
+            for line in fh:
+                brace = line.find("{")
+                if brace < 0 or request_id not in line:
+                    continue
+                try:
+                    record = json.loads(line[brace:])
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and record.get("trace") == request_id:
+                    spans.append(record)
+        finally:
+            if fh is not sys.stdin:
+                fh.close()
+    return spans
+
+
+def build_tree(spans):
+    """Order spans depth-first under their parents; returns ``[(depth, span)]``."""
+    by_id = {s["span"]: s for s in spans}
+    children = {}
+    roots = []
+    for s in sorted(spans, key=lambda s: s["start"]):
+        if s.get("parent") in by_id:
+            children.setdefault(s["parent"], []).append(s)
+        else:
+            roots.append(s)
+    ordered = []
+
+    def walk(node, depth):
+        ordered.append((depth, node))
+        for child in children.get(node["span"], []):
+            walk(child, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+    return ordered
+
+
+def render(ordered, stream=sys.stdout):
+    if not ordered:
+        stream.write("No spans found.\n")
+        return
+    t0 = min(s["start"] for _, s in ordered)
+    end = max(s["start"] + s["duration_ms"] / 1000 for _, s in ordered)
+    total_ms = max((end - t0) * 1000, 0.001)
+    stream.write(f"request {ordered[0][1]['trace']}: {len(ordered)} spans, {total_ms:.1f} ms\n\n")
+    for depth, s in ordered:
+        offset_ms = (s["start"] - t0) * 1000
+        lead = int(offset_ms / total_ms * BAR_WIDTH)
+        width = max(1, int(s["duration_ms"] / total_ms * BAR_WIDTH))
+        bar = " " * lead + "#" * min(width, BAR_WIDTH - lead)
+        label = f"{'  ' * depth}{s.get('service', '?')} {s['kind']} {s.get('view') or s['name']}"
+        if "status" in s:
+            label += f" [{s['status']}]"
+        stream.write(f"{label:<60.60} |{bar:<{BAR_WIDTH}}| {offset_ms:8.1f} +{s['duration_ms']:.1f} ms\n")
+        if s["kind"] == "sql" and s.get("sql"):
+            stream.write(f"{'  ' * (depth + 1)}{s['sql'][:100]}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.waterfall")
+    parser.add_argument("request_id")
+    parser.add_argument("files", nargs="+", help="Span files (JSON lines); '-' reads stdin.")
+    args = parser.parse_args(argv)
+    render(build_tree(read_spans(args.files, args.request_id)))
+
+
+if __name__ == "__main__":
+    main()
@@ -29,8 +29,13 @@ if [ "${RUN_MIGRATIONS:-false}" = "true" ]; then
   python manage.py migrate --noinput
 fi
 
-echo "Collecting static files..."
-python manage.py collectstatic --noinput --verbosity 0 || true
+# Static files are collected when the image is built; only collect again if the
+# manifest is missing or a source file is newer than it (e.g. static/ bind-mounted).
+MANIFEST=staticfiles/staticfiles.json  # STATIC_ROOT in ajerlo/settings.py
+if [ ! -f "$MANIFEST" ] || [ -n "$(find static -newer "$MANIFEST" -type f -print -quit 2>/dev/null)" ]; then
+  echo "Collecting static files..."
+  python manage.py collectstatic --noinput --verbosity 0 || true
+fi
 
 echo "Starting application: $*"
 exec "$@"
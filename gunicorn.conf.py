@@ -0,0 +1,19 @@
+"""
+gunicorn settings, loaded automatically from the working directory.
+
+The application is imported once in the master (``preload_app``), where
+``wsgi.py`` runs the fork-safe part of ajerlo.warmup, so workers start with
+the URLconf, templates and password validators already built. Each worker
+then opens its database connections (and pools) in ``post_worker_init``,
+before it accepts its first request. ``GUNICORN_PRELOAD=false`` imports the
+application in every worker instead.
+"""
+import os
+
+preload_app = str(os.getenv("GUNICORN_PRELOAD", "true")).lower() in {"1", "true", "yes", "on"}
+
+
+def post_worker_init(worker):
+    from ajerlo import warmup
+
+    warmup.warm_worker()
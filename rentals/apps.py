@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class RentalsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rentals'
+
+    def ready(self):
+        from ajerlo import stateless
+
+        stateless.verify()
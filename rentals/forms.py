@@ -1,97 +1,57 @@
 # rentals/forms.py
+#
+# Plain forms mirroring the rentals service's API fields (rentals_api.models.Car and
+# Booking). The gateway only validates input before posting it to the API; it has no
+# models of its own on the request path.
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
-from django.contrib.auth import get_user_model
 
-from .models import Car, Booking, Dealer, CarImage
+# Same choices as rentals_api.models.Car
+CAR_TYPES = [
+    ("sedan", "Sedan"),
+    ("suv", "SUV"),
+    ("hatch", "Hatchback"),
+    ("van", "Van"),
+]
+TRANSMISSIONS = [
+    ("AUTO", "Automatic"),
+    ("MANUAL", "Manual"),
+]
 
-User = get_user_model()
 
 # ---------------------------
-# Dealer self-serve signup
+# Dealer car management form
 # ---------------------------
-class DealerApplyForm(UserCreationForm):
-    email = forms.EmailField(required=True)
-    first_name = forms.CharField(required=False)
-    last_name = forms.CharField(required=False)
-
-    dealership_name = forms.CharField(
-        max_length=150,
-        help_text="Public name of your dealership as customers will see it.",
-        label="Dealership name",
-    )
-    dealership_email = forms.EmailField(
-        help_text="Contact email shown on your profile and used for notifications.",
-        label="Dealership email",
+class DealerCarForm(forms.Form):
+    title = forms.CharField(max_length=150)
+    car_type = forms.ChoiceField(choices=CAR_TYPES, initial="sedan", label="Car type")
+    price_per_day = forms.DecimalField(
+        max_digits=8, decimal_places=2, widget=forms.NumberInput(attrs={"step": "0.01"})
     )
-    dealership_phone = forms.CharField(
-        max_length=30,
+    currency = forms.CharField(max_length=3, initial="USD")
+    description = forms.CharField(
         required=False,
-        help_text="Optional phone number for customer contact.",
-        label="Dealership phone",
+        widget=forms.Textarea(
+            attrs={
+                "rows": 3,
+                "placeholder": "Tell customers what makes this car special, conditions, mileage, pickup notes…",
+            }
+        ),
     )
-
-    class Meta(UserCreationForm.Meta):
-        model = User
-        fields = ("username", "email", "first_name", "last_name")
-
-    def save(self, commit=True):
-        user = super().save(commit=False)
-        user.email = self.cleaned_data["email"]
-        user.first_name = self.cleaned_data.get("first_name", "")
-        user.last_name = self.cleaned_data.get("last_name", "")
-
-        if commit:
-            user.save()
-
-            Dealer.objects.create(
-                user=user,
-                name=self.cleaned_data["dealership_name"],
-                email=self.cleaned_data["dealership_email"],
-                phone=self.cleaned_data.get("dealership_phone", ""),
-                active=True,
-            )
-
-        return user
-
-
-# ---------------------------
-# Dealer car management form
-# ---------------------------
-class DealerCarForm(forms.ModelForm):
-    # Extra field for uploading a main photo (stored via CarImage in views)
+    available = forms.BooleanField(required=False, initial=True)
+    color = forms.CharField(max_length=30, required=False)
+    make = forms.CharField(max_length=100, required=False)
+    model = forms.CharField(max_length=100, required=False)
+    year = forms.IntegerField(required=False, widget=forms.NumberInput(attrs={"min": 1980, "max": 2100}))
+    transmission = forms.ChoiceField(choices=TRANSMISSIONS, initial="AUTO")
+    seats = forms.IntegerField(min_value=0, max_value=32767, required=False)
+    doors = forms.IntegerField(min_value=0, max_value=32767, required=False)
+    mileage_km = forms.IntegerField(min_value=0, required=False, label="Mileage km")
+    location_city = forms.CharField(max_length=120, required=False)
+    location_country = forms.CharField(max_length=120, required=False)
+    # Extra field for uploading a main photo (sent on to rentals with the car)
     image = forms.ImageField(required=False, label="Main photo")
-
-    class Meta:
-        model = Car
-        fields = (
-            "title",
-            "car_type",
-            "price_per_day",
-            "currency",
-            "description",
-            "available",
-            "color",
-            "make",
-            "model",
-            "year",
-            "transmission",
-            "seats",
-            "doors",
-            "mileage_km",
-            "location_city",
-            "location_country",
-        )
-        widgets = {
-            "description": forms.Textarea(
-                attrs={
-                    "rows": 3,
-                    "placeholder": "Tell customers what makes this car special, conditions, mileage, pickup notes…",
-                }
-            ),
-            "price_per_day": forms.NumberInput(attrs={"step": "0.01"}),
-            "year": forms.NumberInput(attrs={"min": 1980, "max": 2100}),
-        }
+    # Set by the chunked uploader once the photo has been sent straight to rentals
+    upload_id = forms.CharField(required=False, widget=forms.HiddenInput)
 
     def clean_year(self):
         year = self.cleaned_data.get("year")
@@ -100,45 +60,27 @@ class DealerCarForm(forms.ModelForm):
         return year
 
 
-class PriceForm(forms.ModelForm):
-    class Meta:
-        model = Car
-        fields = ("price_per_day",)
-        widgets = {
-            "price_per_day": forms.NumberInput(attrs={"step": "0.01"}),
-        }
+class PriceForm(forms.Form):
+    price_per_day = forms.DecimalField(
+        max_digits=8, decimal_places=2, widget=forms.NumberInput(attrs={"step": "0.01"})
+    )
 
 
 # ---------------------------
 # Booking form
 # ---------------------------
-class BookingForm(forms.ModelForm):
-    class Meta:
-        model = Booking
-        fields = ("start_date", "end_date", "insurance_selected")
-        widgets = {
-            "start_date": forms.DateInput(attrs={"type": "date"}),
-            "end_date": forms.DateInput(attrs={"type": "date"}),
-        }
-        labels = {
-            "insurance_selected": "Add insurance coverage ($20/day)",
-        }
-        help_texts = {
-            "insurance_selected": "Includes damage protection and roadside assistance.",
-        }
-
-
-# Legacy (kept)
-class CarForm(forms.ModelForm):
-    class Meta:
-        model = Car
-        fields = ("title", "car_type", "description", "price_per_day", "available")
-        widgets = {
-            "description": forms.Textarea(attrs={"rows": 3}),
-            "price_per_day": forms.NumberInput(attrs={"step": "0.01"}),
-        }
+class BookingForm(forms.Form):
+    start_date = forms.DateField(widget=forms.DateInput(attrs={"type": "date"}))
+    end_date = forms.DateField(widget=forms.DateInput(attrs={"type": "date"}))
+    insurance_selected = forms.BooleanField(
+        required=False,
+        label="Add insurance coverage ($20/day)",
+        help_text="Includes damage protection and roadside assistance.",
+    )
 
-class AccountUpdateForm(forms.ModelForm):
-    class Meta:
-        model = User
-        fields = ("first_name", "last_name", "email")
+    def clean(self):
+        data = super().clean()
+        start, end = data.get("start_date"), data.get("end_date")
+        if start and end and end < start:
+            self.add_error("end_date", "End date must be on or after the start date.")
+        return data
@@ -0,0 +1,66 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from ajerlo import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        "List stored request profiles, summarise them per view, or show one in detail. "
+        "--token prints an X-Profile header value that turns profiling on for a request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("profile_id", nargs="?", help="Show this profile's top functions and allocations.")
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--by-view", action="store_true", help="Aggregate stored profiles per view.")
+        parser.add_argument("--token", action="store_true", help="Print a signed X-Profile header value.")
+
+    def handle(self, *args, **opts):
+        if opts["token"]:
+            try:
+                token = profiling.make_token()
+            except ImproperlyConfigured as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(f"{profiling.PROFILE_HEADER}: {token}")
+            return
+        if opts["profile_id"]:
+            try:
+                self._show(profiling.load_profile(opts["profile_id"]))
+            except FileNotFoundError:
+                raise CommandError(f"No profile {opts['profile_id']!r}")
+            return
+        if opts["by_view"]:
+            self._by_view(profiling.list_profiles())
+            return
+        for p in profiling.list_profiles(opts["limit"]):
+            self.stdout.write(
+                f"{p['id']:<64} {p['method']:<6} {p['status'] or '-':<4} {p['duration_ms']:>9.1f} ms "
+                f"{p['peak_memory_kb']:>9.1f} KB  {p['path']}"
+            )
+
+    def _show(self, p):
+        self.stdout.write(
+            f"{p['method']} {p['path']} -> {p['status']} in {p['duration_ms']} ms, "
+            f"peak {p['peak_memory_kb']} KB ({p['reason']}, request {p['request_id']})\n"
+        )
+        self.stdout.write("Slowest functions (cumulative):")
+        for row in p["top_functions"]:
+            self.stdout.write(
+                f"  {row['cumulative_ms']:>10.2f} ms  own {row['own_ms']:>9.2f} ms  "
+                f"x{row['calls']:<6} {row['function']}"
+            )
+        self.stdout.write("\nTop allocation sites:")
+        for row in p["top_allocations"]:
+            self.stdout.write(f"  {row['size_kb']:>10.1f} KB  x{row['count']:<6} {row['site']}")
+
+    def _by_view(self, profiles):
+        views = {}
+        for p in profiles:
+            views.setdefault(p["view"], []).append(p)
+        for view, items in sorted(views.items(), key=lambda kv: -max(p["duration_ms"] for p in kv[1])):
+            durations = sorted(p["duration_ms"] for p in items)
+            self.stdout.write(
+                f"{view:<40} n={len(items):<4} median {durations[len(durations) // 2]:>9.1f} ms  "
+                f"max {durations[-1]:>9.1f} ms  peak {max(p['peak_memory_kb'] for p in items):>9.1f} KB"
+            )
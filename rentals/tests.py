@@ -1,3 +1,509 @@
-from django.test import TestCase
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
 
-# Create your tests here.
+import jwt
+import requests
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.utils import ConnectionHandler
+from django.template import TemplateDoesNotExist, engines
+from django.test import SimpleTestCase, override_settings
+from django.urls import resolve
+
+from ajerlo import api_client, balancer, ledger, ratelimit, stateless
+
+from . import views
+
+
+class AttachUsersTests(SimpleTestCase):
+    def booking(self, user_id, car):
+        return SimpleNamespace(user_id=user_id, car=car)
+
+    def test_only_renters_of_the_dealers_cars_are_looked_up(self):
+        own = self.booking(1, SimpleNamespace(id=10))
+        nested = self.booking(2, None)  # under one of the dealer's cars
+        foreign = self.booking(3, 99)
+        found = {1: {"username": "ann"}, 2: {"username": "bob"}}
+        with patch.object(views.api_client, "accounts_users_lookup", return_value=found) as lookup:
+            views._attach_users("token", [own, nested, foreign], {10})
+        lookup.assert_called_once_with("token", {1, 2})
+        self.assertEqual([b.user.username for b in (own, nested, foreign)], ["ann", "bob", "User 3"])
+
+    def test_accounts_failure_falls_back_to_placeholders(self):
+        booking = self.booking(5, 10)
+        with patch.object(views.api_client, "accounts_users_lookup", side_effect=RuntimeError("down")):
+            views._attach_users("token", [booking], {10})
+        self.assertEqual(booking.user.username, "User 5")
+
+
+class UpstreamUnavailableTests(SimpleTestCase):
+    def test_car_list_and_detail_answer_503(self):
+        down = api_client.CircuitOpen("rentals circuit is open")
+        with patch.object(views.api_client, "rentals_list", side_effect=down):
+            resp = self.client.get("/rentals/")
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "5")
+        self.assertContains(resp, "Briefly unavailable", status_code=503)
+        with patch.object(views.api_client, "rentals_detail", side_effect=down):
+            self.assertEqual(self.client.get("/rentals/1/").status_code, 503)
+
+    def test_missing_car_still_redirects(self):
+        with patch.object(views.api_client, "rentals_detail", side_effect=RuntimeError("404")):
+            resp = self.client.get("/rentals/1/")
+        self.assertRedirects(resp, "/rentals/", fetch_redirect_response=False)
+
+
+class CoalescingTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = api_client._breakers["rentals"]
+        self.breaker._transition(self.breaker.CLOSED)
+        self.addCleanup(self.breaker._transition, self.breaker.CLOSED)
+
+    def failing_get(self, calls):
+        def get(url, **kwargs):
+            calls.append(url)
+            time.sleep(0.3)  # long enough for every caller to join
+            response = requests.Response()
+            response.status_code = 500
+            response.url = url
+            return response
+        return get
+
+    def test_shared_failure_counts_once_towards_the_breaker(self):
+        calls = []
+        with patch.object(api_client._http, "get", side_effect=self.failing_get(calls)):
+            with ThreadPoolExecutor(8) as pool:
+                futures = [pool.submit(api_client.rentals_detail, 1) for _ in range(8)]
+            errors = [f.exception() for f in futures]
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(e, requests.HTTPError) for e in errors))
+        self.assertEqual(list(self.breaker._window), [(True, False)])
+
+    def test_client_traced_requests_are_not_coalesced(self):
+        response = requests.Response()
+        response.status_code, response._content = 200, b"{}"
+        with patch.object(api_client.tracing, "traced_by_client", return_value=True), \
+                patch.object(api_client._inflight, "do") as do, \
+                patch.object(api_client._http, "get", return_value=response) as get:
+            api_client.rentals_detail(1)
+        do.assert_not_called()
+        get.assert_called_once()
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = api_client._CircuitBreaker("tests")
+        quiet = patch.object(api_client, "logger")  # opening logs a warning
+        quiet.start()
+        self.addCleanup(quiet.stop)
+
+    def calls(self, failed=False, slow=False, n=api_client.BREAKER_MIN_CALLS):
+        for _ in range(n):
+            self.breaker.record(self.breaker.before_call(), failed, slow)
+
+    def open_expired(self):
+        self.breaker._opened_at -= api_client.BREAKER_OPEN_SECONDS
+
+    def test_opens_on_errors_once_enough_calls_are_seen(self):
+        self.calls(failed=True, n=api_client.BREAKER_MIN_CALLS - 1)
+        self.assertEqual(self.breaker.state, "closed")
+        self.calls(failed=True, n=1)
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(api_client.CircuitOpen):
+            self.breaker.before_call()
+
+    def test_opens_on_slow_calls(self):
+        self.calls(slow=True)
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_healthy_calls_keep_it_closed(self):
+        self.calls(n=api_client.BREAKER_MIN_CALLS // 2)
+        self.calls(failed=True, n=api_client.BREAKER_MIN_CALLS // 2 - 1)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open_trials_close_it(self):
+        self.calls(failed=True)
+        self.open_expired()
+        for _ in range(api_client.BREAKER_HALF_OPEN_SUCCESSES):
+            self.assertTrue(self.breaker.before_call())
+            self.assertEqual(self.breaker.state, "half_open")
+            with self.assertRaisesMessage(api_client.CircuitOpen, "trial call in progress"):
+                self.breaker.before_call()
+            self.breaker.record(True, False, False)
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertFalse(self.breaker.before_call())
+
+    def test_failed_trial_reopens_it(self):
+        self.calls(failed=True)
+        self.open_expired()
+        self.breaker.record(self.breaker.before_call(), True, False)
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(api_client.CircuitOpen):
+            self.breaker.before_call()
+
+
+class RetryTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = api_client._breakers["rentals"]
+        self.breaker._transition(self.breaker.CLOSED)
+        self.addCleanup(self.breaker._transition, self.breaker.CLOSED)
+        self.sent = []
+
+    def send(self, status):
+        def send(adapter, request, **kwargs):
+            self.sent.append((request, kwargs["timeout"]))
+            response = requests.Response()
+            response.status_code, response._content, response.url = status, b"{}", request.url
+            return response
+        return patch.object(requests.adapters.HTTPAdapter, "send", send)
+
+    def test_budget_allows_retries_up_to_its_tokens(self):
+        budget = api_client._RetryBudget(ratio=0.5, min_per_second=0, cap=2)
+        self.assertEqual([budget.withdraw() for _ in range(3)], [True, True, False])
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+    def test_read_is_retried_while_the_budget_allows(self):
+        with self.send(503), patch.object(api_client, "UPSTREAM_RETRY_BACKOFF", 0):
+            with self.assertRaises(requests.HTTPError):
+                api_client.rentals_detail(1, token="t")
+            self.assertEqual(len(self.sent), 1 + api_client.UPSTREAM_RETRIES)
+            self.sent.clear()
+            spent = api_client._RetryBudget(ratio=0, min_per_second=0, cap=0)
+            with patch.object(api_client, "_retry_budget", spent), self.assertRaises(requests.HTTPError):
+                api_client.rentals_detail(1, token="t")
+            self.assertEqual(len(self.sent), 1)
+
+    def test_each_class_sends_its_own_timeout(self):
+        calls = {
+            "read": lambda: api_client.rentals_my_bookings("t"),
+            "write": lambda: api_client.rentals_booking_create("t", {"car_id": 1}),
+            "upload": lambda: api_client.rentals_dealer_car_create("t", {"title": "Golf"}),
+        }
+        with self.send(200), patch.object(api_client, "decode", return_value={"results": []}):
+            for kind, call in calls.items():
+                self.sent.clear()
+                call()
+                request, timeout = self.sent[0]
+                with self.subTest(kind=kind):
+                    self.assertEqual(timeout, api_client.TIMEOUTS[kind])
+                    self.assertEqual(request.headers["X-Request-Budget-Ms"], str(int(api_client.TIMEOUTS[kind][1] * 1000)))
+
+@override_settings(SERVER_TIMING=True, PAGE_UPSTREAM_CALL_BUDGET=5, PAGE_UPSTREAM_TIME_BUDGET_MS=10_000)
+class LedgerTests(SimpleTestCase):
+    def setUp(self):
+        def send(adapter, request, **kwargs):
+            time.sleep(0.002)
+            response = requests.Response()
+            response.status_code, response._content = 200, b'{"results": [], "pages": 1}'
+            response.headers["Content-Type"] = "application/json"
+            return response
+
+        upstream = patch.object(requests.adapters.HTTPAdapter, "send", send)
+        upstream.start()
+        self.addCleanup(upstream.stop)
+        self.view = resolve("/rentals/").view_name
+
+    def test_server_timing_lists_calls_render_and_total(self):
+        timing = self.client.get("/rentals/")["Server-Timing"]
+        self.assertRegex(timing, r"^rentals_list;dur=[\d.]+, render;dur=[\d.]+, total;dur=[\d.]+$")
+        with self.settings(SERVER_TIMING=False):
+            self.assertNotIn("Server-Timing", self.client.get("/rentals/"))
+
+    def test_pages_within_budget_are_not_flagged(self):
+        with patch.object(ledger, "logger") as log:
+            self.client.get("/rentals/")
+        log.warning.assert_not_called()
+
+    @override_settings(PAGE_UPSTREAM_CALL_BUDGET=0)
+    def test_call_budget(self):
+        with self.assertLogs("ajerlo.ledger", "WARNING") as logs:
+            self.client.get("/rentals/")
+        self.assertIn(f"{self.view} (calls)", logs.output[0])
+
+    @override_settings(PAGE_UPSTREAM_TIME_BUDGET_MS=1)
+    def test_time_budget_and_its_overrides(self):
+        with self.assertLogs("ajerlo.ledger", "WARNING") as logs:
+            self.client.get("/rentals/")
+        self.assertIn(f"{self.view} (latency)", logs.output[0])
+        with self.settings(PAGE_UPSTREAM_BUDGET_OVERRIDES={self.view: {"time_ms": 10_000}}), \
+                patch.object(ledger, "logger") as log:
+            self.client.get("/rentals/")
+        log.warning.assert_not_called()
+
+    def test_repeated_call_is_flagged(self):
+        page = ledger.Ledger()
+        token = ledger._ledger.set(page)
+        self.addCleanup(ledger._ledger.reset, token)
+        ledger.record_call("rentals_detail", 0.01, key=("rentals_detail", "(1,)"))
+        ledger.record_call("rentals_detail", 0.01, key=("rentals_detail", "(2,)"))
+        self.assertEqual(ledger.over_budget(page, "car_detail"), [])
+        ledger.record_call("rentals_detail", 0.01, key=("rentals_detail", "(1,)"))
+        self.assertEqual(ledger.over_budget(page, "car_detail"), ["duplicate"])
+        self.assertEqual(ledger.server_timing(page, 0.05), 'rentals_detail;dur=30.0;desc="3 calls", total;dur=50.0')
+
+    def test_template_render_time_is_recorded(self):
+        engine = engines.all()[0]
+        self.assertIsInstance(engine, ledger.TimedDjangoTemplates)
+        page = ledger.Ledger()
+        token = ledger._ledger.set(page)
+        self.addCleanup(ledger._ledger.reset, token)
+        self.assertEqual(engine.from_string("{{ n }}").render({"n": 7}), "7")
+        self.assertGreater(page.render_seconds, 0)
+        with self.assertRaises(TemplateDoesNotExist):
+            engine.get_template("missing.html")
+
+class BalancerTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(balancer._balancers.pop, "shop", None)
+        quiet = patch.object(balancer, "logger")  # ejections log a warning
+        quiet.start()
+        self.addCleanup(quiet.stop)
+
+    def balanced(self, *netlocs):
+        base = balancer.register("shop", ",".join(f"http://{netloc}/api" for netloc in netlocs))
+        return base, balancer._balancers["shop"]
+
+    def fail(self, endpoint, times=balancer.UPSTREAM_EJECT_AFTER):
+        for _ in range(times):
+            endpoint.started()
+            endpoint.finished(0.01, ok=False)
+
+    def test_single_url_is_not_balanced(self):
+        self.assertEqual(balancer.register("shop", "http://a:1/api"), "http://a:1/api")
+        self.assertNotIn("shop", balancer._balancers)
+
+    def test_p2c_takes_the_less_loaded_of_two(self):
+        _, upstream = self.balanced("a:1", "b:2", "c:3")
+        a, b, c = upstream.endpoints
+        a.in_flight, b.in_flight, c.in_flight = 5, 3, 0
+        with patch.object(balancer.random, "sample", return_value=[a, b]):
+            self.assertIs(upstream.pick(), b)
+
+    def test_least_outstanding_takes_the_least_loaded_of_all(self):
+        _, upstream = self.balanced("a:1", "b:2", "c:3")
+        a, b, c = upstream.endpoints
+        a.in_flight, b.in_flight, c.in_flight = 5, 3, 0
+        with patch.object(balancer, "UPSTREAM_BALANCER", "least_outstanding"), \
+                patch.object(balancer.random, "sample", return_value=[a, b]):
+            self.assertIs(upstream.pick(), c)
+
+    def test_ejection_backs_off_and_readmits(self):
+        _, upstream = self.balanced("a:1", "b:2")
+        a, b = upstream.endpoints
+        a.in_flight = 1  # b would be picked for load alone
+        self.fail(b, balancer.UPSTREAM_EJECT_AFTER - 1)
+        self.assertIs(upstream.pick(), b)
+        self.fail(b, 1)
+        self.assertIs(upstream.pick(), a)
+        first = b.ejected_until - time.monotonic()
+        self.assertAlmostEqual(first, balancer.UPSTREAM_EJECT_SECONDS, delta=0.5)
+        b.ejected_until = 0.0  # the ejection ran out
+        self.assertIs(upstream.pick(), b)
+        self.fail(b)
+        self.assertAlmostEqual(b.ejected_until - time.monotonic(), 2 * balancer.UPSTREAM_EJECT_SECONDS, delta=0.5)
+        b.ejected_until = 0.0
+        b.started()
+        b.finished(0.01, ok=True)
+        self.fail(b)
+        self.assertAlmostEqual(b.ejected_until - time.monotonic(), balancer.UPSTREAM_EJECT_SECONDS, delta=0.5)
+
+    def test_every_endpoint_ejected_uses_them_all(self):
+        _, upstream = self.balanced("a:1", "b:2")
+        for endpoint in upstream.endpoints:
+            self.fail(endpoint)
+        self.assertIn(upstream.pick(), upstream.endpoints)
+
+    def test_dns_is_re_resolved_after_its_ttl(self):
+        def addresses(*ips):
+            return [(None, None, None, "", (ip, 8002)) for ip in ips]
+
+        with patch.object(balancer.socket, "getaddrinfo", return_value=addresses("10.0.0.5", "10.0.0.6")):
+            base = balancer.register("shop", "dns+http://rentals-headless:8002/api/rentals")
+        self.assertEqual(base, "http://shop/api/rentals")
+        upstream = balancer._balancers["shop"]
+        kept = upstream.endpoints[1]
+        self.assertEqual([e.netloc for e in upstream.endpoints], ["10.0.0.5:8002", "10.0.0.6:8002"])
+        with patch.object(balancer.socket, "getaddrinfo", return_value=addresses("10.0.0.6", "10.0.0.7")) as lookup:
+            upstream.pick()
+            lookup.assert_not_called()  # still fresh
+            upstream._resolved_at -= balancer.UPSTREAM_DNS_TTL + 1
+            upstream.pick()
+        self.assertEqual([e.netloc for e in upstream.endpoints], ["10.0.0.6:8002", "10.0.0.7:8002"])
+        self.assertIs(upstream.endpoints[0], kept)
+
+    def test_adapter_sends_the_logical_host_to_an_endpoint(self):
+        base, upstream = self.balanced("a:1", "b:2")
+        sent = []
+
+        def send(adapter, request, **kwargs):
+            sent.append(request.url)
+            response = requests.Response()
+            response.status_code = 500
+            return response
+
+        request = requests.Request("GET", f"{base}/cars/?page=2").prepare()
+        with patch.object(requests.adapters.HTTPAdapter, "send", send):
+            balancer.BalancingAdapter().send(request)
+        self.assertIn(sent[0], ["http://a:1/api/cars/?page=2", "http://b:2/api/cars/?page=2"])
+        endpoint = next(e for e in upstream.endpoints if sent[0].startswith(e.url))
+        self.assertEqual((endpoint.in_flight, endpoint.failures), (0, 1))
+
+    def test_readiness_is_probed_per_endpoint(self):
+        base, upstream = self.balanced("a:1", "b:2")
+        a, b = upstream.endpoints
+
+        def get(url, **kwargs):
+            if url.startswith(b.url):
+                raise requests.ConnectionError("refused")
+            return SimpleNamespace(status_code=200)
+
+        readiness = api_client._Readiness("shop", base)
+        with patch.object(api_client._http, "get", side_effect=get) as probe:
+            self.assertEqual(readiness.probe(), 200)
+        self.assertEqual(sorted(call.args[0] for call in probe.call_args_list), ["http://a:1/readyz", "http://b:2/readyz"])
+        self.assertTrue(a.available(time.monotonic()))
+        self.assertFalse(b.available(time.monotonic()))
+
+@override_settings(RATE_LIMITS={"browse": (1, 1), "auth": (1, 1)}, RATE_LIMIT_NUM_PROXIES=1)
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        listing = patch.object(views.api_client, "rentals_list", return_value={"results": [], "pages": 1})
+        listing.start()
+        self.addCleanup(listing.stop)
+
+    def bearer(self, user_id):
+        token = jwt.encode({"user_id": user_id}, settings.ACCOUNTS_JWT_SECRET, algorithm=settings.ACCOUNTS_JWT_ALG)
+        return {"Authorization": f"Bearer {token}"}
+
+    def test_bearer_header_on_limited_route(self):
+        self.assertEqual(self.client.post("/accounts/login/", headers=self.bearer(1)).status_code, 200)
+        self.assertEqual(self.client.post("/accounts/login/", headers=self.bearer(1)).status_code, 429)
+
+    def test_signed_in_clients_are_keyed_by_user(self):
+        self.assertEqual(self.client.get("/rentals/", headers=self.bearer(1)).status_code, 200)
+        self.assertEqual(self.client.get("/rentals/", headers=self.bearer(1)).status_code, 429)
+        self.assertEqual(self.client.get("/rentals/", headers=self.bearer(2)).status_code, 200)
+
+    def test_anonymous_clients_are_keyed_by_forwarded_address(self):
+        first = {"X-Forwarded-For": "203.0.113.7"}
+        resp = self.client.get("/rentals/", headers=first)
+        self.assertEqual(resp.status_code, 200)
+        resp = self.client.get("/rentals/", headers=first)
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp["Retry-After"], "1")
+        # Behind nginx every client shares REMOTE_ADDR; only the forwarded address tells them apart
+        self.assertEqual(self.client.get("/rentals/", headers={"X-Forwarded-For": "203.0.113.8"}).status_code, 200)
+
+    @override_settings(RATE_LIMIT_LOCAL_MAX_KEYS=10)
+    def test_local_store_drops_the_least_recently_used_keys_in_batches(self):
+        store = ratelimit.LocalStore()
+        for i in range(10):
+            store.acquire(f"ip:{i}", 1.0, 5)
+        store.acquire("ip:0", 1.0, 5)  # used again: now the most recent
+        store.acquire("ip:10", 1.0, 5)
+        self.assertEqual(list(store._tat), [f"ip:{i}" for i in range(3, 10)] + ["ip:0", "ip:10"])
+        store.acquire("ip:11", 1.0, 5)  # room left after the batch
+        self.assertEqual(len(store._tat), 10)
+
+    def test_async_capable(self):
+        async def get_response(request):
+            return None
+
+        middleware = ratelimit.RateLimitMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertTrue(iscoroutinefunction(middleware.process_view))
+
+
+# What GATEWAY_STATELESS=true gives in ajerlo.settings
+STATELESS = {
+    "GATEWAY_STATELESS": True,
+    "INSTALLED_APPS": [app for app in settings.INSTALLED_APPS if app not in stateless.STATEFUL_APPS],
+    "MIDDLEWARE": [m for m in settings.MIDDLEWARE if m not in stateless.STATEFUL_MIDDLEWARE],
+    "MESSAGE_STORAGE": stateless.COOKIE_MESSAGES,
+}
+
+
+@override_settings(**STATELESS)
+class StatelessTests(SimpleTestCase):
+    def setUp(self):
+        # Not override_settings: the test run keeps its own connections either way
+        self.databases_setting({"default": {"ENGINE": stateless.NODB_ENGINE}})
+
+    def databases_setting(self, value):
+        databases = patch.object(settings, "DATABASES", value)
+        databases.start()
+        self.addCleanup(databases.stop)
+
+    def test_stateless_settings_pass(self):
+        self.assertEqual(stateless.problems(), [])
+        stateless.verify()
+
+    def test_settings_that_need_a_database_are_refused(self):
+        stateful = {
+            "INSTALLED_APPS": STATELESS["INSTALLED_APPS"] + ["django.contrib.admin"],
+            "MIDDLEWARE": ["django.contrib.sessions.middleware.SessionMiddleware"] + STATELESS["MIDDLEWARE"],
+            "MESSAGE_STORAGE": "django.contrib.messages.storage.fallback.FallbackStorage",
+        }
+        for name, value in stateful.items():
+            with self.subTest(setting=name), self.settings(**{name: value}):
+                with self.assertRaisesMessage(ImproperlyConfigured, "GATEWAY_STATELESS"):
+                    stateless.verify()
+        self.databases_setting({"default": {"ENGINE": "django.db.backends.sqlite3"}})
+        with self.assertRaisesMessage(ImproperlyConfigured, "DATABASES must all use ajerlo.nodb"):
+            stateless.verify()
+
+    @override_settings(GATEWAY_STATELESS=False)
+    def test_nothing_is_checked_when_off(self):
+        self.databases_setting({"default": {"ENGINE": "django.db.backends.sqlite3"}})
+        self.assertEqual(stateless.problems(), [])
+
+    def test_queries_fail_loudly(self):
+        connection = ConnectionHandler({"default": {"ENGINE": stateless.NODB_ENGINE}})["default"]
+        with self.assertRaisesMessage(ImproperlyConfigured, "runs without a database"):
+            connection.cursor()
+
+    def test_pages_are_served_without_sessions(self):
+        listing = {"results": [], "pages": 1}
+        with patch.object(views.api_client, "rentals_list", return_value=listing):
+            self.assertEqual(self.client.get("/rentals/").status_code, 200)
+            self.assertEqual(self.client.get("/").status_code, 200)
+
+    def test_messages_use_the_cookie_store(self):
+        self.client.cookies["auth_token"] = "token"
+        with patch("accounts.views.api_client.rentals_my_bookings", side_effect=RuntimeError("down")):
+            resp = self.client.get("/accounts/dashboard/")
+        self.assertContains(resp, "Could not load bookings.")
+
+ROOT = Path(__file__).resolve().parent.parent
+GATEWAY, ACCOUNTS, RENTALS = (
+    ROOT / "ajerlo",
+    ROOT / "services" / "accounts_service" / "accounts_service",
+    ROOT / "services" / "rentals_service" / "rentals_service",
+)
+# Modules each image carries its own copy of; they must stay identical
+SHARED_MODULES = {
+    "metrics.py": (GATEWAY, ACCOUNTS, RENTALS),
+    "tracing.py": (GATEWAY, ACCOUNTS, RENTALS),
+    "profiling.py": (GATEWAY, ACCOUNTS, RENTALS),
+    "health.py": (GATEWAY, ACCOUNTS, RENTALS),
+    "warmup.py": (GATEWAY, ACCOUNTS, RENTALS),
+    "ratelimit.py": (GATEWAY, RENTALS),
+    "payloads.py": (ACCOUNTS, RENTALS),
+    "querylog.py": (ACCOUNTS, RENTALS),
+}
+
+
+class SharedModuleTests(SimpleTestCase):
+    def test_copies_are_identical(self):
+        for name, dirs in SHARED_MODULES.items():
+            first = (dirs[0] / name).read_text()
+            for other in dirs[1:]:
+                with self.subTest(module=name, copy=str(other.relative_to(ROOT))):
+                    self.assertEqual((other / name).read_text(), first, f"{other / name} differs from {dirs[0] / name}")
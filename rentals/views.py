@@ -3,11 +3,18 @@ from functools import wraps
 from types import SimpleNamespace
 
 from django import forms
+from django.conf import settings
 from django.contrib import messages
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 from datetime import date as date_cls
 
+import requests
+
 from ajerlo import api_client
 from .forms import BookingForm, DealerCarForm, PriceForm
 import json
@@ -48,9 +55,18 @@ def _ns(obj):
     return obj
 
 
+HOME_STRIP_CACHE_KEY = "home:newest-cars"
+
+
 def home(request):
-    data = api_client.rentals_list({"sort": "newest", "page": 1})
+    try:
+        data = api_client.rentals_list({"sort": "newest", "page": 1})
+    except requests.RequestException:
+        # Rentals is failing (or its circuit is open): serve the last strip this worker rendered.
+        cars = cache.get(HOME_STRIP_CACHE_KEY, [])
+        return render(request, "home.html", {"cars": cars, "stale": True})
     cars = _add_pk(data.get("results", [])[:8])
+    cache.set(HOME_STRIP_CACHE_KEY, cars, None)
     return render(request, "home.html", {"cars": cars})
 
 
@@ -98,6 +114,8 @@ def car_detail(request, pk):
     token = _token(request)
     try:
         car = _add_pk(api_client.rentals_detail(pk, token=token))
+    except api_client.UpstreamUnavailable:
+        raise  # a 503 page, not "not found"
     except Exception:
         messages.error(request, "Car not found.")
         return redirect("car_list")
@@ -169,89 +187,46 @@ def dealer_required(view_fn):
     return _wrapped
 
 
-def _month_bounds(anchor=None):
-    """Return the first day of the month and the first day of the next month."""
-    anchor = anchor or timezone.localdate()
-    month_start = anchor.replace(day=1)
-    if month_start.month == 12:
-        month_end = month_start.replace(year=month_start.year + 1, month=1, day=1)
-    else:
-        month_end = month_start.replace(month=month_start.month + 1, day=1)
-    return month_start, month_end
+def _user_ns(user_id, info=None):
+    """Build the template-facing user object for a booking's customer."""
+    info = info or {}
+    username = info.get("username") or f"User {user_id}"
+    full_name = info.get("full_name") or ""
+    return SimpleNamespace(
+        id=user_id,
+        username=username,
+        email=info.get("email") or "",
+        first_name=info.get("first_name") or "",
+        last_name=info.get("last_name") or "",
+        get_full_name=lambda: full_name,
+    )
 
 
-def _attach_car_schedule(car, *, month_start, today, months=1, upcoming_limit=3):
-    """Attach availability info (current/next booking and calendar weeks) to a car."""
-    base_qs = (
-        Booking.objects
-        .filter(car=car, status__in=ACTIVE_BOOKING_STATUSES)
-        .select_related("user")
-    )
-    current = base_qs.filter(
-        start_date__lte=today,
-        end_date__gte=today,
-    ).order_by("start_date").first()
-    next_b = base_qs.filter(start_date__gt=today).order_by("start_date").first()
-    upcoming_qs = base_qs.filter(start_date__gte=today).order_by("start_date")
-    if upcoming_limit is not None:
-        upcoming_qs = upcoming_qs[:upcoming_limit]
-    upcoming = list(upcoming_qs)
-    # Gather bookings during the span we render
-    month_ends = []
-    m_start = month_start
-    for i in range(months):
-        _, next_start = _month_bounds(m_start)
-        month_ends.append(next_start)
-        m_start = next_start
-    month_end = month_ends[-1]
-
-    ranges = list(
-        base_qs.filter(
-            end_date__gte=month_start,
-            start_date__lt=month_end,
-        ).values("start_date", "end_date")
-    )
+def _booking_car_id(booking):
+    car = getattr(booking, "car", None)
+    return getattr(car, "id", car)
 
-    months_data = []
-    m_start = month_start
-    for i in range(months):
-        cal = calendar.Calendar(firstweekday=0).monthdatescalendar(m_start.year, m_start.month)
-        weeks = []
-        for week in cal:
-            row = []
-            for d in week:
-                in_month = (d.month == m_start.month)
-                booked = False
-                if in_month:
-                    for r in ranges:
-                        if r["start_date"] <= d <= r["end_date"]:
-                            booked = True
-                            break
-                row.append(
-                    {
-                        "date": d,
-                        "in_month": in_month,
-                        "booked": booked,
-                        "today": d == today,
-                    }
-                )
-            weeks.append(row)
-        months_data.append(
-            {
-                "label": m_start.strftime("%B %Y"),
-                "weeks": weeks,
-            }
-        )
-        # next month start
-        if m_start.month == 12:
-            m_start = m_start.replace(year=m_start.year + 1, month=1, day=1)
-        else:
-            m_start = m_start.replace(month=m_start.month + 1, day=1)
 
-    car.current_booking = current
-    car.next_booking = next_b
-    car.calendar_months = months_data
-    car.upcoming_bookings = upcoming
+def _attach_users(token, bookings, car_ids):
+    """Attach ``booking.user`` to every booking using one batched accounts lookup.
+
+    Only the renters of bookings on ``car_ids`` (the signed-in dealer's cars) are
+    looked up; bookings nested under one of those cars carry no car of their own.
+    Anyone else keeps the ``User <id>`` placeholder.
+    """
+    pending = [
+        b for b in bookings
+        if getattr(b, "user", None) is None and getattr(b, "user_id", None) is not None
+    ]
+    if not pending:
+        return
+    renters = {b.user_id for b in pending if _booking_car_id(b) in car_ids or _booking_car_id(b) is None}
+    try:
+        users = api_client.accounts_users_lookup(token, renters) if renters else {}
+    except Exception:
+        users = {}
+    for b in pending:
+        b.user = _user_ns(b.user_id, users.get(b.user_id) if b.user_id in renters else None)
 
 
 # ---------------------------
@@ -275,20 +250,17 @@ def dealer_dashboard(request):
     month_bookings = _ns(data.get("month_bookings", []))
     month_start = data.get("month_start")
     today = timezone.localdate()
-    # Populate user placeholder to avoid template errors
-    def _attach_user(obj):
-        if isinstance(obj, list):
-            for b in obj:
-                _attach_user(b)
-        else:
-            if getattr(obj, "user", None) is None and getattr(obj, "user_id", None) is not None:
-                obj.user = SimpleNamespace(username=f"User {obj.user_id}", email="", get_full_name=lambda: f"User {obj.user_id}")
-    _attach_user(month_bookings)
-    _attach_user(pending_bookings)
+    # The API returns booking.car as an id; the dealer's own cars are already on the page.
+    cars_by_id = {car.id: car for car in cars}
+    for b in list(month_bookings) + list(pending_bookings):
+        if not isinstance(b.car, SimpleNamespace):
+            b.car = cars_by_id.get(b.car) or SimpleNamespace(id=b.car, pk=b.car, title=f"Car #{b.car}")
+    page_bookings = list(month_bookings) + list(pending_bookings)
     for car in cars:
-        _attach_user(getattr(car, "upcoming_bookings", []))
+        page_bookings.extend(getattr(car, "upcoming_bookings", None) or [])
         if getattr(car, "next_booking", None):
-            _attach_user(car.next_booking)
+            page_bookings.append(car.next_booking)
+    _attach_users(token, page_bookings, set(cars_by_id))
     return render(
         request,
         "dealer/dashboard.html",
@@ -326,12 +298,37 @@ def dealer_add_car(request):
             return redirect("dealer_dashboard")
         else:
             try:
-                detail = resp.json().get("detail") or "Could not add car."
+                detail = api_client.decode(resp).get("detail") or "Could not add car."
             except Exception:
                 detail = "Could not add car."
             messages.error(request, detail)
     return render(request, "dealer/car_form.html", {"form": form, "title": "Add Car"})
 
+@require_POST
+@dealer_required
+def dealer_upload_session(request):
+    """Broker a signed upload session so the browser can send photos straight to rentals."""
+    token = _token(request)
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        body = {}
+    payload = {
+        "filename": body.get("filename") or "",
+        "size": body.get("size") or 0,
+        "content_type": body.get("content_type") or "",
+    }
+    try:
+        resp = api_client.rentals_upload_session_create(token, payload)
+        data = api_client.decode(resp)
+    except Exception:
+        return JsonResponse({"detail": "Upload service unavailable."}, status=502)
+    if resp.status_code != 201:
+        return JsonResponse({"detail": data.get("detail") or "Could not start upload."}, status=resp.status_code)
+    base = settings.RENTALS_UPLOAD_PUBLIC_BASE.rstrip("/")
+    data["upload_url"] = f"{base}/{data['id']}/?token={data.pop('token')}"
+    return JsonResponse(data, status=201)
+
 # rentals/views.py
 @dealer_required
 def dealer_edit_car(request, pk):
@@ -357,7 +354,7 @@ def dealer_edit_car(request, pk):
             return redirect("dealer_dashboard")
         else:
             try:
-                detail = resp.json().get("detail") or "Could not update car."
+                detail = api_client.decode(resp).get("detail") or "Could not update car."
             except Exception:
                 detail = "Could not update car."
             messages.error(request, detail)
@@ -368,8 +365,11 @@ def dealer_delete_car(request, pk):
     token = _token(request)
     if not token:
         return redirect("login")
-    api_client.rentals_dealer_car_delete(token, pk)
-    messages.success(request, "Car deleted.")
+    resp = api_client.rentals_dealer_car_delete(token, pk)
+    if resp.status_code == 200:
+        messages.success(request, "Car deleted. Its bookings and photos are being cleaned up in the background.")
+    else:
+        messages.error(request, "Could not delete car.")
     return redirect("dealer_dashboard")
 
 
@@ -426,21 +426,8 @@ def dealer_car_bookings(request, pk):
         return redirect("dealer_dashboard")
     car = _ns(data.get("car", {}))
     bookings = _ns(data.get("bookings", []))
-    # Attach placeholder user info
-    def _attach_user(obj):
-        if getattr(obj, "user", None) is None and getattr(obj, "user_id", None) is not None:
-            obj.user = SimpleNamespace(username=f"User {obj.user_id}", email="", get_full_name=lambda: f"User {obj.user_id}")
-    for b in bookings:
-        _attach_user(b)
-    if getattr(car, "upcoming_bookings", None):
-        for b in car.upcoming_bookings:
-            _attach_user(b)
-    # Also attach placeholder for calendar weeks/upcoming
-    if getattr(car, "calendar_months", None):
-        for month in car.calendar_months:
-            if isinstance(month, dict) and isinstance(month.get("bookings"), list):
-                for b in month["bookings"]:
-                    _attach_user(b)
+    page_bookings = list(bookings) + list(getattr(car, "upcoming_bookings", None) or [])
+    _attach_users(token, page_bookings, {getattr(car, "id", None)} - {None})
     return render(
         request,
         "dealer/car_bookings.html",
@@ -455,19 +442,21 @@ def dealer_car_bookings(request, pk):
 
 @dealer_required
 def dealer_update_booking_status(request, pk):
-    dealer = request.user.dealer_profile
-    booking = get_object_or_404(Booking, pk=pk, car__dealer=dealer)
+    token = _token(request)
     if request.method != "POST":
         return redirect("dealer_dashboard")
     action = (request.POST.get("action") or "").strip().lower()
-    if action == "confirm" and booking.status != Booking.Status.CONFIRMED:
-        booking.status = Booking.Status.CONFIRMED
-        booking.save(update_fields=["status"])
-        messages.success(request, f"Booking for {booking.car.title} confirmed.")
-    elif action in {"cancel", "reject"} and booking.status != Booking.Status.CANCELLED:
-        booking.status = Booking.Status.CANCELLED
-        booking.save(update_fields=["status"])
-        messages.info(request, f"Booking for {booking.car.title} cancelled.")
+    try:
+        resp = api_client.rentals_dealer_booking_status(token, pk, action)
+    except Exception:
+        resp = None
+    if resp is None or resp.status_code != 200:
+        messages.error(request, "Could not update booking.")
+    elif api_client.decode(resp).get("detail") == "ok":
+        if action == "confirm":
+            messages.success(request, "Booking confirmed.")
+        else:
+            messages.info(request, "Booking cancelled.")
     else:
         messages.warning(request, "Nothing to update for this booking.")
     return redirect("dealer_dashboard")
@@ -563,7 +552,7 @@ def dealer_apply(request):
                 resp_redirect.delete_cookie("is_dealer")
                 return resp_redirect
             try:
-                detail = resp.json().get("detail") or "Could not create dealer profile."
+                detail = api_client.decode(resp).get("detail") or "Could not create dealer profile."
             except Exception:
                 detail = "Could not create dealer profile."
             form.add_error(None, detail)
@@ -581,6 +570,8 @@ def create_booking(request, pk):
         return redirect("login")
     try:
         car = _add_pk(api_client.rentals_detail(pk, token=token))
+    except api_client.UpstreamUnavailable:
+        raise  # a 503 page, not "not found"
     except Exception:
         messages.error(request, "Car not found.")
         return redirect("car_list")
@@ -607,7 +598,7 @@ def create_booking(request, pk):
             # Surface API validation errors to the user
             msg = "Could not create booking."
             try:
-                data = resp.json()
+                data = api_client.decode(resp)
                 if isinstance(data, dict):
                     if "detail" in data:
                         msg = data["detail"]
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+User = get_user_model()
+
+
+@override_settings(SERVICE_TOKEN="internal-secret")
+class UsersLookupTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user("cust", "cust@example.com", "pw-430-long", first_name="Cu")
+        self.other = User.objects.create_user("other", "other@example.com", "pw-430-long", last_name="Ot")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.customer).access_token}")
+        self.url = f"/api/users/lookup/?ids={self.customer.pk},{self.other.pk}"
+
+    def test_gateway_resolves_ids(self):
+        resp = self.client.get(self.url, headers={"X-Service-Token": "internal-secret"})
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual(results[str(self.other.pk)]["email"], "other@example.com")
+        self.assertEqual(results[str(self.customer.pk)]["full_name"], "Cu")
+
+    def test_customers_cannot_enumerate_users(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, headers={"X-Service-Token": "guess"}).status_code, 403)
+
+    def test_service_token_alone_is_not_enough(self):
+        resp = APIClient().get(self.url, headers={"X-Service-Token": "internal-secret"})
+        self.assertEqual(resp.status_code, 401)
+
+    @override_settings(SERVICE_TOKEN="")
+    def test_disabled_without_a_configured_token(self):
+        self.assertEqual(self.client.get(self.url, headers={"X-Service-Token": ""}).status_code, 403)
+
+    def test_too_many_ids(self):
+        ids = ",".join(str(i) for i in range(1, 202))
+        resp = self.client.get(f"/api/users/lookup/?ids={ids}", headers={"X-Service-Token": "internal-secret"})
+        self.assertEqual(resp.status_code, 400)
@@ -10,4 +10,5 @@ urlpatterns = [
     path("auth/password-reset/", views.password_reset_request, name="api_password_reset"),
     path("auth/password-reset/confirm/", views.password_reset_confirm, name="api_password_reset_confirm"),
     path("users/me/", views.user_update, name="api_user_update"),
+    path("users/lookup/", views.users_lookup, name="api_users_lookup"),
 ]
@@ -1,8 +1,11 @@
+import hmac
+
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from accounts_service.payloads import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, BasePermission, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
@@ -12,6 +15,20 @@ import json
 
 User = get_user_model()
 
+# Upper bound on ids resolved per lookup call; keeps the IN (...) list and the
+# response size predictable for a single dealer page.
+USER_LOOKUP_MAX_IDS = 200
+SERVICE_TOKEN_HEADER = "X-Service-Token"
+
+
+class IsInternalService(BasePermission):
+    """The caller presents ``SERVICE_TOKEN``: another service, not a browser. Denied while it is unset."""
+
+    def has_permission(self, request, view):
+        expected = getattr(settings, "SERVICE_TOKEN", "")
+        presented = request.headers.get(SERVICE_TOKEN_HEADER, "")
+        return bool(expected) and hmac.compare_digest(presented.encode(), expected.encode())
+
 
 def _token_response(user):
     refresh = RefreshToken.for_user(user)
@@ -139,6 +156,44 @@ def user_update(request):
     )
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated, IsInternalService])
+def users_lookup(request):
+    """Resolve many user ids to display info with a single primary-key query.
+
+    Only for the gateway, which asks on behalf of a signed-in dealer for the
+    renters of that dealer's bookings; customers calling it directly would
+    otherwise read anyone's email by id.
+    """
+    raw = request.GET.get("ids") or ""
+    ids = set()
+    for part in raw.split(","):
+        part = part.strip()
+        if part.isdigit():
+            ids.add(int(part))
+    if not ids:
+        return JsonResponse({"results": {}})
+    if len(ids) > USER_LOOKUP_MAX_IDS:
+        return JsonResponse(
+            {"detail": f"At most {USER_LOOKUP_MAX_IDS} ids per lookup."}, status=400
+        )
+    rows = User.objects.filter(pk__in=ids).values_list(
+        "id", "username", "email", "first_name", "last_name"
+    )
+    results = {}
+    for uid, username, email, first_name, last_name in rows:
+        full_name = f"{first_name} {last_name}".strip()
+        results[str(uid)] = {
+            "id": uid,
+            "username": username,
+            "email": email,
+            "first_name": first_name,
+            "last_name": last_name,
+            "full_name": full_name,
+        }
+    return JsonResponse({"results": results})
+
+
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def password_reset_request(request):
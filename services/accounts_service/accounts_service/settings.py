@@ -1,4 +1,6 @@
 import os
+import sys
+from importlib.util import find_spec
 from datetime import timedelta
 from pathlib import Path
 
@@ -28,6 +30,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "accounts_service.metrics.MetricsMiddleware",
+    "accounts_service.payloads.PayloadMiddleware",
+    "accounts_service.tracing.RequestIdMiddleware",
+    "accounts_service.profiling.ProfilingMiddleware",
+    "accounts_service.querylog.QueryInspectorMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -66,14 +73,30 @@ if os.getenv("DB_ENGINE", "postgres") == "postgres":
             "PASSWORD": os.getenv("POSTGRES_PASSWORD", "accounts"),
             "HOST": os.getenv("POSTGRES_HOST", "db_accounts"),
             "PORT": os.getenv("POSTGRES_PORT", "5432"),
-            "CONN_MAX_AGE": 60,
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
         }
     }
 else:
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
-            "NAME": BASE_DIR / "db.sqlite3",
+            "NAME": os.getenv("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+        }
+    }
+
+# Connection pooling: DB_POOL=true keeps a psycopg pool per worker instead of one
+# CONN_MAX_AGE connection: DB_POOL_MIN_SIZE opened up front, at most DB_POOL_MAX_SIZE,
+# each checked on checkout and replaced after DB_POOL_MAX_LIFETIME seconds.
+if env_bool("DB_POOL", False) and DATABASES["default"]["ENGINE"].endswith("postgresql"):
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True  # Django passes check_connection to the pool
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "4")),
+            "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+            "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "5")),
         }
     }
 
@@ -90,6 +113,63 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Metrics (/metrics, Prometheus text format)
+METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+# Shared by all gunicorn workers of this service so a scrape sees their combined totals
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+# Tracing: X-Request-ID propagation and span records (see accounts_service.tracing)
+SERVICE_NAME = "accounts"
+TRACE_SPANS = env_bool("TRACE_SPANS", False)
+# Append span records (JSON lines) here; empty = log them to stdout
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_SQL_THRESHOLD_MS = float(os.getenv("TRACE_SQL_THRESHOLD_MS", "25"))
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"raw": {"format": "%(message)s"}},
+    "handlers": {"spans": {"class": "logging.StreamHandler", "formatter": "raw"}},
+    "loggers": {
+        "spans": {"handlers": ["spans"], "level": "INFO", "propagate": False},
+        "accounts_service.warmup": {"handlers": ["spans"], "level": "INFO", "propagate": False},
+    },
+}
+
+# SQL instrumentation (accounts_service.querylog): slow statements, N+1 shapes, per-view budgets.
+# "raise" under DEBUG and in tests, "warn" in production, or "off".
+TESTING = sys.argv[1:2] == ["test"]
+DB_N_PLUS_ONE_MODE = os.getenv("DB_N_PLUS_ONE_MODE", "raise" if DEBUG or TESTING else "warn")
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "8"))
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+DB_QUERY_BUDGETS = {
+    "api_users_lookup": 2,
+}
+
+# Shared with the gateway; internal endpoints (users/lookup) require it in X-Service-Token
+SERVICE_TOKEN = os.getenv("SERVICE_TOKEN", "")
+
+# Profiling (accounts_service.profiling, manage.py profiles)
+PROFILING_DIR = os.getenv("PROFILING_DIR", f"/tmp/profiles/{SERVICE_NAME}")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+# Keep at most this many profiles; older ones are deleted as new ones land
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
+# Shared by all services so the gateway can forward X-Profile upstream.
+# Empty (the default) turns header-triggered profiling off.
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILING_TOKEN_MAX_AGE = int(os.getenv("PROFILING_TOKEN_MAX_AGE", "3600"))
+
+# Start-up warm-up (accounts_service.warmup, gunicorn.conf.py)
+STARTUP_WARMUP = env_bool("STARTUP_WARMUP", True)
+
+# Health endpoints (accounts_service.health): /healthz and /readyz
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "2"))
+
+# Response encodings (accounts_service.payloads): MessagePack via Accept, zstd/gzip via Accept-Encoding
+PAYLOAD_COMPRESS_MIN_BYTES = int(os.getenv("PAYLOAD_COMPRESS_MIN_BYTES", "1024"))
+PAYLOAD_GZIP_LEVEL = int(os.getenv("PAYLOAD_GZIP_LEVEL", "5"))
+PAYLOAD_ZSTD_LEVEL = int(os.getenv("PAYLOAD_ZSTD_LEVEL", "3"))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
@@ -99,6 +179,10 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.AllowAny",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ) + (("accounts_service.payloads.MessagePackRenderer",) if find_spec("msgpack") else ()),
 }
 
 SIMPLE_JWT = {
@@ -0,0 +1,192 @@
+"""
+Request IDs and spans.
+
+The gateway accepts an ``X-Request-ID`` from the client (or generates one) and
+``api_client`` forwards it, together with the id of the calling span in
+``X-Parent-Span-ID``, on every upstream call; the services adopt both. With
+``TRACE_SPANS`` on, each service writes one JSON record per span (the view,
+each upstream call, and SQL statements slower than ``TRACE_SQL_THRESHOLD_MS``)
+to ``TRACE_FILE``, or to stdout through the ``spans`` logger when no file is
+set. ``python -m benchmarks.waterfall <request id> <files>`` rebuilds the
+cross-service waterfall from those records.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from contextlib import AsyncExitStack, ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import awatch_queries, watch_queries
+
+REQUEST_ID_HEADER = "X-Request-ID"
+PARENT_SPAN_HEADER = "X-Parent-Span-ID"
+_VALID_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_client_request_id = contextvars.ContextVar("client_request_id", default=False)
+
+logger = logging.getLogger("spans")
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def traced_by_client():
+    """True if the caller sent its own request id: it is following this request."""
+    return _client_request_id.get()
+
+
+def propagation_headers():
+    """Headers to add to an outgoing upstream request (empty outside a request)."""
+    request_id = _request_id.get()
+    if request_id is None:
+        return {}
+    headers = {REQUEST_ID_HEADER: request_id}
+    span_id = _current_span.get()
+    if span_id:
+        headers[PARENT_SPAN_HEADER] = span_id
+    return headers
+
+
+def _new_span_id():
+    return uuid.uuid4().hex[:16]
+
+
+def _enabled():
+    return getattr(settings, "TRACE_SPANS", False)
+
+
+def emit(kind, name, start, duration, *, span_id=None, parent=None, **attrs):
+    """Write one span record for the current request (no-op if tracing is off)."""
+    request_id = _request_id.get()
+    if request_id is None or not _enabled():
+        return
+    record = {
+        "trace": request_id,
+        "span": span_id or _new_span_id(),
+        "parent": parent if parent is not None else _current_span.get(),
+        "service": getattr(settings, "SERVICE_NAME", ""),
+        "pid": os.getpid(),
+        "kind": kind,
+        "name": name,
+        "start": round(start, 6),
+        "duration_ms": round(duration * 1000, 3),
+        **attrs,
+    }
+    line = json.dumps(record, default=str)
+    path = getattr(settings, "TRACE_FILE", "")
+    if path:
+        # One short O_APPEND write per record keeps lines whole across workers.
+        with open(path, "a") as fh:
+            fh.write(line + "\n")
+    else:
+        logger.info(line)
+
+
+@contextmanager
+def span(kind, name, **attrs):
+    """Time the enclosed block as a child of the current span.
+
+    Yields a dict; keys added to it are stored on the record.
+    """
+    if _request_id.get() is None or not _enabled():
+        yield {}
+        return
+    span_id = _new_span_id()
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    extra = dict(attrs)
+    start = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield extra
+    finally:
+        _current_span.reset(token)
+        emit(kind, name, start, time.perf_counter() - t0, span_id=span_id, parent=parent, **extra)
+
+
+class _SlowQueryTracer:
+    def __init__(self, threshold):
+        self.threshold = threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.time()
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - t0
+            if duration >= self.threshold:
+                emit("sql", sql.split(None, 1)[0].upper() if sql else "SQL", start, duration,
+                     sql=sql[:500], db=context["connection"].alias)
+
+
+class RequestIdMiddleware:
+    """Adopt or create the request id and record the view span."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _enter(self, request):
+        incoming = request.headers.get(REQUEST_ID_HEADER, "")
+        adopted = bool(_VALID_ID.match(incoming))
+        request_id = incoming if adopted else uuid.uuid4().hex
+        parent = request.headers.get(PARENT_SPAN_HEADER, "")
+        request.request_id = request_id
+        return (
+            _request_id.set(request_id),
+            _current_span.set(parent if _VALID_ID.match(parent) else None),
+            _client_request_id.set(adopted),
+        )
+
+    def _tracer(self):
+        return _SlowQueryTracer(getattr(settings, "TRACE_SQL_THRESHOLD_MS", 25) / 1000)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self._acall(request)
+        id_token, parent_token, client_token = self._enter(request)
+        try:
+            with span("view", request.path, method=request.method) as record, ExitStack() as stack:
+                if _enabled():
+                    stack.enter_context(watch_queries(self._tracer()))
+                response = self.get_response(request)
+                match = getattr(request, "resolver_match", None)
+                record.update(view=match.view_name if match else "", status=response.status_code)
+        finally:
+            _client_request_id.reset(client_token)
+            _current_span.reset(parent_token)
+            _request_id.reset(id_token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+    async def _acall(self, request):
+        id_token, parent_token, client_token = self._enter(request)
+        try:
+            with span("view", request.path, method=request.method) as record:
+                async with AsyncExitStack() as stack:
+                    if _enabled():
+                        await stack.enter_async_context(awatch_queries(self._tracer()))
+                    response = await self.get_response(request)
+                match = getattr(request, "resolver_match", None)
+                record.update(view=match.view_name if match else "", status=response.status_code)
+        finally:
+            _client_request_id.reset(client_token)
+            _current_span.reset(parent_token)
+            _request_id.reset(id_token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
@@ -1,7 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from accounts_service.metrics import metrics_view
+from accounts_service.health import healthz_view, readyz_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
+    path("healthz", healthz_view, name="healthz"),
+    path("readyz", readyz_view, name="readyz"),
     path("api/", include("accounts_api.urls")),
 ]
@@ -5,3 +5,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'accounts_service.settings')
 
 application = get_wsgi_application()
+
+# Imports, templates and validators before the first request; see accounts_service.warmup
+from accounts_service import warmup  # noqa: E402
+
+warmup.warm_process()
@@ -0,0 +1,25 @@
+"""
+gunicorn settings, loaded automatically from the working directory.
+
+The application is imported once in the master (``preload_app``), where
+``wsgi.py`` runs the fork-safe part of rentals_service.warmup, so workers start with
+the URLconf, templates and password validators already built. Each worker
+then opens its database connections (and pools) in ``post_worker_init``,
+before it accepts its first request. ``GUNICORN_PRELOAD=false`` imports the
+application in every worker instead.
+
+Workers are ``gthread`` with ``GUNICORN_THREADS`` (4, the default
+``DB_POOL_MAX_SIZE``) threads each, so a worker serves requests concurrently
+and the admission limits (rentals_service.admission) have something to limit.
+"""
+import os
+
+preload_app = str(os.getenv("GUNICORN_PRELOAD", "true")).lower() in {"1", "true", "yes", "on"}
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+
+def post_worker_init(worker):
+    from rentals_service import warmup
+
+    warmup.warm_worker()
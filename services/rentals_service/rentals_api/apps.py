@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RentalsApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "rentals_api"
+
+    def ready(self):
+        from . import tasks  # noqa: F401  (registers job handlers)
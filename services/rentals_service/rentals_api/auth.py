@@ -7,6 +7,35 @@ from types import SimpleNamespace
 from django.conf import settings
 
 
+def user_from_authorization(auth):
+    """The user a ``Bearer`` Authorization header stands for, or None without one.
+
+    Raises ``AuthenticationFailed`` for a bad token. Shared by the DRF views (through
+    ServiceJWTAuthentication) and the plain async read views.
+    """
+    auth = auth or ""
+    if not auth.lower().startswith("bearer "):
+        return None
+    token = auth.split(" ", 1)[1].strip()
+    try:
+        payload = jwt.decode(
+            token,
+            settings.ACCOUNTS_JWT_SECRET,
+            algorithms=[settings.ACCOUNTS_JWT_ALGORITHM],
+        )
+    except Exception:
+        raise exceptions.AuthenticationFailed("Invalid token")
+    return SimpleNamespace(
+        id=payload.get("user_id") or payload.get("sub"),
+        username=payload.get("username"),
+        email=payload.get("email"),
+        first_name=payload.get("first_name"),
+        last_name=payload.get("last_name"),
+        is_dealer=payload.get("is_dealer", False),
+        is_authenticated=True,
+    )
+
+
 class ServiceJWTAuthentication(BaseAuthentication):
     """
     Minimal JWT auth that trusts tokens issued by the Accounts service.
@@ -14,26 +43,10 @@ class ServiceJWTAuthentication(BaseAuthentication):
     """
 
     def authenticate(self, request):
-        auth = request.headers.get("Authorization") or ""
-        if not auth.lower().startswith("bearer "):
+        user = user_from_authorization(request.headers.get("Authorization"))
+        if user is None:
             return None
-        token = auth.split(" ", 1)[1].strip()
-        try:
-            payload = jwt.decode(
-                token,
-                settings.ACCOUNTS_JWT_SECRET,
-                algorithms=[settings.ACCOUNTS_JWT_ALGORITHM],
-            )
-        except Exception:
-            raise exceptions.AuthenticationFailed("Invalid token")
-        user = SimpleNamespace(
-            id=payload.get("user_id") or payload.get("sub"),
-            username=payload.get("username"),
-            email=payload.get("email"),
-            first_name=payload.get("first_name"),
-            last_name=payload.get("last_name"),
-            is_dealer=payload.get("is_dealer", False),
-            is_authenticated=True,
-        )
         request.user_id = user.id
+        # Also on the Django request, where middleware (replica pinning) reads it
+        request._request.user_id = user.id
         return (user, None)
@@ -0,0 +1,226 @@
+"""
+Idempotency keys for POSTs.
+
+A POST to a view decorated with ``@idempotent`` may carry an
+``Idempotency-Key`` header (any string up to 255 characters, unique per
+attempt of one logical operation; the gateway's ``api_client`` sends a UUID
+and keeps it across its retries). The first request with a key claims it in
+``IdempotencyKey``; the view then runs and its response is stored in the same
+transaction as the view's own writes. Later requests with the same key from
+the same user, for ``IDEMPOTENCY_TTL`` seconds:
+
+* get the stored response again, marked ``Idempotent-Replayed: true`` (a
+  JSON or MessagePack body is re-encoded for the replaying request's
+  ``Accept``, which may differ from the first request's);
+* while the first one is still running, wait for it (up to
+  ``IDEMPOTENCY_WAIT_SECONDS``, or the caller's deadline) and get its
+  response, or a 409 with ``Retry-After`` if it does not finish in time;
+* get a 422 if their method, path or body differ from the first request's.
+
+Server errors and exceptions are not stored: the claim is dropped and the
+view's writes rolled back, so a retry runs the view again. A claim whose
+request died without finishing is taken over after
+``IDEMPOTENCY_LOCK_SECONDS``. Requests without the header, or without a
+signed-in user, run as before.
+
+Expired keys are deleted in batches by ``purge_expired`` (the
+``idempotency.purge_expired`` job, ``manage.py cleanup_idempotency_keys``).
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rentals_service import metrics, querylog
+from rentals_service.admission import deadline
+from rentals_service import payloads
+from rentals_service.payloads import JsonResponse
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+metrics.registry.describe("idempotency_requests_total", "counter", "POSTs with an Idempotency-Key, by view and outcome.")
+
+
+def _count(view, outcome):
+    metrics.registry.inc("idempotency_requests_total", (("view", view), ("outcome", outcome)))
+
+
+def _file_digest(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return f"{upload.name}:{upload.size}:{digest.hexdigest()}"
+
+
+def fingerprint(request):
+    """A hash of what the request asks for: method, path and parsed body.
+
+    The parsed body rather than the raw one: a multipart retry is encoded with
+    a new boundary, and files are hashed by content.
+    """
+    data = request.data
+    if hasattr(data, "lists"):
+        data = {
+            name: [_file_digest(v) if isinstance(v, UploadedFile) else v for v in values]
+            for name, values in data.lists()
+        }
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _claim(scope, key, digest):
+    """``(record, True)`` if this request now owns ``key``, else ``(existing record, False)``."""
+    now = timezone.now()
+    while True:
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    scope=scope, key=key, fingerprint=digest, locked_at=now,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL),
+                )
+            return record, True
+        except IntegrityError:
+            pass
+        record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if record is None:
+            continue  # dropped since: claim it again
+        if record.expires_at <= now:
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+            continue
+        stale = now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+        if not record.is_complete and record.locked_at < stale and record.fingerprint == digest:
+            # Its request died without finishing; a conditional update decides who takes over
+            taken = IdempotencyKey.objects.filter(
+                pk=record.pk, completed_at__isnull=True, locked_at=record.locked_at,
+            ).update(locked_at=now)
+            if taken:
+                record.locked_at = now
+                return record, True
+        return record, False
+
+
+def _wait(record, until):
+    """Poll ``record`` until it is complete or dropped, or ``until`` (epoch seconds) passes."""
+    with querylog.repeats_allowed():
+        while time.time() < until:
+            time.sleep(settings.IDEMPOTENCY_POLL_SECONDS)
+            record = IdempotencyKey.objects.filter(pk=record.pk).first()
+            if record is None or record.is_complete:
+                return record
+    return record
+
+
+def _decode(record):
+    """The stored body's data if it is JSON or MessagePack, else ``None``."""
+    body = bytes(record.body)
+    if not body:
+        return None
+    if record.content_type.startswith(payloads.MSGPACK) and payloads.msgpack is not None:
+        return payloads.msgpack.unpackb(body, strict_map_key=False)
+    if record.content_type.startswith(payloads.JSON):
+        return json.loads(body)
+    return None
+
+
+def _replay(record):
+    data = _decode(record)
+    if data is None:
+        response = HttpResponse(bytes(record.body), status=record.status_code, content_type=record.content_type)
+    else:
+        response = JsonResponse(data, status=record.status_code, safe=False)
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _store(record, response):
+    record.status_code = response.status_code
+    record.content_type = response.get("Content-Type", "")
+    record.body = response.content
+    record.completed_at = timezone.now()
+    record.save(update_fields=["status_code", "content_type", "body", "completed_at"])
+
+
+def _run(view, record, request, args, kwargs):
+    """Run the view and store its response atomically with its writes; drop the claim on failure."""
+    try:
+        with transaction.atomic():
+            response = view(request, *args, **kwargs)
+            # Unrendered DRF responses have no body yet; like 5xx, they are not kept
+            if response.status_code >= 500 or not getattr(response, "is_rendered", True):
+                transaction.set_rollback(True)
+                stored = False
+            else:
+                _store(record, response)
+                stored = True
+    except BaseException:
+        IdempotencyKey.objects.filter(pk=record.pk, completed_at__isnull=True).delete()
+        raise
+    if not stored:
+        IdempotencyKey.objects.filter(pk=record.pk, completed_at__isnull=True).delete()
+    return response
+
+
+def idempotent(view):
+    """Honour ``Idempotency-Key`` on POSTs to a DRF view (apply it below ``@api_view``)."""
+    name = view.__name__
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        user_id = getattr(request, "user_id", None) or getattr(request.user, "id", None)
+        if request.method != "POST" or not key or not user_id:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({"detail": f"{HEADER} is longer than {MAX_KEY_LENGTH} characters."}, status=400)
+        scope, digest = f"user:{user_id}", fingerprint(request)
+        due = deadline(request) or float("inf")
+        until = min(time.time() + settings.IDEMPOTENCY_WAIT_SECONDS, due)
+        while True:
+            record, owned = _claim(scope, key, digest)
+            if owned:
+                _count(name, "executed")
+                return _run(view, record, request, args, kwargs)
+            if record.fingerprint != digest:
+                _count(name, "mismatch")
+                return JsonResponse(
+                    {"detail": f"{HEADER} was already used for a different request."}, status=422,
+                )
+            if not record.is_complete:
+                record = _wait(record, until)
+                if record is None:
+                    continue  # the first request failed: run it ourselves
+            if record.is_complete:
+                _count(name, "replayed")
+                return _replay(record)
+            _count(name, "conflict")
+            response = JsonResponse({"detail": "A request with this key is still in progress."}, status=409)
+            response["Retry-After"] = "1"
+            return response
+
+    return wrapper
+
+
+def purge_expired(now=None, batch_size=None):
+    """Delete expired keys, ``IDEMPOTENCY_PURGE_BATCH_SIZE`` rows per transaction. Returns the count."""
+    now = now or timezone.now()
+    batch_size = batch_size or settings.IDEMPOTENCY_PURGE_BATCH_SIZE
+    pks = IdempotencyKey.objects.filter(expires_at__lte=now).values_list("pk", flat=True)
+    count = 0
+    while True:
+        batch = list(pks[:batch_size])
+        if not batch:
+            return count
+        with transaction.atomic():
+            IdempotencyKey.objects.filter(pk__in=batch).delete()
+        count += len(batch)
@@ -0,0 +1,140 @@
+"""
+Car image variants.
+
+Uploads are stored untouched in ``CarImage.image``; listing and detail pages
+should never serve those originals. After an upload we render a fixed set of
+resized variants (WebP + JPEG) on a small process pool so the request that
+saved the image returns immediately, then record the generated paths on
+``CarImage.variants``.
+
+``render_variants`` only depends on Pillow so it can run inside a spawned
+worker process without Django being configured.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from PIL import Image, ImageOps
+
+# name -> (width, height, crop). Cropped variants are cut to the exact box,
+# the others are only scaled down to fit inside it.
+VARIANTS = {
+    "card": (480, 320, True),
+    "card_2x": (960, 640, True),
+    "hero": (1600, 900, False),
+}
+FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+VARIANTS_DIR = "cars/variants"
+
+logger = logging.getLogger(__name__)
+
+
+def render_variants(source_path, media_root, image_id):
+    """Write every variant of ``source_path`` and return ``{variant: {fmt: name}}``.
+
+    Names are relative to ``media_root`` so they can be fed to the default storage.
+    """
+    rel_dir = f"{VARIANTS_DIR}/{image_id}"
+    out_dir = os.path.join(media_root, rel_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    with Image.open(source_path) as src:
+        src = ImageOps.exif_transpose(src)
+        if src.mode not in ("RGB", "L"):
+            src = src.convert("RGB")
+        result = {}
+        for name, (width, height, crop) in VARIANTS.items():
+            if crop:
+                img = ImageOps.fit(src, (width, height), Image.LANCZOS)
+            else:
+                img = src.copy()
+                img.thumbnail((width, height), Image.LANCZOS)
+            result[name] = {}
+            for fmt, (pil_format, ext, options) in FORMATS.items():
+                filename = f"{name}.{ext}"
+                img.save(os.path.join(out_dir, filename), pil_format, **options)
+                result[name][fmt] = f"{rel_dir}/{filename}"
+    return result
+
+
+# --------------------------------------------------------------------------
+# Django side: scheduling and recording results
+# --------------------------------------------------------------------------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    from django.conf import settings
+
+    with _pool_lock:
+        if _pool is None:
+            # spawn: never fork a gunicorn worker that holds DB connections/threads
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_PIPELINE_WORKERS", 2),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def record_variants(image_id, variants):
+    from django.utils import timezone
+    from .models import CarImage
+
+    CarImage.objects.filter(pk=image_id).update(variants=variants, processed_at=timezone.now())
+
+
+def process_image(car_image):
+    """Render and record variants for ``car_image`` in the current process."""
+    from django.conf import settings
+
+    if not car_image.image:
+        return None
+    variants = render_variants(car_image.image.path, str(settings.MEDIA_ROOT), car_image.pk)
+    record_variants(car_image.pk, variants)
+    return variants
+
+
+def schedule_variants(car_image):
+    """Queue variant generation for ``car_image`` once the current transaction commits."""
+    from django.conf import settings
+    from django.db import transaction
+
+    if not car_image.image:
+        return
+    if not getattr(settings, "IMAGE_PIPELINE_ASYNC", True):
+        transaction.on_commit(lambda: process_image(car_image))
+        return
+    if getattr(settings, "IMAGE_PIPELINE_BACKEND", "pool") == "jobs":
+        from .jobs import enqueue
+
+        enqueue("images.render_variants", {"image_id": car_image.pk})
+        return
+
+    image_id = car_image.pk
+    source_path = car_image.image.path
+    media_root = str(settings.MEDIA_ROOT)
+
+    def _done(future):
+        # Runs on the executor's management thread, which has its own DB connection.
+        from django.db import connection
+
+        exc = future.exception()
+        if exc is not None:
+            logger.error("Variant generation failed for CarImage %s: %s", image_id, exc)
+            return
+        try:
+            record_variants(image_id, future.result())
+        finally:
+            connection.close()
+
+    def _submit():
+        _get_pool().submit(render_variants, source_path, media_root, image_id).add_done_callback(_done)
+
+    transaction.on_commit(_submit)
@@ -0,0 +1,292 @@
+"""
+Database-backed background jobs.
+
+Work that should not run inside a request is registered with ``@task`` and
+queued with ``enqueue()``; ``manage.py run_worker`` claims and runs it.
+
+Claiming uses ``SELECT ... FOR UPDATE SKIP LOCKED`` where the backend supports
+it (Postgres) so workers never contend on the same row; on SQLite a worker
+picks a candidate and flips its status with a conditional UPDATE, retrying on
+a lost race. Idle Postgres workers block on LISTEN/NOTIFY, SQLite workers poll.
+Failed jobs are retried with exponential backoff plus jitter until
+``max_attempts`` is reached.
+
+A running job holds its row's lock (``locked_by``/``locked_at``) for
+``JOBS_LOCK_TIMEOUT_SECONDS``; ``report_progress`` renews it, so long handlers
+call it at least that often. A job whose lock lapses is requeued for another
+worker, and the worker that lost it no longer records an outcome.
+"""
+import contextvars
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "rentals_jobs"
+
+_registry = {}
+_current_job = contextvars.ContextVar("rentals_current_job", default=None)
+
+
+class LockLost(Exception):
+    """The running job's lock lapsed and it was requeued; stop working on it."""
+
+
+def task(name):
+    """Register ``fn`` as the handler for jobs called ``name``."""
+    def decorator(fn):
+        _registry[name] = fn
+        return fn
+    return decorator
+
+
+def registered_tasks():
+    return dict(_registry)
+
+
+def enqueue(name, payload=None, *, delay=0, max_attempts=None):
+    """Queue ``name`` to run with ``payload`` (JSON-serialisable) after ``delay`` seconds.
+
+    Inside a transaction the job only becomes visible to workers when it commits.
+    """
+    if name not in _registry:
+        raise KeyError(f"Unknown job {name!r}")
+    job = Job.objects.create(
+        name=name,
+        payload=payload or {},
+        run_after=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+    if connection.vendor == "postgresql":
+        transaction.on_commit(_notify)
+    return job
+
+
+def _notify():
+    with connection.cursor() as cursor:
+        cursor.execute(f"NOTIFY {NOTIFY_CHANNEL}")
+
+
+def report_progress(**progress):
+    """Record progress for the job currently running in this worker and renew its lock.
+
+    A no-op outside a job. Raises ``LockLost`` if the job was requeued meanwhile.
+    """
+    job = _current_job.get()
+    if job is None:
+        return
+    job.progress = {**job.progress, **progress}
+    if not _held(job).update(progress=job.progress, locked_at=timezone.now()):
+        raise LockLost(f"Job {job.name} #{job.pk} is no longer locked by {job.locked_by}")
+
+
+def _held(job):
+    return Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING, locked_by=job.locked_by)
+
+
+def backoff_seconds(attempts):
+    """Delay before retry number ``attempts`` (1-based): base * 2^(n-1), capped, with jitter."""
+    base = settings.JOBS_RETRY_BASE_SECONDS
+    delay = min(base * (2 ** (attempts - 1)), settings.JOBS_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# --------------------------------------------------------------------------
+# Claiming
+# --------------------------------------------------------------------------
+
+def _ready_jobs(now):
+    return Job.objects.filter(status=Job.Status.QUEUED, run_after__lte=now).order_by("run_after", "id")
+
+
+def claim(worker):
+    """Atomically take the next runnable job for ``worker``; return it or None."""
+    now = timezone.now()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _ready_jobs(now).select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = Job.Status.RUNNING
+            job.locked_by = worker
+            job.locked_at = job.started_at = now
+            job.attempts = F("attempts") + 1
+            job.save(update_fields=["status", "locked_by", "locked_at", "started_at", "attempts"])
+            job.refresh_from_db(fields=["attempts"])
+            return job
+
+    # No row locks (SQLite): optimistic compare-and-set on status.
+    for _ in range(5):
+        candidate = _ready_jobs(now).values_list("id", flat=True).first()
+        if candidate is None:
+            return None
+        won = Job.objects.filter(id=candidate, status=Job.Status.QUEUED).update(
+            status=Job.Status.RUNNING,
+            locked_by=worker,
+            locked_at=now,
+            started_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if won:
+            return Job.objects.get(id=candidate)
+    return None
+
+
+def requeue_stale(timeout=None):
+    """Return jobs whose worker died mid-run (locked longer than ``timeout`` s) to the queue."""
+    timeout = timeout or settings.JOBS_LOCK_TIMEOUT_SECONDS
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(status=Job.Status.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.Status.QUEUED, locked_by="", locked_at=None, run_after=timezone.now()
+    )
+
+
+# --------------------------------------------------------------------------
+# Running
+# --------------------------------------------------------------------------
+
+def run_job(job):
+    """Execute ``job`` and record the outcome. Returns True on success."""
+    handler = _registry.get(job.name)
+    token = _current_job.set(job)
+    try:
+        if handler is None:
+            raise KeyError(f"No handler registered for {job.name!r}")
+        handler(**job.payload)
+    except Exception as exc:
+        now = timezone.now()
+        error = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+        if isinstance(exc, LockLost):
+            logger.warning("Job %s #%s stopped: %s", job.name, job.pk, error)
+        elif job.attempts >= job.max_attempts or handler is None:
+            if _held(job).update(
+                status=Job.Status.FAILED, finished_at=now, locked_by="", locked_at=None, last_error=error
+            ):
+                logger.error("Job %s #%s failed permanently: %s", job.name, job.pk, error)
+        elif _held(job).update(
+            status=Job.Status.QUEUED,
+            run_after=now + timedelta(seconds=backoff_seconds(job.attempts)),
+            locked_by="",
+            locked_at=None,
+            last_error=error,
+        ):
+            logger.warning("Job %s #%s attempt %s failed: %s", job.name, job.pk, job.attempts, error)
+        return False
+    finally:
+        _current_job.reset(token)
+    # Conditional: if the lock lapsed, the worker that requeued it owns the outcome
+    if not _held(job).update(
+        status=Job.Status.DONE, finished_at=timezone.now(), locked_by="", locked_at=None, last_error=""
+    ):
+        logger.warning("Job %s #%s finished after its lock lapsed; outcome not recorded", job.name, job.pk)
+        return False
+    return True
+
+
+def _wait_for_work(timeout):
+    """Sleep until a NOTIFY arrives (Postgres) or ``timeout`` elapses."""
+    if connection.vendor != "postgresql":
+        time.sleep(timeout)
+        return
+    connection.ensure_connection()
+    raw = connection.connection
+    if not getattr(raw, "_rentals_jobs_listening", False):
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        raw._rentals_jobs_listening = True
+    # psycopg 3: blocks until one notification arrives or the timeout passes
+    for _notify in raw.notifies(timeout=timeout, stop_after=1):
+        pass
+
+
+def work(*, poll_interval=1.0, burst=False, max_jobs=None, stop=None):
+    """Worker loop: claim and run jobs until stopped.
+
+    ``burst`` exits once the queue has no runnable jobs; ``stop`` is an optional
+    ``multiprocessing.Event``. Returns the number of jobs processed.
+    """
+    me = worker_id()
+    processed = 0
+    last_stale_check = 0.0
+    while not (stop is not None and stop.is_set()):
+        if time.monotonic() - last_stale_check > settings.JOBS_LOCK_TIMEOUT_SECONDS / 2:
+            requeue_stale()
+            last_stale_check = time.monotonic()
+        job = claim(me)
+        if job is None:
+            if burst:
+                break
+            _wait_for_work(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+        if max_jobs and processed >= max_jobs:
+            break
+    return processed
+
+
+# --------------------------------------------------------------------------
+# Metrics
+# --------------------------------------------------------------------------
+
+def stats(window_seconds=300):
+    """Queue depth plus latency/throughput over the last ``window_seconds``.
+
+    ``wait`` is time from becoming runnable to being picked up (queue latency),
+    ``run`` is execution time; both in seconds.
+    """
+    since = timezone.now() - timedelta(seconds=window_seconds)
+    depth = dict(
+        Job.objects.filter(status__in=[Job.Status.QUEUED, Job.Status.RUNNING])
+        .values_list("status")
+        .annotate(n=Count("id"))
+    )
+    finished = Job.objects.filter(finished_at__gte=since)
+    totals = finished.aggregate(
+        done=Count("id", filter=Q(status=Job.Status.DONE)),
+        failed=Count("id", filter=Q(status=Job.Status.FAILED)),
+    )
+    waits, runs = [], []
+    for run_after, started, done in finished.filter(status=Job.Status.DONE).values_list(
+        "run_after", "started_at", "finished_at"
+    ):
+        if started:
+            waits.append(max((started - run_after).total_seconds(), 0.0))
+            runs.append((done - started).total_seconds())
+    return {
+        "queued": depth.get(Job.Status.QUEUED, 0),
+        "running": depth.get(Job.Status.RUNNING, 0),
+        "done": totals["done"],
+        "failed": totals["failed"],
+        "throughput_per_s": round(totals["done"] / window_seconds, 3),
+        "wait": _summary(waits),
+        "run": _summary(runs),
+    }
+
+
+def _summary(values):
+    if not values:
+        return {"avg": None, "p95": None, "max": None}
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return {
+        "avg": round(sum(values) / len(values), 4),
+        "p95": round(p95, 4),
+        "max": round(values[-1], 4),
+    }
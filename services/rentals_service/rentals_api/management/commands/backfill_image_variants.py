@@ -0,0 +1,47 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from rentals_api.imaging import record_variants, render_variants
+from rentals_api.models import CarImage
+
+
+class Command(BaseCommand):
+    help = "Generate resized variants for car images that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Re-process images that already have variants.")
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=getattr(settings, "IMAGE_PIPELINE_WORKERS", 2))
+
+    def handle(self, *args, **options):
+        qs = CarImage.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["all"]:
+            qs = qs.filter(processed_at__isnull=True)
+        ids = list(qs.order_by("pk").values_list("pk", flat=True))
+        total = len(ids)
+        if not total:
+            self.stdout.write("No images to process.")
+            return
+
+        media_root = str(settings.MEDIA_ROOT)
+        batch_size = max(1, options["batch_size"])
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            for start in range(0, total, batch_size):
+                batch = CarImage.objects.filter(pk__in=ids[start:start + batch_size]).only("pk", "image")
+                futures = {
+                    pool.submit(render_variants, img.image.path, media_root, img.pk): img.pk
+                    for img in batch
+                }
+                for future in as_completed(futures):
+                    image_id = futures[future]
+                    try:
+                        record_variants(image_id, future.result())
+                        done += 1
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f"CarImage {image_id}: {exc}")
+                self.stdout.write(f"Processed {done + failed}/{total} images ({failed} failed)")
+        self.stdout.write(self.style.SUCCESS(f"Done: {done} processed, {failed} failed."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from rentals_api.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys and their stored responses, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Rows per transaction (IDEMPOTENCY_PURGE_BATCH_SIZE).")
+
+    def handle(self, *args, **options):
+        count = purge_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {count} expired idempotency keys."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from rentals_api.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired, unattached upload sessions and their partial files."
+
+    def handle(self, *args, **options):
+        count = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Removed {count} expired upload sessions."))
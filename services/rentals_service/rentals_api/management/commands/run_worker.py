@@ -0,0 +1,58 @@
+import json
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from rentals_api import jobs
+
+
+def _worker_main(stop, poll_interval, burst):
+    # The parent closed its DB connections before forking, so each child opens its own.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    jobs.work(poll_interval=poll_interval, burst=burst, stop=stop)
+
+
+class Command(BaseCommand):
+    help = "Run background job workers for the rentals service."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", "-n", type=int, default=2, help="Number of worker processes.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when idle.")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty.")
+        parser.add_argument("--stats-interval", type=float, default=60.0, help="Seconds between metrics logs (0 = off).")
+
+    def handle(self, *args, **options):
+        connections.close_all()
+        ctx = multiprocessing.get_context("fork")
+        stop = ctx.Event()
+        procs = [
+            ctx.Process(
+                target=_worker_main,
+                args=(stop, options["poll_interval"], options["burst"]),
+                name=f"rentals-worker-{i}",
+            )
+            for i in range(max(1, options["processes"]))
+        ]
+        for proc in procs:
+            proc.start()
+        self.stdout.write(f"Started {len(procs)} workers; tasks: {', '.join(sorted(jobs.registered_tasks()))}")
+
+        def _shutdown(*_):
+            stop.set()
+
+        signal.signal(signal.SIGINT, _shutdown)
+        signal.signal(signal.SIGTERM, _shutdown)
+
+        interval = options["stats_interval"]
+        last_stats = time.monotonic()
+        while any(p.is_alive() for p in procs):
+            for proc in procs:
+                proc.join(timeout=0.5)
+            if interval and time.monotonic() - last_stats >= interval:
+                self.stdout.write(json.dumps(jobs.stats(window_seconds=int(interval))))
+                last_stats = time.monotonic()
+        self.stdout.write("Workers stopped.")
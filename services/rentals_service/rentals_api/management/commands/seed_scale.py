@@ -0,0 +1,182 @@
+import io
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from rentals_api.models import Booking, Car, CarImage, Dealer
+
+MAKES = {
+    "Toyota": ["Corolla", "Camry", "RAV4", "Land Cruiser"],
+    "Honda": ["Civic", "Accord", "CR-V"],
+    "Kia": ["Rio", "Sportage", "Sorento"],
+    "Hyundai": ["Elantra", "Tucson", "Santa Fe"],
+    "BMW": ["320i", "X3", "X5"],
+    "Mercedes": ["C200", "E300", "GLC"],
+    "Nissan": ["Sunny", "X-Trail", "Patrol"],
+}
+CITIES = [("Beirut", "LB"), ("Tripoli", "LB"), ("Sidon", "LB"), ("Byblos", "LB"), ("Zahle", "LB")]
+COLORS = ["White", "Black", "Silver", "Blue", "Red", "Grey"]
+STATUSES = [Booking.Status.CONFIRMED] * 6 + [Booking.Status.PENDING] * 3 + [Booking.Status.CANCELLED]
+PLACEHOLDER_IMAGE = "cars/seed/placeholder.jpg"
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate dealers, cars, images and bookings for load and benchmark runs, "
+        "e.g. --dealers 1000 --cars 100000 --bookings 5000000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dealers", type=int, default=100)
+        parser.add_argument("--cars", type=int, default=5000)
+        parser.add_argument("--images-per-car", type=int, default=2)
+        parser.add_argument("--bookings", type=int, default=100000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=430, help="Random seed, for reproducible data sets.")
+        parser.add_argument("--user-id-start", type=int, default=1_000_000,
+                            help="First synthetic user id used for dealers and customers.")
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"])
+        batch = max(1, opts["batch_size"])
+        started = time.perf_counter()
+
+        dealer_ids = self._seed_dealers(rng, opts["dealers"], opts["user_id_start"], batch)
+        car_ids = self._seed_cars(rng, dealer_ids, opts["cars"], batch)
+        self._seed_images(car_ids, opts["images_per_car"], batch)
+        self._seed_bookings(rng, car_ids, opts["bookings"], opts["user_id_start"] + opts["dealers"], batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Seeding finished in {time.perf_counter() - started:.1f}s"))
+
+    def _progress(self, label, done, total, t0):
+        rate = done / max(time.perf_counter() - t0, 1e-9)
+        self.stdout.write(f"  {label}: {done}/{total} ({rate:,.0f} rows/s)")
+
+    def _bulk(self, model, rows, batch):
+        with transaction.atomic():
+            model.objects.bulk_create(rows, batch_size=batch)
+
+    def _seed_dealers(self, rng, count, user_id_start, batch):
+        t0 = time.perf_counter()
+        first_id = (Dealer.objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+        rows = []
+        for i in range(count):
+            uid = user_id_start + i
+            rows.append(Dealer(
+                user_id=uid,
+                name=f"Seed Motors {uid}",
+                email=f"dealer{uid}@seed.local",
+                phone=f"+961 {rng.randint(1000000, 9999999)}",
+                active=True,
+            ))
+            if len(rows) >= batch:
+                self._bulk(Dealer, rows, batch)
+                rows = []
+        if rows:
+            self._bulk(Dealer, rows, batch)
+        self._progress("dealers", count, count, t0)
+        return list(Dealer.objects.filter(id__gte=first_id).order_by("id").values_list("id", flat=True))
+
+    def _seed_cars(self, rng, dealer_ids, count, batch):
+        t0 = time.perf_counter()
+        first_id = (Car.all_objects.order_by("-id").values_list("id", flat=True).first() or 0) + 1
+        makes = list(MAKES)
+        types = [t for t, _ in Car.TYPES]
+        rows = []
+        for i in range(count):
+            make = rng.choice(makes)
+            model = rng.choice(MAKES[make])
+            year = rng.randint(2012, 2025)
+            city, country = rng.choice(CITIES)
+            rows.append(Car(
+                dealer_id=dealer_ids[i % len(dealer_ids)],
+                title=f"{make} {model} {year}",
+                car_type=rng.choice(types),
+                price_per_day=Decimal(rng.randint(25, 400)),
+                description="Seeded listing.",
+                available=rng.random() > 0.05,
+                color=rng.choice(COLORS),
+                make=make,
+                model=model,
+                year=year,
+                transmission=rng.choice(["AUTO", "AUTO", "MANUAL"]),
+                seats=rng.choice([2, 4, 5, 7]),
+                doors=rng.choice([2, 4, 5]),
+                mileage_km=rng.randint(0, 250000),
+                location_city=city,
+                location_country=country,
+            ))
+            if len(rows) >= batch:
+                self._bulk(Car, rows, batch)
+                rows = []
+                self._progress("cars", i + 1, count, t0)
+        if rows:
+            self._bulk(Car, rows, batch)
+        self._progress("cars", count, count, t0)
+        return list(Car.all_objects.filter(id__gte=first_id).order_by("id").values_list("id", flat=True))
+
+    def _seed_images(self, car_ids, per_car, batch):
+        if per_car <= 0 or not car_ids:
+            return
+        if not default_storage.exists(PLACEHOLDER_IMAGE):
+            buf = io.BytesIO()
+            Image.new("RGB", (1200, 800), (40, 60, 90)).save(buf, "JPEG", quality=80)
+            default_storage.save(PLACEHOLDER_IMAGE, ContentFile(buf.getvalue()))
+        t0 = time.perf_counter()
+        total = len(car_ids) * per_car
+        rows = []
+        for car_id in car_ids:
+            for n in range(per_car):
+                rows.append(CarImage(car_id=car_id, image=PLACEHOLDER_IMAGE, is_primary=(n == 0)))
+            if len(rows) >= batch:
+                self._bulk(CarImage, rows, batch)
+                rows = []
+        if rows:
+            self._bulk(CarImage, rows, batch)
+        self._progress("images", total, total, t0)
+
+    def _seed_bookings(self, rng, car_ids, count, customer_id_start, batch):
+        """Spread ``count`` non-overlapping bookings over the cars, around today."""
+        if count <= 0 or not car_ids:
+            return
+        t0 = time.perf_counter()
+        today = timezone.localdate()
+        per_car, extra = divmod(count, len(car_ids))
+        rows = []
+        done = 0
+        for index, car_id in enumerate(car_ids):
+            n = per_car + (1 if index < extra else 0)
+            # Walk forward from ~a year ago so each car gets a past and future schedule.
+            cursor = today - timedelta(days=min(n * 3, 3650) // 2)
+            for _ in range(n):
+                cursor += timedelta(days=rng.randint(0, 2))
+                length = rng.randint(1, 5)
+                status = rng.choice(STATUSES)
+                price = Decimal(rng.randint(25, 400))
+                rows.append(Booking(
+                    car_id=car_id,
+                    user_id=customer_id_start + rng.randint(0, 199_999),
+                    start_date=cursor,
+                    end_date=cursor + timedelta(days=length - 1),
+                    status=status,
+                    total_price=price * length,
+                    currency="USD",
+                ))
+                cursor += timedelta(days=length)
+            if len(rows) >= batch:
+                self._bulk(Booking, rows, batch)
+                done += len(rows)
+                rows = []
+                if done % (batch * 20) < batch:
+                    self._progress("bookings", done, count, t0)
+        if rows:
+            self._bulk(Booking, rows, batch)
+        self._progress("bookings", count, count, t0)
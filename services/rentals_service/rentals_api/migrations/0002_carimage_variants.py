@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carimage',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='carimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
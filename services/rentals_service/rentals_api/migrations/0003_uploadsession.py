@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:17
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_api', '0002_carimage_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('total_size', models.PositiveBigIntegerField()),
+                ('received', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('dealer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='rentals_api.dealer')),
+                ('image', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='rentals_api.carimage')),
+            ],
+        ),
+    ]
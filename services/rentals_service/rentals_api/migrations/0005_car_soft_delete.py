@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:21
+
+import django.db.models.manager
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rentals_api', '0004_job'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='car',
+            options={'base_manager_name': 'all_objects'},
+        ),
+        migrations.AlterModelManagers(
+            name='car',
+            managers=[
+                ('objects', django.db.models.manager.Manager()),
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='progress',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
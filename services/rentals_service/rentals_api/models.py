@@ -1,3 +1,6 @@
+import uuid
+
+from django.core.files.storage import default_storage
 from django.db import models
 
 # We removed the local User FK; user_id is stored as integer for cross-service identity.
@@ -19,6 +22,13 @@ class Dealer(models.Model):
         return self.name
 
 
+class ActiveCarManager(models.Manager):
+    """Default manager: hides soft-deleted cars everywhere (including dealer.cars)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Car(models.Model):
     TYPES = [
         ("sedan", "Sedan"),
@@ -52,8 +62,14 @@ class Car(models.Model):
     currency = models.CharField(max_length=3, default="USD")
     location_city = models.CharField(max_length=120, blank=True)
     location_country = models.CharField(max_length=120, blank=True)
+    # Set when the dealer deletes the car; dependent rows are purged by a background job.
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveCarManager()
+    all_objects = models.Manager()
 
     class Meta:
+        base_manager_name = "all_objects"
         indexes = [
             models.Index(fields=["available", "price_per_day"]),
             models.Index(fields=["car_type", "transmission"]),
@@ -63,13 +79,18 @@ class Car(models.Model):
     def __str__(self):
         return f"{self.title} ({self.dealer.name})"
 
+    @property
+    def primary_image_obj(self):
+        prefetched = getattr(self, "_prefetched_objects_cache", {}).get("images")
+        if prefetched is not None:
+            # Same pick as below, without a query per car in list views
+            return min(prefetched, key=lambda image: (not image.is_primary, image.pk), default=None)
+        return self.images.filter(is_primary=True).first() or self.images.first()
+
     @property
     def primary_image(self):
-        primary = self.images.filter(is_primary=True).first()
-        if primary:
-            return primary.image.url if primary.image else None
-        first = self.images.first()
-        return first.image.url if first and first.image else None
+        image = self.primary_image_obj
+        return image.image.url if image and image.image else None
 
 
 class CarImage(models.Model):
@@ -77,6 +98,9 @@ class CarImage(models.Model):
     image = models.ImageField(upload_to="cars/", blank=True, null=True)
     is_primary = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # {"card": {"webp": "cars/variants/1/card.webp", "jpeg": "..."}, ...}; see imaging.VARIANTS
+    variants = models.JSONField(default=dict, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         indexes = [models.Index(fields=["car", "is_primary"])]
@@ -84,6 +108,15 @@ class CarImage(models.Model):
     def __str__(self):
         return f"Image for {self.car.title}"
 
+    def variant_url(self, name, fmt="jpeg"):
+        """URL of a generated variant, falling back to the original until it is processed."""
+        path = (self.variants or {}).get(name, {}).get(fmt)
+        if path:
+            return default_storage.url(path)
+        if fmt == "jpeg" and self.image:
+            return self.image.url
+        return None
+
 
 class Booking(models.Model):
     class Status(models.TextChoices):
@@ -132,3 +165,85 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f"{self.user_id} / {self.car_id}"
+
+
+class UploadSession(models.Model):
+    """A resumable, chunked image upload sent by the browser straight to this service."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    dealer = models.ForeignKey(Dealer, on_delete=models.CASCADE, related_name="upload_sessions")
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    total_size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    image = models.OneToOneField(
+        CarImage, null=True, blank=True, on_delete=models.SET_NULL, related_name="upload_session"
+    )
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.received}/{self.total_size})"
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+
+class Job(models.Model):
+    """A unit of deferred work executed by ``manage.py run_worker`` (see rentals_api.jobs)."""
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    progress = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"]),
+            models.Index(fields=["status", "finished_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """A POST sent with an ``Idempotency-Key`` and, once handled, its response (see rentals_api.idempotency)."""
+
+    scope = models.CharField(max_length=100)  # whose key it is, e.g. "user:42"
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    body = models.BinaryField(default=b"", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("scope", "key")
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.status_code or 'in progress'})"
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
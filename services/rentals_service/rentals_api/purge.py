@@ -0,0 +1,83 @@
+"""
+Car soft delete and background purge.
+
+Deleting a car only stamps ``Car.deleted_at`` inside the request, which hides
+it immediately (``Car.objects`` excludes deleted cars). The ``cars.purge`` job
+then removes bookings, favorites and images in small batches, each in its own
+short transaction, deletes the image files from storage and finally the car.
+"""
+import logging
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import enqueue, report_progress
+from .models import Booking, Car, CarImage, Favorite
+
+logger = logging.getLogger(__name__)
+
+
+def soft_delete_car(car):
+    """Hide ``car`` now and queue the purge of its dependent rows. Returns the Job."""
+    with transaction.atomic():
+        car.deleted_at = timezone.now()
+        car.available = False
+        car.save(update_fields=["deleted_at", "available"])
+        return enqueue("cars.purge", {"car_id": car.pk, "dealer_id": car.dealer_id})
+
+
+def _delete_in_batches(queryset, batch_size, label, progress):
+    pks = queryset.values_list("pk", flat=True)
+    while True:
+        batch = list(pks[:batch_size])
+        if not batch:
+            return
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=batch).delete()
+        progress[label] = progress.get(label, 0) + len(batch)
+        report_progress(**progress)
+
+
+def _image_files(image):
+    names = [image.image.name] if image.image else []
+    for formats in (image.variants or {}).values():
+        names.extend(formats.values())
+    return names
+
+
+def purge_car(car_id, batch_size=None):
+    """Remove a soft-deleted car and everything hanging off it."""
+    batch_size = batch_size or settings.CAR_PURGE_BATCH_SIZE
+    car = Car.all_objects.filter(pk=car_id, deleted_at__isnull=False).first()
+    if car is None:
+        return
+    progress = {"bookings": 0, "favorites": 0, "images": 0, "files": 0, "done": False}
+    report_progress(**progress)
+
+    _delete_in_batches(Booking.objects.filter(car_id=car_id), batch_size, "bookings", progress)
+    _delete_in_batches(Favorite.objects.filter(car_id=car_id), batch_size, "favorites", progress)
+
+    images = CarImage.objects.filter(car_id=car_id)
+    while True:
+        batch = list(images.only("pk", "image", "variants")[:batch_size])
+        if not batch:
+            break
+        files = [name for image in batch for name in _image_files(image)]
+        with transaction.atomic():
+            CarImage.objects.filter(pk__in=[image.pk for image in batch]).delete()
+        # Files go only after their rows are gone, so a retry never serves a missing file.
+        for name in files:
+            try:
+                default_storage.delete(name)
+                progress["files"] += 1
+            except OSError as exc:
+                logger.warning("Could not delete %s for car %s: %s", name, car_id, exc)
+        progress["images"] += len(batch)
+        report_progress(**progress)
+
+    car.delete()
+    progress["done"] = True
+    report_progress(**progress)
+    logger.info("Purged car %s: %s", car_id, progress)
@@ -12,14 +12,39 @@ class DealerSerializer(serializers.ModelSerializer):
 
 
 class CarImageSerializer(serializers.ModelSerializer):
+    """Gallery image: the hero/thumbnail variants, plus the original for on-demand download."""
+    image = serializers.SerializerMethodField()
+    image_webp = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    original = serializers.SerializerMethodField()
+
     class Meta:
         model = CarImage
-        fields = ["id", "image", "is_primary"]
+        fields = ["id", "image", "image_webp", "thumbnail", "original", "is_primary"]
+
+    def get_image(self, obj):
+        return obj.variant_url("hero")
+
+    def get_image_webp(self, obj):
+        return obj.variant_url("hero", "webp")
+
+    def get_thumbnail(self, obj):
+        return obj.variant_url("card")
+
+    def get_original(self, obj):
+        return obj.image.url if obj.image else None
 
 
 class CarListSerializer(serializers.ModelSerializer):
     dealer = DealerSerializer()
     primary_image = serializers.SerializerMethodField()
+    primary_image_webp = serializers.SerializerMethodField()
+    primary_image_2x = serializers.SerializerMethodField()
+    primary_image_webp_2x = serializers.SerializerMethodField()
+
+    # Which imaging.VARIANTS entry backs primary_image (and its retina twin, if any)
+    primary_variant = "card"
+    primary_variant_2x = "card_2x"
 
     class Meta:
         model = Car
@@ -41,11 +66,36 @@ class CarListSerializer(serializers.ModelSerializer):
             "location_city",
             "location_country",
             "primary_image",
+            "primary_image_webp",
+            "primary_image_2x",
+            "primary_image_webp_2x",
             "dealer",
         ]
 
+    def _primary(self, obj):
+        if not hasattr(obj, "_primary_image_cache"):
+            obj._primary_image_cache = obj.primary_image_obj
+        return obj._primary_image_cache
+
     def get_primary_image(self, obj):
-        return obj.primary_image
+        image = self._primary(obj)
+        return image.variant_url(self.primary_variant) if image else None
+
+    def get_primary_image_webp(self, obj):
+        image = self._primary(obj)
+        return image.variant_url(self.primary_variant, "webp") if image else None
+
+    def get_primary_image_2x(self, obj):
+        image = self._primary(obj)
+        if not image or not self.primary_variant_2x:
+            return None
+        return image.variant_url(self.primary_variant_2x)
+
+    def get_primary_image_webp_2x(self, obj):
+        image = self._primary(obj)
+        if not image or not self.primary_variant_2x:
+            return None
+        return image.variant_url(self.primary_variant_2x, "webp")
 
 
 class BookingSummarySerializer(serializers.ModelSerializer):
@@ -54,6 +104,13 @@ class BookingSummarySerializer(serializers.ModelSerializer):
         fields = ["id", "start_date", "end_date", "status", "total_price", "currency"]
 
 
+class DealerBookingSummarySerializer(BookingSummarySerializer):
+    """Booking summary for the owning dealer, who also sees the customer."""
+
+    class Meta(BookingSummarySerializer.Meta):
+        fields = BookingSummarySerializer.Meta.fields + ["user_id"]
+
+
 class BookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
@@ -130,6 +187,9 @@ class CarDetailSerializer(CarListSerializer):
     upcoming_bookings = BookingSummarySerializer(many=True)
     calendar_months = serializers.SerializerMethodField()
 
+    primary_variant = "hero"
+    primary_variant_2x = None
+
     class Meta(CarListSerializer.Meta):
         fields = CarListSerializer.Meta.fields + [
             "description",
@@ -159,9 +219,9 @@ class FavoriteListItemSerializer(serializers.ModelSerializer):
 
 
 class DealerCarSerializer(serializers.ModelSerializer):
-    current_booking = BookingSummarySerializer(read_only=True)
-    next_booking = BookingSummarySerializer(read_only=True)
-    upcoming_bookings = BookingSummarySerializer(many=True, read_only=True)
+    current_booking = DealerBookingSummarySerializer(read_only=True)
+    next_booking = DealerBookingSummarySerializer(read_only=True)
+    upcoming_bookings = DealerBookingSummarySerializer(many=True, read_only=True)
     calendar_months = serializers.SerializerMethodField()
     confirmed_revenue = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True, read_only=True)
     confirmed_bookings = serializers.IntegerField(required=False, read_only=True)
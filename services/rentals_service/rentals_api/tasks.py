@@ -0,0 +1,33 @@
+"""Job handlers registered with the rentals job runner (see rentals_api.jobs)."""
+from .jobs import task
+
+
+@task("images.render_variants")
+def render_image_variants(image_id):
+    from .imaging import process_image
+    from .models import CarImage
+
+    image = CarImage.objects.filter(pk=image_id).first()
+    if image is not None:
+        process_image(image)
+
+
+@task("uploads.purge_expired")
+def purge_expired_uploads():
+    from .uploads import purge_expired
+
+    purge_expired()
+
+
+@task("idempotency.purge_expired")
+def purge_expired_idempotency_keys():
+    from .idempotency import purge_expired
+
+    purge_expired()
+
+
+@task("cars.purge")
+def purge_car(car_id, dealer_id=None):
+    from .purge import purge_car as _purge
+
+    _purge(car_id)
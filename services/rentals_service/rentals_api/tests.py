@@ -0,0 +1,805 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+import gzip
+
+import jwt
+import msgpack
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from rentals_service import admission, dbrouting, health, payloads, profiling, querylog, ratelimit, warmup
+
+from . import idempotency, imaging, jobs, uploads
+from .models import Booking, Car, CarImage, Dealer, Favorite, IdempotencyKey, Job, UploadSession
+
+
+@jobs.task("tests.create_dealer")
+def _create_dealer(name):
+    Dealer.objects.create(name=name, email=f"{name}@example.com")
+
+
+@jobs.task("tests.flaky")
+def _flaky(name):
+    # Fails on the first attempt, succeeds on the retry.
+    if not Dealer.objects.filter(name=f"{name}-marker").exists():
+        Dealer.objects.create(name=f"{name}-marker", email="marker@example.com")
+        raise RuntimeError("transient failure")
+    Dealer.objects.create(name=name, email=f"{name}@example.com")
+
+
+@jobs.task("tests.always_fails")
+def _always_fails():
+    raise ValueError("boom")
+
+
+@jobs.task("tests.outlives_lock")
+def _outlives_lock(heartbeat):
+    # Runs past the lock timeout while another worker checks for stale jobs
+    stale = timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT_SECONDS + 1)
+    Job.objects.filter(name="tests.outlives_lock").update(locked_at=stale)
+    if heartbeat:
+        jobs.report_progress(step=1)
+    jobs.requeue_stale()
+    jobs.claim("other-worker")
+    jobs.report_progress(step=2)
+
+
+@override_settings(JOBS_RETRY_BASE_SECONDS=0, JOBS_MAX_ATTEMPTS=3)
+class JobWorkerIntegrationTests(TransactionTestCase):
+    """Runs real worker processes against the (file-backed) test database."""
+
+    def run_workers(self, processes=3):
+        call_command("run_worker", processes=processes, burst=True, poll_interval=0.05,
+                     stats_interval=0, stdout=StringIO())
+
+    def test_workers_run_every_job_exactly_once(self):
+        for i in range(30):
+            jobs.enqueue("tests.create_dealer", {"name": f"dealer-{i}"})
+        self.run_workers()
+
+        self.assertEqual(Job.objects.filter(status=Job.Status.DONE).count(), 30)
+        self.assertEqual(Dealer.objects.count(), 30)
+        self.assertEqual(set(Job.objects.values_list("attempts", flat=True)), {1})
+
+    def test_failed_job_is_retried_then_succeeds(self):
+        job = jobs.enqueue("tests.flaky", {"name": "flaky"})
+        self.run_workers(processes=2)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.attempts, 2)
+        self.assertTrue(Dealer.objects.filter(name="flaky").exists())
+
+    def test_job_fails_permanently_after_max_attempts(self):
+        job = jobs.enqueue("tests.always_fails")
+        self.run_workers(processes=1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIn("boom", job.last_error)
+
+    def test_delayed_job_is_not_claimed_early(self):
+        jobs.enqueue("tests.create_dealer", {"name": "later"}, delay=3600)
+        self.run_workers(processes=1)
+
+        self.assertEqual(Job.objects.get().status, Job.Status.QUEUED)
+        self.assertFalse(Dealer.objects.exists())
+
+    @skipUnless(connection.vendor == "postgresql", "LISTEN/NOTIFY needs Postgres")
+    def test_idle_worker_wakes_on_notify(self):
+        jobs._wait_for_work(0.05)  # LISTEN, and nothing to wake for yet
+        def enqueue_later():
+            jobs.enqueue("tests.create_dealer", {"name": "late"})
+            connection.close()  # this thread's own connection
+
+        timer = threading.Timer(0.2, enqueue_later)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        start = time.monotonic()
+        jobs._wait_for_work(10)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(jobs.work(burst=True), 1)
+
+    def test_stats_report_throughput_and_latency(self):
+        for i in range(5):
+            jobs.enqueue("tests.create_dealer", {"name": f"d{i}"})
+        self.run_workers(processes=2)
+
+        stats = jobs.stats(window_seconds=60)
+        self.assertEqual(stats["done"], 5)
+        self.assertEqual(stats["queued"], 0)
+        self.assertIsNotNone(stats["wait"]["p95"])
+        self.assertIsNotNone(stats["run"]["avg"])
+
+
+class JobLockTests(TestCase):
+    def test_progress_renews_the_lock(self):
+        job = jobs.enqueue("tests.outlives_lock", {"heartbeat": True})
+        self.assertTrue(jobs.run_job(jobs.claim("worker")))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.progress, {"step": 2})
+
+    def test_job_that_outlives_its_lock_leaves_the_outcome_to_the_new_owner(self):
+        job = jobs.enqueue("tests.outlives_lock", {"heartbeat": False})
+        with self.assertLogs("rentals_api.jobs", "WARNING"):
+            self.assertFalse(jobs.run_job(jobs.claim("worker")))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.RUNNING)
+        self.assertEqual(job.locked_by, "other-worker")
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.last_error, "")
+
+
+def _png(width=2000, height=1000, mode="RGBA"):
+    buf = BytesIO()
+    Image.new(mode, (width, height), (200, 30, 30, 255) if mode == "RGBA" else (200, 30, 30)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+
+    def test_render_variants_sizes_and_formats(self):
+        source = os.path.join(self.media, "src.png")
+        with open(source, "wb") as fh:
+            fh.write(_png())
+        variants = imaging.render_variants(source, self.media, 5)
+        self.assertEqual(set(variants), set(imaging.VARIANTS))
+        sizes = {}
+        for name, formats in variants.items():
+            self.assertEqual(set(formats), {"webp", "jpeg"})
+            for fmt, rel in formats.items():
+                with Image.open(os.path.join(self.media, rel)) as img:
+                    self.assertEqual(img.format, imaging.FORMATS[fmt][0])
+                    sizes[name] = img.size
+        self.assertEqual(sizes["card"], (480, 320))  # cropped to the box
+        self.assertEqual(sizes["card_2x"], (960, 640))
+        self.assertEqual(sizes["hero"], (1600, 800))  # scaled to fit, aspect kept
+
+    def test_upload_serves_variants_once_processed(self):
+        dealer = Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        token = jwt.encode({"user_id": 7}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        upload = SimpleUploadedFile("civic.png", _png(1200, 900, "RGB"), content_type="image/png")
+        with self.settings(MEDIA_ROOT=self.media, IMAGE_PIPELINE_ASYNC=False), \
+                self.captureOnCommitCallbacks(execute=True):
+            resp = client.post("/api/dealer/cars/", {"title": "Civic", "price_per_day": "50.00", "available": "true",
+                                                     "image": upload})
+        self.assertEqual(resp.status_code, 201)
+        image = CarImage.objects.get(car__dealer=dealer)
+        self.assertIsNotNone(image.processed_at)
+        with self.settings(MEDIA_ROOT=self.media):
+            data = self.client.get(f"/api/cars/{image.car_id}/").json()["images"][0]
+        self.assertTrue(data["image"].endswith(f"cars/variants/{image.pk}/hero.jpg"))
+        self.assertTrue(data["image_webp"].endswith("hero.webp"))
+        self.assertTrue(data["thumbnail"].endswith("card.jpg"))
+        self.assertIn("civic", data["original"])
+        with self.settings(MEDIA_ROOT=self.media):
+            card = self.client.get("/api/cars/").json()["results"][0]
+        self.assertTrue(card["primary_image_2x"].endswith("card_2x.jpg"))
+        self.assertTrue(card["primary_image_webp_2x"].endswith("card_2x.webp"))
+
+    def test_unprocessed_image_falls_back_to_the_original(self):
+        dealer = Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        car = Car.objects.create(dealer=dealer, title="Civic", price_per_day="50.00")
+        image = CarImage.objects.create(car=car, image="cars/civic.png", is_primary=True)
+        self.assertEqual(image.variant_url("card"), image.image.url)
+        self.assertIsNone(image.variant_url("card", "webp"))
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=self.media, UPLOAD_CHUNK_BYTES=64, UPLOAD_MAX_CHUNK_BYTES=512)
+        media.enable()
+        self.addCleanup(media.disable)
+        Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        token = jwt.encode({"user_id": 7}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def start(self, data):
+        resp = self.api.post("/api/dealer/uploads/", {"filename": "car.png", "size": len(data)}, format="json")
+        self.assertEqual(resp.status_code, 201)
+        body = resp.json()
+        return f"/api/uploads/{body['id']}/?token={body['token']}"
+
+    def put(self, url, data, start, end=None):
+        end = start + len(data) - 1 if end is None else end
+        return self.client.put(url, data, content_type="application/octet-stream",
+                               headers={"Content-Range": f"bytes {start}-{end}/{self.total}"})
+
+    def test_resume_after_a_dropped_connection(self):
+        data = _png(200, 200, "RGB")
+        self.total = len(data)
+        url = self.start(data)
+        self.assertEqual(self.put(url, data[:200], 0).json()["received"], 200)
+        # The client lost the response to its next chunk: ask where to continue
+        self.assertEqual(self.client.get(url).json()["received"], 200)
+        resp = self.put(url, data[200:], 200)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.json()["complete"])
+        self.assertEqual(resp.json()["received"], self.total)
+
+    def test_wrong_offset_reports_where_to_resume(self):
+        data = _png(200, 200, "RGB")
+        self.total = len(data)
+        url = self.start(data)
+        self.put(url, data[:200], 0)
+        resp = self.put(url, data[300:400], 300)
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()["received"], 200)
+
+    def test_chunk_over_the_limit_is_rejected(self):
+        data = _png(200, 200, "RGB")
+        self.total = len(data)
+        url = self.start(data)
+        self.assertGreater(len(data), 512)
+        self.assertEqual(self.put(url, data, 0).status_code, 413)
+        self.assertEqual(UploadSession.objects.get().received, 0)
+
+    def test_invalid_image_restarts_the_session(self):
+        data = b"not an image " * 10
+        self.total = len(data)
+        url = self.start(data)
+        self.put(url, data[:64], 0)
+        resp = self.put(url, data[64:], 64)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["received"], 0)
+        session = UploadSession.objects.get()
+        self.assertEqual(session.received, 0)
+        self.assertFalse(os.path.exists(uploads.tmp_path(session)))
+        # A resumed upload starts over rather than padding an empty file
+        self.assertEqual(self.put(url, data[64:], 64).status_code, 409)
+
+    def test_lost_partial_file_restarts_the_session(self):
+        data = _png(200, 200, "RGB")
+        self.total = len(data)
+        url = self.start(data)
+        self.put(url, data[:200], 0)
+        os.remove(uploads.tmp_path(UploadSession.objects.get()))
+        resp = self.put(url, data[200:], 200)
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()["received"], 0)
+        self.put(url, data[:200], 0)
+        self.assertTrue(self.put(url, data[200:], 200).json()["complete"])
+
+
+    def test_attach_survives_a_rolled_back_transaction(self):
+        data = _png(200, 200, "RGB")
+        self.total = len(data)
+        url = self.start(data)
+        self.put(url, data[:400], 0)
+        self.assertTrue(self.put(url, data[400:], 400).json()["complete"])
+        session = UploadSession.objects.get()
+        dealer = Dealer.objects.get()
+        car = Car.objects.create(dealer=dealer, title="Civic", price_per_day="50.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                uploads.attach_to_car(session.pk, dealer, car)
+                transaction.set_rollback(True)
+        self.assertTrue(os.path.exists(uploads.tmp_path(session)))
+        self.assertFalse(car.images.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            image = uploads.attach_to_car(session.pk, dealer, car)
+        self.assertTrue(image.is_primary)
+        self.assertFalse(os.path.exists(uploads.tmp_path(session)))
+        # The rolled-back attempt's copy was replaced, not left next to it
+        self.assertEqual(os.listdir(os.path.join(self.media, "cars")), [os.path.basename(image.image.name)])
+
+    def test_attach_without_the_partial_file_is_an_upload_error(self):
+        data = _png(200, 200, "RGB")
+        self.total = len(data)
+        url = self.start(data)
+        self.put(url, data[:400], 0)
+        self.assertTrue(self.put(url, data[400:], 400).json()["complete"])
+        session = UploadSession.objects.get()
+        os.remove(uploads.tmp_path(session))
+        car = Car.objects.create(dealer=session.dealer, title="Civic", price_per_day="50.00")
+        with self.assertRaisesMessage(uploads.UploadError, "Upload not found or not finished."):
+            uploads.attach_to_car(session.pk, session.dealer, car)
+
+@override_settings(CAR_PURGE_BATCH_SIZE=3)
+class CarSoftDeleteTests(TestCase):
+    def setUp(self):
+        self.dealer = Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        self.car = Car.objects.create(dealer=self.dealer, title="Civic", price_per_day="50.00")
+        start = date.today() + timedelta(days=1)
+        for i in range(7):
+            Booking.objects.create(
+                car=self.car, user_id=100 + i,
+                start_date=start + timedelta(days=i * 2), end_date=start + timedelta(days=i * 2),
+            )
+        Favorite.objects.create(user_id=100, car=self.car)
+        token = jwt.encode({"user_id": 7}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_delete_hides_car_immediately_and_purges_in_background(self):
+        resp = self.client.delete(f"/api/dealer/cars/{self.car.pk}/")
+        self.assertEqual(resp.status_code, 200)
+        job_id = resp.json()["purge_job"]
+
+        # Hidden everywhere straight away, while dependent rows still exist.
+        self.assertEqual(self.client.get("/api/cars/").json()["count"], 0)
+        self.assertEqual(self.client.get(f"/api/cars/{self.car.pk}/").status_code, 404)
+        self.assertEqual(self.client.get("/api/dealer/cars/").json(), [])
+        self.assertEqual(Booking.objects.filter(car_id=self.car.pk).count(), 7)
+
+        jobs.work(burst=True)
+
+        self.assertFalse(Car.all_objects.filter(pk=self.car.pk).exists())
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(Favorite.objects.exists())
+        status = self.client.get(f"/api/dealer/jobs/{job_id}/").json()
+        self.assertEqual(status["status"], Job.Status.DONE)
+        self.assertEqual(status["progress"]["bookings"], 7)
+        self.assertTrue(status["progress"]["done"])
+
+
+class MetricsTests(TestCase):
+    def test_metrics_report_requests_latency_and_sql_per_view(self):
+        dealer = Dealer.objects.create(name="Ace", email="ace@example.com")
+        Car.objects.create(dealer=dealer, title="Civic", price_per_day="50.00")
+        self.client.get("/api/cars/")
+        self.client.get("/api/cars/")
+
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        body = resp.content.decode()
+        self.assertRegex(body, r'http_requests_total\{view="api_cars",method="GET",status="200"\} [1-9]')
+        self.assertIn('http_request_duration_seconds_bucket{view="api_cars",le="+Inf"}', body)
+        self.assertRegex(body, r'db_queries_per_request_count\{view="api_cars"\} [1-9]')
+        self.assertIn("# TYPE http_requests_in_flight gauge", body)
+
+
+class HealthTests(TestCase):
+    databases = {"default", "replica"}  # readiness checks every configured alias
+
+    def setUp(self):
+        health._cached = (0.0, None)
+
+    def test_healthz_and_readyz(self):
+        self.assertEqual(self.client.get("/healthz").json(), {"status": "ok"})
+        resp = self.client.get("/readyz")
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["status"], "ready")
+        self.assertTrue(body["checks"]["databases"]["ok"])
+        self.assertEqual(body["checks"]["databases"]["detail"]["default"], "ok")
+        self.assertTrue(warmup._process_warm and warmup._worker_warm)
+
+    def test_readyz_is_cached_and_reports_failures(self):
+        broken = (False, {"default": "error: ConnectionError"})
+        with override_settings(HEALTH_CACHE_SECONDS=60):
+            self.assertEqual(self.client.get("/readyz").status_code, 200)
+            with patch.object(health, "_caches", return_value=broken):
+                self.assertEqual(self.client.get("/readyz").status_code, 200)  # cached
+                health._cached = (0.0, None)
+                resp = self.client.get("/readyz")
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.json()["checks"]["caches"]["detail"], broken[1])
+
+
+@override_settings(PROFILING_SECRET="test-profiling-secret")
+class ProfilingTests(TestCase):
+    def test_signed_header_profiles_request(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(PROFILING_DIR=tmp):
+            resp = self.client.get("/api/cars/", HTTP_X_PROFILE=profiling.make_token())
+            self.assertEqual(resp.status_code, 200)
+            profile_id = resp["X-Profile-Id"]
+            self.assertTrue(os.path.exists(os.path.join(tmp, f"{profile_id}.prof")))
+            summary = profiling.load_profile(profile_id)
+            self.assertEqual(summary["view"], "api_cars")
+            self.assertTrue(summary["top_functions"])
+
+            resp = self.client.get("/api/cars/", HTTP_X_PROFILE="forged")
+            self.assertNotIn("X-Profile-Id", resp)
+            self.assertEqual(len(profiling.list_profiles()), 1)
+
+    def test_off_without_a_secret(self):
+        token = profiling.make_token()
+        with tempfile.TemporaryDirectory() as tmp, override_settings(PROFILING_DIR=tmp, PROFILING_SECRET=""):
+            resp = self.client.get("/api/cars/", HTTP_X_PROFILE=token)
+            self.assertNotIn("X-Profile-Id", resp)
+            with self.assertRaises(ImproperlyConfigured):
+                profiling.make_token()
+
+    def test_only_the_newest_profiles_are_kept(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(PROFILING_DIR=tmp, PROFILING_MAX_FILES=2):
+            for name in ("20250101T000000-a", "20250101T000001-b", "20250101T000002-c"):
+                for suffix in (".json", ".prof"):
+                    open(os.path.join(tmp, name + suffix), "w").close()
+            profiling._prune(tmp)
+            self.assertEqual(sorted(os.listdir(tmp)), [
+                "20250101T000001-b.json", "20250101T000001-b.prof",
+                "20250101T000002-c.json", "20250101T000002-c.prof",
+            ])
+
+
+class QueryBudgetTests(TestCase):
+    """Endpoints listing many cars must not run per-car queries."""
+
+    def setUp(self):
+        self.dealer = Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        today = date.today()
+        for i in range(12):
+            car = Car.objects.create(dealer=self.dealer, title=f"Car {i}", price_per_day="50.00")
+            CarImage.objects.create(car=car, image=f"cars/{i}.jpg", is_primary=True)
+            Booking.objects.create(
+                car=car, user_id=9, start_date=today + timedelta(days=i + 1),
+                end_date=today + timedelta(days=i + 2), status=Booking.Status.CONFIRMED,
+            )
+            Favorite.objects.create(car=car, user_id=9)
+        self.car = car
+
+    def _client(self, user_id):
+        token = jwt.encode({"user_id": user_id}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client
+
+    def test_browse_endpoints_within_budget(self):
+        with querylog.query_budget(settings.DB_QUERY_BUDGETS["api_cars"]):
+            resp = self.client.get("/api/cars/")
+        self.assertEqual(len(resp.json()["results"]), 12)
+        self.assertTrue(resp.json()["results"][0]["primary_image"])
+        with querylog.query_budget(settings.DB_QUERY_BUDGETS["api_car_detail"]):
+            self.assertEqual(self.client.get(f"/api/cars/{self.car.pk}/").status_code, 200)
+
+    def test_user_lists_within_budget(self):
+        client = self._client(9)
+        with querylog.query_budget(settings.DB_QUERY_BUDGETS["api_favorites"]):
+            self.assertEqual(client.get("/api/favorites/").status_code, 200)
+        with querylog.query_budget(settings.DB_QUERY_BUDGETS["api_bookings_mine"]):
+            self.assertEqual(client.get("/api/bookings/mine/").status_code, 200)
+
+    def test_dealer_dashboard_query_count_independent_of_cars(self):
+        with querylog.query_budget(settings.DB_QUERY_BUDGETS["api_dealer_dashboard"]):
+            resp = self._client(7).get("/api/dealer/dashboard/")
+        self.assertEqual(resp.status_code, 200)
+
+    def test_repeated_shape_is_flagged(self):
+        with self.assertRaises(querylog.QueryProblem):
+            with querylog.query_budget(100):
+                for car in Car.objects.all():
+                    car.primary_image_obj
+
+
+class AsyncReadViewTests(TestCase):
+    """The browse and "my" lists are async views; under ASGI they keep their JSON and budgets."""
+
+    def setUp(self):
+        dealer = Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        self.car = Car.objects.create(dealer=dealer, title="Civic", price_per_day="50.00")
+        CarImage.objects.create(car=self.car, image="cars/civic.jpg", is_primary=True)
+        today = date.today()
+        Booking.objects.create(
+            car=self.car, user_id=9, start_date=today + timedelta(days=1),
+            end_date=today + timedelta(days=3), status=Booking.Status.CONFIRMED,
+        )
+        Favorite.objects.create(car=self.car, user_id=9)
+        token = jwt.encode({"user_id": 9}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        self.auth = {"AUTHORIZATION": f"Bearer {token}"}
+
+    async def test_read_views_under_asgi(self):
+        client = AsyncClient()
+        with querylog.query_budget(settings.DB_QUERY_BUDGETS["api_cars"]):
+            resp = await client.get("/api/cars/")
+        self.assertEqual(resp.json()["count"], 1)
+        self.assertTrue(resp.json()["results"][0]["primary_image"])
+        with querylog.query_budget(settings.DB_QUERY_BUDGETS["api_car_detail"]):
+            resp = await client.get(f"/api/cars/{self.car.pk}/")
+        self.assertEqual(len(resp.json()["upcoming_bookings"]), 1)
+        resp = await client.get("/api/favorites/", headers=self.auth)
+        self.assertEqual(resp.json()["results"][0]["car"]["id"], self.car.pk)
+        resp = await client.get("/api/bookings/mine/", headers=self.auth)
+        self.assertEqual(len(resp.json()["results"]), 1)
+
+    async def test_errors_match_drf(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get("/api/cars/999999/")).status_code, 404)
+        self.assertEqual((await client.get("/api/favorites/")).status_code, 401)
+        resp = await client.get("/api/bookings/mine/", headers={"AUTHORIZATION": "Bearer nope"})
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(resp.json(), {"detail": "Invalid token"})
+        self.assertEqual((await client.post("/api/cars/")).status_code, 405)
+
+    def test_sync_client_still_served(self):
+        self.assertEqual(self.client.get("/api/cars/").status_code, 200)
+
+
+class PayloadTests(TestCase):
+    """The gateway's Accept / Accept-Encoding get MessagePack and compressed bodies with the same data."""
+
+    def setUp(self):
+        dealer = Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        for i in range(12):
+            self.car = Car.objects.create(dealer=dealer, title=f"Car {i}", price_per_day="50.00")
+        token = jwt.encode({"user_id": 7}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        self.auth = {"AUTHORIZATION": f"Bearer {token}"}
+        self.msgpack = {"Accept": "application/msgpack, application/json;q=0.9"}
+
+    def test_msgpack_carries_the_json_data(self):
+        for url in ("/api/cars/", f"/api/cars/{self.car.pk}/", "/api/dealer/dashboard/"):
+            as_json = self.client.get(url, headers=self.auth)
+            as_msgpack = self.client.get(url, headers={**self.auth, **self.msgpack})
+            self.assertEqual(as_msgpack["Content-Type"], "application/msgpack")
+            self.assertIn("Accept", as_msgpack["Vary"])
+            self.assertEqual(msgpack.unpackb(as_msgpack.content), as_json.json())
+        # Browsers and clients that do not ask for it keep getting JSON
+        resp = self.client.get("/api/cars/", headers={"Accept": "text/html,*/*;q=0.8"})
+        self.assertEqual(resp["Content-Type"], "application/json")
+
+    async def test_msgpack_from_async_views(self):
+        resp = await AsyncClient().get(f"/api/cars/{self.car.pk}/", headers=self.msgpack)
+        self.assertEqual(msgpack.unpackb(resp.content)["id"], self.car.pk)
+
+    def test_large_bodies_are_compressed(self):
+        resp = self.client.get("/api/cars/", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(len(gzip.decompress(resp.content)), len(self.client.get("/api/cars/").content))
+        if payloads.zstd is not None:
+            resp = self.client.get("/api/cars/", headers={"Accept-Encoding": "gzip, zstd"})
+            self.assertEqual(resp["Content-Encoding"], "zstd")
+        with override_settings(PAYLOAD_COMPRESS_MIN_BYTES=10**6):
+            resp = self.client.get("/api/cars/", headers={"Accept-Encoding": "gzip"})
+        self.assertFalse(resp.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", resp["Vary"])
+
+
+@override_settings(RATE_LIMITS={"browse": (1, 2), "booking": (1, 1), "dealer_write": (1, 1)})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        dealer = Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        self.car = Car.objects.create(dealer=dealer, title="Civic", price_per_day="50.00")
+
+    def _auth(self, user_id):
+        token = jwt.encode({"user_id": user_id}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        return {"Authorization": f"Bearer {token}"}
+
+    def test_burst_then_429_per_client(self):
+        gateway = {"X-Forwarded-For": "203.0.113.5"}
+        self.assertEqual([self.client.get("/api/cars/", headers=gateway).status_code for _ in range(3)], [200, 200, 429])
+        resp = self.client.get(f"/api/cars/{self.car.pk}/", headers=gateway)
+        self.assertEqual(resp.status_code, 429)  # same class, same bucket
+        self.assertEqual(resp["Retry-After"], "1")
+        # Other clients have their own buckets: another forwarded IP, a signed-in user
+        self.assertEqual(self.client.get("/api/cars/", headers={"X-Forwarded-For": "203.0.113.6"}).status_code, 200)
+        self.assertEqual(self.client.get("/api/cars/", headers={**gateway, **self._auth(9)}).status_code, 200)
+        # Unlisted routes are not limited
+        self.assertEqual(self.client.get("/api/favorites/", headers=gateway).status_code, 401)
+
+        body = self.client.get("/metrics").content.decode()
+        self.assertRegex(body, r'rate_limited_total\{route_class="browse",client="ip"\} [1-9]')
+
+    def test_bucket_refills(self):
+        store = ratelimit.LocalStore()
+        self.assertEqual(store.acquire("k", 0.01, 1), 0)
+        self.assertGreater(store.acquire("k", 0.01, 1), 0)
+        with patch.object(ratelimit.time, "monotonic", return_value=ratelimit.time.monotonic() + 0.02):
+            self.assertEqual(store.acquire("k", 0.01, 1), 0)
+
+    def test_cache_store_and_disabled(self):
+        with override_settings(RATE_LIMIT_STORE="rentals_service.ratelimit.CacheStore"):
+            self.assertEqual([self.client.get("/api/cars/").status_code for _ in range(3)], [200, 200, 429])
+        with override_settings(RATE_LIMIT_ENABLED=False):
+            self.assertEqual(self.client_class().get("/api/cars/").status_code, 200)
+
+
+class AdmissionTests(TestCase):
+    def setUp(self):
+        dealer = Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        self.car = Car.objects.create(dealer=dealer, title="Civic", price_per_day="50.00")
+        token = jwt.encode({"user_id": 9}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        self.auth = {"Authorization": f"Bearer {token}"}
+        self.client.get("/api/cars/")  # builds the middleware and its limiters
+
+    def test_requests_past_their_deadline_are_dropped(self):
+        resp = self.client.get("/api/cars/", headers={"X-Request-Budget-Ms": "0"})
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "1")
+        self.assertEqual(self.client.get("/api/cars/", headers={"X-Request-Budget-Ms": "500"}).status_code, 200)
+        # The budget is relative: a sender's clock far behind ours does not matter
+        skewed = {"X-Request-Budget-Ms": "500", "X-Request-Start": f"t={int((time.time() - 60) * 1_000_000)}"}
+        self.assertEqual(self.client.get("/api/cars/", headers=skewed).status_code, 200)
+        body = self.client.get("/metrics").content.decode()
+        self.assertRegex(body, r'admission_rejected_total\{class="browse",reason="deadline"\} 1')
+
+    def test_booking_has_priority_over_anonymous_browsing(self):
+        limiters = admission._limiters
+        limiters["user"].in_flight = int(limiters["user"].limit)
+        try:
+            # Browsing is shed while a higher class is full; that class itself is at its limit
+            self.assertEqual(self.client.get("/api/cars/").status_code, 503)
+            self.assertEqual(self.client.get("/api/favorites/", headers=self.auth).status_code, 503)
+            resp = self.client.post("/api/bookings/", {"car_id": self.car.id}, headers=self.auth)
+            self.assertEqual(resp.status_code, 400)  # admitted, then validated
+        finally:
+            limiters["user"].in_flight = 0
+        self.assertEqual(limiters["booking"].in_flight, 0)
+        body = self.client.get("/metrics").content.decode()
+        self.assertRegex(body, r'admission_rejected_total\{class="browse",reason="priority"\} 1')
+        self.assertRegex(body, r'admission_rejected_total\{class="user",reason="limit"\} 1')
+
+    def test_only_a_valid_token_moves_browsing_up(self):
+        limiters = admission._limiters
+        limiters["user"].in_flight = int(limiters["user"].limit)
+        try:
+            with patch.object(admission, "_reject", wraps=admission._reject) as reject:
+                self.client.get("/api/cars/", headers=self.auth)
+                self.client.get("/api/cars/", headers={"Authorization": "Bearer not-a-token"})
+        finally:
+            limiters["user"].in_flight = 0
+        # The signed-in request is "user" (full); the forged one stays anonymous "browse"
+        self.assertEqual([c.args[:2] for c in reject.call_args_list], [("user", "limit"), ("browse", "priority")])
+
+    def test_limit_adapts_to_latency(self):
+        limiter = admission.Limiter("test", target_ms=100, min_limit=2, initial=10)
+        for _ in range(10):
+            self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        limiter.release(0.5)
+        self.assertAlmostEqual(limiter.limit, 9)
+        limiter.release(0.5)  # same latency window: one decrease
+        self.assertAlmostEqual(limiter.limit, 9)
+        limiter.release(0.01)
+        self.assertAlmostEqual(limiter.limit, 9 + 1 / 9)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.dealer = Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        self.car = Car.objects.create(dealer=self.dealer, title="Civic", price_per_day="50.00")
+        token = jwt.encode({"user_id": 9}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        self.user = APIClient()
+        self.user.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        start = date.today() + timedelta(days=3)
+        self.booking = {"car_id": self.car.pk, "start_date": start.isoformat(), "end_date": start.isoformat()}
+
+    def post(self, url, data, key, **kwargs):
+        return self.user.post(url, data, format=kwargs.pop("format", "json"), headers={"Idempotency-Key": key}, **kwargs)
+
+    def test_duplicate_booking_replays_the_first_response(self):
+        first = self.post("/api/bookings/", self.booking, "k1")
+        self.assertEqual(first.status_code, 201)
+        second = self.post("/api/bookings/", self.booking, "k1")
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Booking.objects.count(), 1)
+        # Another key is another booking attempt (refused here: the dates overlap)
+        self.assertNotIn("Idempotent-Replayed", self.post("/api/bookings/", self.booking, "k2"))
+
+    def test_replay_is_encoded_for_its_own_accept(self):
+        first = self.post("/api/bookings/", self.booking, "k1", HTTP_ACCEPT=payloads.MSGPACK)
+        self.assertEqual(first["Content-Type"], payloads.MSGPACK)
+        data = msgpack.unpackb(first.content)
+        second = self.post("/api/bookings/", self.booking, "k1", HTTP_ACCEPT=payloads.JSON)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second["Content-Type"], payloads.JSON)
+        self.assertEqual(second.json(), data)
+        third = self.post("/api/bookings/", self.booking, "k1", HTTP_ACCEPT=payloads.MSGPACK)
+        self.assertEqual(msgpack.unpackb(third.content), data)
+
+    def test_favorite_toggle_is_not_repeated(self):
+        for _ in range(2):
+            resp = self.post("/api/favorites/toggle/", {"car_id": self.car.pk}, "fav-1")
+            self.assertEqual(resp.json(), {"is_favorite": True})
+        self.assertEqual(Favorite.objects.count(), 1)
+
+    def test_dealer_car_upload_is_created_once(self):
+        token = jwt.encode({"user_id": 7}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        self.user.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        car = {"title": "Golf", "price_per_day": "40.00"}
+        for _ in range(2):
+            resp = self.post("/api/dealer/cars/", car, "car-1", format="multipart")
+            self.assertEqual(resp.status_code, 201)
+        self.assertEqual(self.dealer.cars.count(), 2)  # the Civic and one Golf
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.post("/api/bookings/", self.booking, "k1")
+        other = dict(self.booking, end_date=(date.today() + timedelta(days=4)).isoformat())
+        self.assertEqual(self.post("/api/bookings/", other, "k1").status_code, 422)
+        self.assertEqual(self.post("/api/favorites/toggle/", {"car_id": self.car.pk}, "k1").status_code, 422)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0.1, IDEMPOTENCY_POLL_SECONDS=0.01)
+    def test_concurrent_duplicate_waits_then_conflicts(self):
+        self.post("/api/bookings/", self.booking, "k1")
+        record = IdempotencyKey.objects.get(key="k1")
+        IdempotencyKey.objects.filter(pk=record.pk).update(completed_at=None)
+        resp = self.post("/api/bookings/", self.booking, "k1")
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp["Retry-After"], "1")
+        # Its request died: the claim is taken over after IDEMPOTENCY_LOCK_SECONDS
+        IdempotencyKey.objects.filter(pk=record.pk).update(locked_at=record.locked_at - timedelta(minutes=5))
+        Booking.objects.all().delete()
+        self.assertEqual(self.post("/api/bookings/", self.booking, "k1").status_code, 201)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_failed_request_releases_its_key(self):
+        with patch("rentals_api.views.BookingSerializer.save", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                self.post("/api/bookings/", self.booking, "k1")
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post("/api/bookings/", self.booking, "k1").status_code, 201)
+
+    def test_expired_keys_are_purged_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            self.post("/api/favorites/toggle/", {"car_id": self.car.pk}, f"old-{i}")
+        IdempotencyKey.objects.update(expires_at=now - timedelta(seconds=1))
+        self.post("/api/favorites/toggle/", {"car_id": self.car.pk}, "fresh")
+        self.assertEqual(idempotency.purge_expired(batch_size=2), 5)
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["fresh"])
+        out = StringIO()
+        call_command("cleanup_idempotency_keys", stdout=out)
+        self.assertIn("Removed 0 expired idempotency keys", out.getvalue())
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        dealer = Dealer.objects.create(user_id=7, name="Ace", email="ace@example.com")
+        self.car = Car.objects.create(dealer=dealer, title="Civic", price_per_day="50.00")
+        token = jwt.encode({"user_id": 9}, settings.ACCOUNTS_JWT_SECRET, algorithm="HS256")
+        self.user = APIClient()
+        self.user.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.addCleanup(dbrouting._down_until.clear)
+        self.addCleanup(caches[settings.REPLICA_PIN_CACHE].clear)
+
+    def aliases_used(self, client, url):
+        used = []
+
+        def record(execute, sql, params, many, context):
+            used.append(context["connection"].alias)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in self.databases:
+                stack.enter_context(connections[alias].execute_wrapper(record))
+            self.assertEqual(client.get(url).status_code, 200)
+        return set(used)
+
+    def test_read_views_use_replica(self):
+        self.assertEqual(self.aliases_used(self.client, "/api/cars/"), {"replica"})
+        self.assertEqual(self.aliases_used(self.user, "/api/favorites/"), {"replica"})
+        # Not a replica view
+        self.assertEqual(self.aliases_used(self.user, "/api/bookings/mine/"), {"default"})
+
+    def test_user_pinned_to_primary_after_write(self):
+        resp = self.user.post("/api/favorites/toggle/", {"car_id": self.car.pk}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.aliases_used(self.user, "/api/favorites/"), {"default"})
+        # Other users still read from the replica
+        self.assertEqual(self.aliases_used(self.client, "/api/cars/"), {"replica"})
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        dbrouting._down_until["replica"] = float("inf")
+        self.assertEqual(self.aliases_used(self.client, "/api/cars/"), {"default"})
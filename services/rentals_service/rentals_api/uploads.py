@@ -0,0 +1,206 @@
+"""
+Resumable chunked uploads.
+
+The gateway asks for an upload session on behalf of a dealer and hands the
+browser a signed, short-lived token. The browser then PUTs the file in chunks
+straight to this service (``Content-Range: bytes start-end/total``), can ask
+for the current offset after a dropped connection and continue from there,
+and finally references the session id when creating/updating a car so the
+finished file is attached as a ``CarImage``.
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from .imaging import schedule_variants
+from .models import CarImage, UploadSession
+
+SIGNING_SALT = "rentals_api.uploads"
+
+
+class UploadError(Exception):
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def _tmp_dir():
+    path = os.path.join(settings.MEDIA_ROOT, "uploads", "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def tmp_path(session):
+    return os.path.join(_tmp_dir(), f"{session.id}.part")
+
+
+def sign_session(session):
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign(str(session.id))
+
+
+def verify_token(session_id, token):
+    """Return True if ``token`` was issued for ``session_id`` and has not expired."""
+    try:
+        value = signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            token or "", max_age=settings.UPLOAD_SESSION_TTL
+        )
+    except signing.BadSignature:
+        return False
+    return value == str(session_id)
+
+
+def create_session(dealer, filename, total_size, content_type=""):
+    if total_size <= 0 or total_size > settings.UPLOAD_MAX_BYTES:
+        raise UploadError(f"File size must be between 1 byte and {settings.UPLOAD_MAX_BYTES} bytes.")
+    if content_type and not content_type.startswith("image/"):
+        raise UploadError("Only image uploads are supported.")
+    return UploadSession.objects.create(
+        dealer=dealer,
+        filename=os.path.basename(filename or "upload")[:255],
+        content_type=content_type or "",
+        total_size=total_size,
+        expires_at=timezone.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL),
+    )
+
+
+def parse_content_range(header):
+    """Parse ``bytes start-end/total`` into ints; raise UploadError if malformed."""
+    try:
+        unit, rng = header.strip().split(" ", 1)
+        span, total = rng.split("/", 1)
+        start, end = span.split("-", 1)
+        start, end, total = int(start), int(end), int(total)
+    except (AttributeError, ValueError):
+        raise UploadError("Content-Range header must look like 'bytes start-end/total'.")
+    if unit != "bytes" or start < 0 or end < start:
+        raise UploadError("Invalid Content-Range.")
+    return start, end, total
+
+
+def _restart(session):
+    """Drop the partial file and rewind the session, so the client resumes from 0."""
+    discard(session)
+    session.received = 0
+    session.save(update_fields=["received"])
+
+
+def append_chunk(session, start, total, data):
+    """Append ``data`` at offset ``start``. Caller must hold a row lock on ``session``.
+
+    An ``UploadError`` may come after ``session`` was rewound: the caller
+    commits that (and reports the new ``received``) rather than rolling back.
+    """
+    if session.is_complete:
+        raise UploadError("Upload already completed.", status=409)
+    if session.expires_at < timezone.now():
+        raise UploadError("Upload session expired.", status=410)
+    if total != session.total_size:
+        raise UploadError("Total size does not match the session.")
+    path = tmp_path(session)
+    if session.received and (not os.path.exists(path) or os.path.getsize(path) < session.received):
+        # The partial file was lost or is short: never pad it with zeros
+        _restart(session)
+    if start != session.received:
+        # Client is out of sync (e.g. resent a chunk); it should resume from `received`.
+        raise UploadError("Unexpected offset.", status=409)
+    if len(data) > settings.UPLOAD_MAX_CHUNK_BYTES or start + len(data) > session.total_size:
+        raise UploadError("Chunk too large.", status=413)
+
+    with open(path, "ab") as fh:
+        fh.seek(start)
+        fh.truncate()
+        fh.write(data)
+    session.received = start + len(data)
+    fields = ["received"]
+    if session.received == session.total_size:
+        _validate_image(session)
+        session.completed_at = timezone.now()
+        fields.append("completed_at")
+    session.save(update_fields=fields)
+    return session
+
+
+def _validate_image(session):
+    path = tmp_path(session)
+    try:
+        with Image.open(path) as img:
+            img.verify()
+    except Exception:
+        _restart(session)
+        raise UploadError("Uploaded file is not a valid image.")
+
+
+def attach_to_car(session_id, dealer, car, is_primary=None):
+    """Turn a completed upload owned by ``dealer`` into a CarImage for ``car``."""
+    session = (
+        UploadSession.objects
+        .select_for_update()
+        .filter(pk=session_id, dealer=dealer, image__isnull=True)
+        .first()
+    )
+    if session is None or not session.is_complete:
+        raise UploadError("Upload not found or not finished.")
+    if is_primary is None:
+        is_primary = not car.images.filter(is_primary=True).exists()
+    image = CarImage(car=car, is_primary=is_primary)
+    # Left behind if an earlier attempt's transaction rolled back
+    default_storage.delete(_stored_name(session))
+    try:
+        with open(tmp_path(session), "rb") as fh:
+            image.image.save(_image_name(session), File(fh), save=True)
+    except FileNotFoundError:
+        raise UploadError("Upload not found or not finished.")
+    session.image = image
+    session.save(update_fields=["image"])
+    # Only once attached for good: if the caller rolls back, a retry attaches it again
+    transaction.on_commit(lambda: discard(session))
+    schedule_variants(image)
+    return image
+
+
+def _image_name(session):
+    return f"{session.id.hex[:12]}-{session.filename}"
+
+
+def _stored_name(session):
+    return CarImage._meta.get_field("image").generate_filename(None, _image_name(session))
+
+
+def discard(session):
+    try:
+        os.remove(tmp_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def purge_expired(now=None):
+    """Delete expired sessions that never got attached, plus their partial and rolled-back files."""
+    now = now or timezone.now()
+    expired = UploadSession.objects.filter(expires_at__lt=now, image__isnull=True)
+    count = 0
+    for session in expired.iterator():
+        discard(session)
+        default_storage.delete(_stored_name(session))
+        count += 1
+    expired.delete()
+    return count
+
+
+def session_status(session):
+    return {
+        "id": str(session.id),
+        "filename": session.filename,
+        "total_size": session.total_size,
+        "received": session.received,
+        "complete": session.is_complete,
+        "expires_at": session.expires_at.isoformat(),
+        "chunk_size": settings.UPLOAD_CHUNK_BYTES,
+    }
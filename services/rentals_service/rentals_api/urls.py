@@ -14,5 +14,8 @@ urlpatterns = [
     path("dealer/cars/<int:pk>/", views.dealer_car_update, name="api_dealer_car_update"),
     path("dealer/cars/<int:pk>/price/", views.dealer_car_price, name="api_dealer_car_price"),
     path("dealer/cars/<int:pk>/bookings/", views.dealer_car_bookings, name="api_dealer_car_bookings"),
+    path("dealer/jobs/<int:job_id>/", views.dealer_job_status, name="api_dealer_job_status"),
+    path("dealer/uploads/", views.dealer_upload_create, name="api_dealer_upload_create"),
+    path("uploads/<uuid:session_id>/", views.upload_chunk, name="api_upload_chunk"),
     path("dealer/bookings/<int:booking_id>/status/", views.dealer_booking_status, name="api_dealer_booking_status"),
 ]
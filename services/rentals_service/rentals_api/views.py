@@ -1,17 +1,28 @@
 from datetime import date
 from decimal import Decimal, InvalidOperation
 
-from django.http import JsonResponse
+from django.conf import settings
+from django.db import transaction
+from rentals_service.payloads import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+from django.core.exceptions import ValidationError
 from django.db.models import Q, Sum, Count
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework import status
+from rest_framework import exceptions, status
 import calendar
 
+from .auth import user_from_authorization
 from .models import Car, Dealer, Booking, Favorite, CarImage
+from .idempotency import idempotent
+from .imaging import schedule_variants
+from . import uploads
+from .models import Job, UploadSession
+from .purge import soft_delete_car
 from .serializers import (
     CarListSerializer,
     CarDetailSerializer,
@@ -40,20 +51,38 @@ def _month_bounds(anchor=None):
     return month_start, month_end
 
 
-def _attach_car_schedule(car, *, month_start, today, months=1, upcoming_limit=3):
-    base_qs = (
+def _active_bookings(cars, since):
+    return (
         Booking.objects
-        .filter(car=car, status__in=ACTIVE_BOOKING_STATUSES)
+        .filter(car__in=cars, status__in=ACTIVE_BOOKING_STATUSES, end_date__gte=since)
+        .order_by("start_date", "pk")
     )
-    current = base_qs.filter(
-        start_date__lte=today,
-        end_date__gte=today,
-    ).order_by("start_date").first()
-    next_b = base_qs.filter(start_date__gt=today).order_by("start_date").first()
-    upcoming_qs = base_qs.filter(start_date__gte=today).order_by("start_date")
+
+
+def _active_bookings_by_car(cars, since):
+    """Active bookings ending on or after ``since``, by start date, per car id (one query)."""
+    grouped = {car.pk: [] for car in cars}
+    for booking in _active_bookings(cars, since):
+        grouped[booking.car_id].append(booking)
+    return grouped
+
+
+async def _aactive_bookings_by_car(cars, since):
+    grouped = {car.pk: [] for car in cars}
+    async for booking in _active_bookings(cars, since):
+        grouped[booking.car_id].append(booking)
+    return grouped
+
+
+def _attach_car_schedule(car, *, month_start, today, months=1, upcoming_limit=3, bookings=None):
+    # Pass ``bookings`` (from _active_bookings_by_car) when scheduling several cars.
+    if bookings is None:
+        bookings = _active_bookings_by_car([car], min(month_start, today))[car.pk]
+    current = next((b for b in bookings if b.start_date <= today <= b.end_date), None)
+    next_b = next((b for b in bookings if b.start_date > today), None)
+    upcoming = [b for b in bookings if b.start_date >= today]
     if upcoming_limit is not None:
-        upcoming_qs = upcoming_qs[:upcoming_limit]
-    upcoming = list(upcoming_qs)
+        upcoming = upcoming[:upcoming_limit]
     # Build ranges for calendar render
     month_ends = []
     m_start = month_start
@@ -63,12 +92,7 @@ def _attach_car_schedule(car, *, month_start, today, months=1, upcoming_limit=3)
         m_start = next_start
     month_end = month_ends[-1]
 
-    ranges = list(
-        base_qs.filter(
-            end_date__gte=month_start,
-            start_date__lt=month_end,
-        ).values("start_date", "end_date")
-    )
+    ranges = [b for b in bookings if b.end_date >= month_start and b.start_date < month_end]
 
     months_data = []
     m_start = month_start
@@ -82,7 +106,7 @@ def _attach_car_schedule(car, *, month_start, today, months=1, upcoming_limit=3)
                 booked = False
                 if in_month:
                     for r in ranges:
-                        if r["start_date"] <= d <= r["end_date"]:
+                        if r.start_date <= d <= r.end_date:
                             booked = True
                             break
                 row.append(
@@ -113,16 +137,28 @@ def _attach_car_schedule(car, *, month_start, today, months=1, upcoming_limit=3)
         car.calendar_weeks = months_data[0]["weeks"]
 
 
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def car_list(request):
-    qs = Car.objects.filter(available=True).select_related("dealer")
-    q = (request.GET.get("q") or "").strip()
-    make = (request.GET.get("make") or "").strip()
-    dealer_name = (request.GET.get("dealer") or "").strip()
-    t = (request.GET.get("type") or "").strip()
-    min_price_raw = (request.GET.get("min_price") or "").strip()
-    max_price_raw = (request.GET.get("max_price") or "").strip()
+# The read views below are plain async Django views on the async ORM (DRF views are
+# sync only); under ASGI they don't hold a worker thread while waiting on the database.
+# Their JSON is the same as before; _token_user_id stands in for DRF authentication.
+
+def _token_user_id(request):
+    """``(user id or None, None)``, or ``(None, 403 response)`` for a bad token, like DRF."""
+    try:
+        user = user_from_authorization(request.headers.get("Authorization"))
+    except exceptions.AuthenticationFailed as exc:
+        return None, JsonResponse({"detail": exc.detail}, status=403)
+    request.user_id = user.id if user else None
+    return request.user_id, None
+
+
+def _car_list_queryset(params):
+    qs = Car.objects.filter(available=True).select_related("dealer").prefetch_related("images")
+    q = (params.get("q") or "").strip()
+    make = (params.get("make") or "").strip()
+    dealer_name = (params.get("dealer") or "").strip()
+    t = (params.get("type") or "").strip()
+    min_price_raw = (params.get("min_price") or "").strip()
+    max_price_raw = (params.get("max_price") or "").strip()
 
     if q:
         qs = qs.filter(Q(title__icontains=q) | Q(make__icontains=q))
@@ -143,36 +179,51 @@ def car_list(request):
     except (InvalidOperation, ValueError):
         pass
 
-    sort = (request.GET.get("sort") or "newest").strip()
+    sort = (params.get("sort") or "newest").strip()
     if sort == "price_low":
         qs = qs.order_by("price_per_day", "-created_at")
     elif sort == "price_high":
         qs = qs.order_by("-price_per_day", "-created_at")
     else:
         qs = qs.order_by("-created_at")
+    return qs
 
+
+@require_GET
+async def car_list(request):
+    _, error = _token_user_id(request)
+    if error:
+        return error
+    qs = _car_list_queryset(request.GET)
     page = int(request.GET.get("page") or 1)
     page_size = 12
-    total = qs.count()
+    total = await qs.acount()
     start = (page - 1) * page_size
     end = start + page_size
-    items = qs[start:end]
+    items = [car async for car in qs[start:end]]
     data = CarListSerializer(items, many=True, context={"request": request}).data
     return JsonResponse({"results": data, "count": total, "page": page, "pages": (total // page_size) + (1 if total % page_size else 0)})
 
 
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def car_detail(request, pk):
-    car = get_object_or_404(Car.objects.select_related("dealer"), pk=pk)
+@require_GET
+async def car_detail(request, pk):
+    _, error = _token_user_id(request)
+    if error:
+        return error
+    try:
+        car = await Car.objects.select_related("dealer").prefetch_related("images").aget(pk=pk)
+    except Car.DoesNotExist:
+        return JsonResponse({"detail": "No Car matches the given query."}, status=404)
     today = timezone.localdate()
     month_start, _ = _month_bounds(today)
+    bookings = await _aactive_bookings_by_car([car], month_start)
     _attach_car_schedule(
         car,
         month_start=month_start,
         months=12,
         today=today,
         upcoming_limit=5,
+        bookings=bookings[car.pk],
     )
     data = CarDetailSerializer(car, context={"request": request}).data
     return JsonResponse(data, safe=False)
@@ -185,6 +236,7 @@ def _current_user_id(request):
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@idempotent
 def create_booking(request):
     uid = _current_user_id(request)
     if not uid:
@@ -200,10 +252,11 @@ def create_booking(request):
     return JsonResponse(BookingSerializer(booking).data, status=201)
 
 
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def my_bookings(request):
-    uid = _current_user_id(request)
+@require_GET
+async def my_bookings(request):
+    uid, error = _token_user_id(request)
+    if error:
+        return error
     if not uid:
         return JsonResponse({"detail": "Unauthorized"}, status=401)
     bookings = (
@@ -211,27 +264,30 @@ def my_bookings(request):
         .select_related("car", "car__dealer")
         .order_by("-start_date", "-created_at")
     )
-    data = BookingSerializer(bookings, many=True).data
+    data = BookingSerializer([b async for b in bookings], many=True).data
     return JsonResponse({"results": data})
 
 
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def favorites_list(request):
-    uid = _current_user_id(request)
+@require_GET
+async def favorites_list(request):
+    uid, error = _token_user_id(request)
+    if error:
+        return error
     if not uid:
         return JsonResponse({"detail": "Unauthorized"}, status=401)
     favorites = (
-        Favorite.objects.filter(user_id=uid)
+        Favorite.objects.filter(user_id=uid, car__deleted_at__isnull=True)
         .select_related("car", "car__dealer")
+        .prefetch_related("car__images")
         .order_by("-created_at")
     )
-    data = FavoriteListItemSerializer(favorites, many=True).data
+    data = FavoriteListItemSerializer([f async for f in favorites], many=True).data
     return JsonResponse({"results": data})
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@idempotent
 def toggle_favorite(request):
     uid = _current_user_id(request)
     if not uid:
@@ -300,6 +356,7 @@ def dealer_dashboard(request):
         Booking.objects
         .filter(
             car__dealer=dealer,
+            car__deleted_at__isnull=True,
             start_date__gte=month_start,
             start_date__lt=month_end,
             status__in=ACTIVE_BOOKING_STATUSES,
@@ -309,6 +366,7 @@ def dealer_dashboard(request):
         Booking.objects
         .filter(
             car__dealer=dealer,
+            car__deleted_at__isnull=True,
             status=Booking.Status.PENDING,
         )
         .select_related("car")
@@ -319,6 +377,7 @@ def dealer_dashboard(request):
         revenue=Sum("total_price", filter=Q(status=Booking.Status.CONFIRMED)),
         pending=Count("id", filter=Q(status=Booking.Status.PENDING)),
     )
+    schedules = _active_bookings_by_car(cars, min(month_start, today))
     for car in cars:
         _attach_car_schedule(
             car,
@@ -326,6 +385,7 @@ def dealer_dashboard(request):
             months=3,
             today=today,
             upcoming_limit=4,
+            bookings=schedules[car.pk],
         )
     data = DealerDashboardSerializer(
         {
@@ -343,6 +403,7 @@ def dealer_dashboard(request):
 @api_view(["GET", "POST"])
 @permission_classes([AllowAny])
 @parser_classes([MultiPartParser, FormParser])
+@idempotent
 def dealer_cars(request):
     uid = _current_user_id(request)
     if not uid:
@@ -355,10 +416,19 @@ def dealer_cars(request):
     serializer = DealerCarSerializer(data=request.data, context={"request": request})
     if not serializer.is_valid():
         return JsonResponse(serializer.errors, status=400)
-    car = serializer.save(dealer=dealer)
-    uploaded_image = request.FILES.get("image")
-    if uploaded_image:
-        CarImage.objects.create(car=car, image=uploaded_image, is_primary=True)
+    upload_id = request.data.get("upload_id")
+    with transaction.atomic():
+        car = serializer.save(dealer=dealer)
+        uploaded_image = request.FILES.get("image")
+        if uploaded_image:
+            image = CarImage.objects.create(car=car, image=uploaded_image, is_primary=True)
+            schedule_variants(image)
+        elif upload_id:
+            try:
+                uploads.attach_to_car(upload_id, dealer, car, is_primary=True)
+            except (uploads.UploadError, ValueError, ValidationError) as exc:
+                transaction.set_rollback(True)
+                return JsonResponse({"detail": getattr(exc, "detail", "Invalid upload.")}, status=400)
     return JsonResponse(DealerCarSerializer(car, context={"request": request}).data, status=201)
 
 
@@ -372,19 +442,107 @@ def dealer_car_update(request, pk):
     dealer = get_object_or_404(Dealer, user_id=uid, active=True)
     car = get_object_or_404(Car, pk=pk, dealer=dealer)
     if request.method == "DELETE":
-        car.delete()
-        return JsonResponse({"detail": "deleted"})
+        job = soft_delete_car(car)
+        return JsonResponse({"detail": "deleted", "purge_job": job.pk})
     serializer = DealerCarUpdateSerializer(car, data=request.data, partial=True, context={"request": request})
     if not serializer.is_valid():
         return JsonResponse(serializer.errors, status=400)
-    car = serializer.save()
-    uploaded_image = request.FILES.get("image")
-    if uploaded_image:
-        is_primary = not car.images.filter(is_primary=True).exists()
-        CarImage.objects.create(car=car, image=uploaded_image, is_primary=is_primary)
+    upload_id = request.data.get("upload_id")
+    with transaction.atomic():
+        car = serializer.save()
+        uploaded_image = request.FILES.get("image")
+        if uploaded_image:
+            is_primary = not car.images.filter(is_primary=True).exists()
+            image = CarImage.objects.create(car=car, image=uploaded_image, is_primary=is_primary)
+            schedule_variants(image)
+        elif upload_id:
+            try:
+                uploads.attach_to_car(upload_id, dealer, car)
+            except (uploads.UploadError, ValueError, ValidationError) as exc:
+                transaction.set_rollback(True)
+                return JsonResponse({"detail": getattr(exc, "detail", "Invalid upload.")}, status=400)
     return JsonResponse(DealerCarSerializer(car, context={"request": request}).data)
 
 
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def dealer_job_status(request, job_id):
+    """Progress of a background job started on the dealer's behalf (e.g. a car purge)."""
+    uid = _current_user_id(request)
+    if not uid:
+        return JsonResponse({"detail": "Unauthorized"}, status=401)
+    dealer = get_object_or_404(Dealer, user_id=uid, active=True)
+    job = get_object_or_404(Job, pk=job_id, payload__dealer_id=dealer.pk)
+    return JsonResponse(
+        {
+            "id": job.pk,
+            "name": job.name,
+            "status": job.status,
+            "attempts": job.attempts,
+            "progress": job.progress,
+            "created_at": job.created_at.isoformat(),
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+    )
+
+
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def dealer_upload_create(request):
+    uid = _current_user_id(request)
+    if not uid:
+        return JsonResponse({"detail": "Unauthorized"}, status=401)
+    dealer = get_object_or_404(Dealer, user_id=uid, active=True)
+    try:
+        total_size = int(request.data.get("size") or 0)
+    except (TypeError, ValueError):
+        total_size = 0
+    try:
+        session = uploads.create_session(
+            dealer,
+            filename=request.data.get("filename") or "",
+            total_size=total_size,
+            content_type=request.data.get("content_type") or "",
+        )
+    except uploads.UploadError as exc:
+        return JsonResponse({"detail": exc.detail}, status=exc.status)
+    data = uploads.session_status(session)
+    data["token"] = uploads.sign_session(session)
+    return JsonResponse(data, status=201)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "PUT"])
+def upload_chunk(request, session_id):
+    """Browser-facing chunk endpoint; authorised by the signed token, not the JWT."""
+    if not uploads.verify_token(session_id, request.GET.get("token")):
+        return JsonResponse({"detail": "Invalid or expired upload token."}, status=403)
+    if request.method == "GET":
+        session = get_object_or_404(UploadSession, pk=session_id)
+        return JsonResponse(uploads.session_status(session))
+    # Chunks are larger than DATA_UPLOAD_MAX_MEMORY_SIZE, which request.body enforces;
+    # this endpoint reads the stream itself with its own limit.
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = -1
+    if not 0 <= length <= settings.UPLOAD_MAX_CHUNK_BYTES:
+        return JsonResponse({"detail": "Chunk too large."}, status=413)
+    try:
+        start, _end, total = uploads.parse_content_range(request.headers.get("Content-Range"))
+    except uploads.UploadError as exc:
+        return JsonResponse({"detail": exc.detail}, status=exc.status)
+    data = request.read(length)
+    with transaction.atomic():
+        session = get_object_or_404(UploadSession.objects.select_for_update(), pk=session_id)
+        try:
+            uploads.append_chunk(session, start, total, data)
+        except uploads.UploadError as exc:
+            # Committed: a rewound session must stay rewound
+            return JsonResponse({"detail": exc.detail, "received": session.received}, status=exc.status)
+    return JsonResponse(uploads.session_status(session))
+
+
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def dealer_car_price(request, pk):
@@ -435,7 +593,7 @@ def dealer_booking_status(request, booking_id):
     if not uid:
         return JsonResponse({"detail": "Unauthorized"}, status=401)
     dealer = get_object_or_404(Dealer, user_id=uid, active=True)
-    booking = get_object_or_404(Booking, pk=booking_id, car__dealer=dealer)
+    booking = get_object_or_404(Booking, pk=booking_id, car__dealer=dealer, car__deleted_at__isnull=True)
     action = (request.data.get("action") or "").strip().lower()
     if action == "confirm" and booking.status != Booking.Status.CONFIRMED:
         booking.status = Booking.Status.CONFIRMED
@@ -0,0 +1,186 @@
+"""
+Admission control: shed load the service cannot serve in time.
+
+Requests to the routes in ``ADMISSION_ROUTES`` belong to a class from
+``ADMISSION_CLASSES``. Each class has a concurrency limit per process that
+adapts to the latency of its own responses (AIMD): every response faster
+than the class's ``target_ms`` raises the limit by ``1 / limit`` (about one
+per round of requests), and a slower one cuts it by ``ADMISSION_BACKOFF``,
+at most once per latency window, down to the class's ``min``. A request is
+answered 503 with ``Retry-After`` at once, without queueing, when
+
+* its deadline has passed. The gateway sends the time it will wait for the
+  response (``X-Request-Budget-Ms``), counted here from when this middleware
+  first sees the request: relative, so clock skew between hosts cannot shed
+  everything, but time spent in gunicorn's backlog is not counted. Work past
+  the deadline would be answered to no one;
+* its class is at its limit;
+* a higher-priority class (earlier in ``ADMISSION_CLASSES``) is at its
+  limit: booking creation keeps the database to itself before anonymous
+  browsing does.
+
+Signed-in requests (a validly signed ``Bearer`` token, as the rate limiter
+checks it) to a route whose class has an entry in ``ADMISSION_SIGNED_IN`` use
+that class instead: browsing with a token is not anonymous browsing. Limits,
+in-flight requests and rejections are in ``/metrics``.
+
+The limits are per process and count requests in flight, so they need
+concurrent requests: gunicorn runs ``gthread`` workers (``gunicorn.conf.py``)
+or the service runs under ASGI. With one sync thread per worker only the
+deadline check can trigger.
+"""
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import metrics, ratelimit
+
+BUDGET_HEADER = "HTTP_X_REQUEST_BUDGET_MS"
+RECEIVED_KEY = "rentals_service.received_at"  # in request.META
+
+metrics.registry.describe("admission_rejected_total", "counter", "Requests shed with 503, by class and reason.")
+metrics.registry.describe("admission_limit", "gauge", "Adaptive concurrency limit by class (summed over workers).")
+metrics.registry.describe("admission_in_flight", "gauge", "Admitted requests in flight by class.")
+
+_limiters = {}  # class -> Limiter, in priority order
+
+
+class Limiter:
+    """An AIMD concurrency limit for one class of requests."""
+
+    def __init__(self, name, *, target_ms, min_limit=1, initial=None, max_limit=None):
+        self.name = name
+        self.target = target_ms / 1000
+        self.min_limit = min_limit
+        self.max_limit = max_limit or settings.ADMISSION_MAX_LIMIT
+        self.limit = float(initial or settings.ADMISSION_INITIAL_LIMIT)
+        self.in_flight = 0
+        self._decreased_at = 0.0
+        self._lock = threading.Lock()
+
+    def saturated(self):
+        return self.in_flight >= int(self.limit)
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, seconds):
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            if seconds > self.target:
+                # Responses that were slow together are one signal, not many
+                if now - self._decreased_at >= seconds:
+                    self.limit = max(self.min_limit, self.limit * settings.ADMISSION_BACKOFF)
+                    self._decreased_at = now
+            elif self.in_flight + 1 >= self.limit / 2:
+                # Only grow a limit that is actually being used
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+def deadline(request):
+    """Epoch seconds by which the caller stops waiting, or None without a budget."""
+    budget = request.META.get(BUDGET_HEADER)
+    if not budget:
+        return None
+    try:
+        budget = float(budget) / 1000
+    except ValueError:
+        return None
+    return request.META.get(RECEIVED_KEY, time.time()) + budget
+
+
+def _gauges():
+    for name, limiter in _limiters.items():
+        labels = (("class", name),)
+        yield "gauge", "admission_limit", labels, int(limiter.limit)
+        yield "gauge", "admission_in_flight", labels, limiter.in_flight
+
+
+metrics.registry.add_collector(_gauges)
+
+
+def _reject(route_class, reason, detail):
+    metrics.registry.inc("admission_rejected_total", (("class", route_class), ("reason", reason)))
+    response = JsonResponse({"detail": detail}, status=503)
+    response["Retry-After"] = "1"
+    return response
+
+
+class AdmissionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        global _limiters
+        self.get_response = get_response
+        self.enabled = settings.ADMISSION_ENABLED
+        _limiters = {
+            name: Limiter(name, target_ms=conf["target_ms"], min_limit=conf.get("min", 1))
+            for name, conf in settings.ADMISSION_CLASSES.items()
+        }
+        self.limiters = _limiters
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Keep the check on the event loop instead of a thread hop
+            self.process_view = self._aprocess_view
+
+    def _classify(self, request):
+        route_class = settings.ADMISSION_ROUTES.get(request.resolver_match.url_name)
+        # Only a token that verifies moves a request up; any client can send the header
+        if route_class in settings.ADMISSION_SIGNED_IN and ratelimit.client_key(request)[0] == "user":
+            return settings.ADMISSION_SIGNED_IN[route_class]
+        return route_class
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.enabled:
+            return None
+        route_class = self._classify(request)
+        if route_class is None:
+            return None
+        due = deadline(request)
+        if due is not None and time.time() >= due:
+            return _reject(route_class, "deadline", "Deadline exceeded.")
+        for name, limiter in self.limiters.items():
+            if name == route_class:
+                break
+            if limiter.saturated():
+                return _reject(route_class, "priority", "Overloaded, retry shortly.")
+        limiter = self.limiters[route_class]
+        if not limiter.try_acquire():
+            return _reject(route_class, "limit", "Overloaded, retry shortly.")
+        request._admission = (limiter, time.perf_counter())
+        return None
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return AdmissionMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    def _release(self, request):
+        admitted = request.__dict__.pop("_admission", None)
+        if admitted:
+            limiter, start = admitted
+            limiter.release(time.perf_counter() - start)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self._acall(request)
+        request.META.setdefault(RECEIVED_KEY, time.time())
+        try:
+            return self.get_response(request)
+        finally:
+            self._release(request)
+
+    async def _acall(self, request):
+        request.META.setdefault(RECEIVED_KEY, time.time())
+        try:
+            return await self.get_response(request)
+        finally:
+            self._release(request)
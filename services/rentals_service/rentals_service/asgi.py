@@ -5,3 +5,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rentals_service.settings")
 
 application = get_asgi_application()
+
+# Imports, templates and validators before the first request; see rentals_service.warmup
+from rentals_service import warmup  # noqa: E402
+
+warmup.warm_process()
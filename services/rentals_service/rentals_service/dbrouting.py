@@ -0,0 +1,148 @@
+"""
+Read-replica routing.
+
+Views in ``REPLICA_READ_VIEWS`` read from one of ``DATABASE_REPLICAS`` on GET;
+everything else (writes, other views, jobs, management commands) uses the
+primary. After a successful write (any non-GET request by an authenticated
+user) that user's reads stay on the primary for ``REPLICA_PIN_SECONDS`` so
+they see their own booking, favorite or car edit despite replication lag.
+The pins live in the ``REPLICA_PIN_CACHE`` cache, which must be shared by all
+workers (and replicas of the service) for pinning to hold across them.
+
+A replica that fails to connect is skipped for ``REPLICA_RETRY_SECONDS``;
+with none left, reads go to the primary.
+"""
+import contextvars
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.registry.describe("db_read_routes_total", "counter", "Replica-eligible requests by database served from.")
+metrics.registry.describe("db_replica_unavailable_total", "counter", "Replica connection failures by database.")
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_route = contextvars.ContextVar("db_route", default=None)
+_down_until = {}  # replica alias -> monotonic time it may be tried again
+
+
+class _Route:
+    __slots__ = ("request", "alias")
+
+    def __init__(self, request):
+        self.request = request
+        self.alias = None
+
+
+def _pin_key(user_id):
+    return f"dbrouting:pin:{user_id}"
+
+
+def pin(user_id):
+    """Keep ``user_id``'s reads on the primary for ``REPLICA_PIN_SECONDS``."""
+    caches[settings.REPLICA_PIN_CACHE].set(_pin_key(user_id), 1, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return caches[settings.REPLICA_PIN_CACHE].get(_pin_key(user_id)) is not None
+
+
+def choose_replica():
+    """A healthy replica alias, or ``"default"`` when none is available."""
+    now = time.monotonic()
+    candidates = [alias for alias in settings.DATABASE_REPLICAS if _down_until.get(alias, 0) <= now]
+    random.shuffle(candidates)
+    for alias in candidates:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as exc:
+            _down_until[alias] = now + settings.REPLICA_RETRY_SECONDS
+            metrics.registry.inc("db_replica_unavailable_total", (("db", alias),))
+            logger.warning("Replica %s unavailable, skipping for %ss: %s", alias, settings.REPLICA_RETRY_SECONDS, exc)
+            continue
+        return alias
+    return "default"
+
+
+def _read_alias():
+    route = _route.get()
+    if route is None:
+        return None
+    if route.alias is None:
+        match = getattr(route.request, "resolver_match", None)
+        if match is None:
+            return None
+        if match.view_name not in settings.REPLICA_READ_VIEWS:
+            route.alias = "default"
+            return route.alias
+        # Decided on the first read, after the view has authenticated the user.
+        user_id = getattr(route.request, "user_id", None)
+        route.alias = "default" if user_id and is_pinned(user_id) else choose_replica()
+        metrics.registry.inc("db_read_routes_total", (("db", route.alias),))
+    return route.alias
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _route_for(self, request):
+        if settings.DATABASE_REPLICAS and request.method in ("GET", "HEAD"):
+            return _Route(request)
+        return None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self._acall(request)
+        token = _route.set(self._route_for(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _route.reset(token)
+        self._pin_writer(request, response)
+        return response
+
+    async def _acall(self, request):
+        token = _route.set(self._route_for(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _route.reset(token)
+        self._pin_writer(request, response)
+        return response
+
+    def _pin_writer(self, request, response):
+        if settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS and response.status_code < 400:
+            user_id = getattr(request, "user_id", None)
+            if user_id:
+                pin(user_id)
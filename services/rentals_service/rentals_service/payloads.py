@@ -0,0 +1,187 @@
+"""
+Negotiated response encodings for service-to-service calls.
+
+The gateway's ``api_client`` asks for compact payloads; browsers and other
+clients keep getting plain JSON.
+
+* Binary encoding: views build responses with this module's ``JsonResponse``.
+  When the request's ``Accept`` prefers ``application/msgpack`` (and
+  ``msgpack`` is installed) the data is encoded as MessagePack instead of
+  JSON, with the same values: decimals stay strings, dates ISO strings.
+  ``MessagePackRenderer`` does the same for DRF responses (errors raised by
+  ``@api_view`` checks) and lets DRF's own negotiation accept the type.
+* Compression: ``PayloadMiddleware`` compresses text, JSON and MessagePack
+  bodies of at least ``PAYLOAD_COMPRESS_MIN_BYTES`` with zstd (Python 3.14's
+  ``compression.zstd`` or ``backports.zstd``, which is also what urllib3
+  decodes with) or gzip, whichever ``Accept-Encoding`` allows, zstd first.
+
+Both are optional dependencies: without them the service answers JSON and
+gzip.
+"""
+import contextvars
+import gzip
+import sys
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django import http
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import BaseRenderer
+
+from . import metrics
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON only
+    msgpack = None
+
+try:
+    if sys.version_info >= (3, 14):
+        from compression import zstd
+    else:
+        from backports import zstd
+except ImportError:  # optional: gzip only
+    zstd = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COMPRESSIBLE_TYPES = ("text/", JSON, MSGPACK, "application/javascript", "application/xml")
+
+metrics.registry.describe("responses_compressed_total", "counter", "Responses compressed, by content encoding.")
+metrics.registry.describe("response_bytes_saved_total", "counter", "Body bytes saved by compression, by content encoding.")
+
+_format = contextvars.ContextVar("payload_format", default=JSON)
+
+
+def _accepted(header):
+    """``{media type or coding: q}`` from an ``Accept`` / ``Accept-Encoding`` header."""
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+def negotiate_format(accept):
+    if msgpack is None or MSGPACK not in accept:
+        return JSON
+    accepted = _accepted(accept)
+    q = accepted.get(MSGPACK, 0)
+    return MSGPACK if q > 0 and q >= accepted.get(JSON, 0) else JSON
+
+
+def negotiate_encoding(accept_encoding):
+    accepted = _accepted(accept_encoding)
+    if zstd is not None and accepted.get("zstd", 0) > 0:
+        return "zstd"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def _msgpack_default(value):
+    return DjangoJSONEncoder().default(value)
+
+
+class JsonResponse(http.JsonResponse):
+    """``django.http.JsonResponse``, encoded as MessagePack when the request negotiated it."""
+
+    negotiated = True
+
+    def __init__(self, data, encoder=DjangoJSONEncoder, safe=True, json_dumps_params=None, **kwargs):
+        if _format.get() != MSGPACK:
+            super().__init__(data, encoder, safe, json_dumps_params, **kwargs)
+            return
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault("content_type", MSGPACK)
+        http.HttpResponse.__init__(self, content=msgpack.packb(data, default=_msgpack_default), **kwargs)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = MSGPACK
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_msgpack_default)
+
+
+def _compress(content, encoding):
+    if encoding == "gzip":
+        return gzip.compress(content, compresslevel=getattr(settings, "PAYLOAD_GZIP_LEVEL", 5), mtime=0)
+    return zstd.compress(content, level=getattr(settings, "PAYLOAD_ZSTD_LEVEL", 3))
+
+
+class PayloadMiddleware:
+    """Negotiates the body format for ``JsonResponse`` and compresses large bodies."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self._acall(request)
+        token = _format.set(negotiate_format(request.headers.get("Accept", "")))
+        try:
+            response = self.get_response(request)
+        finally:
+            _format.reset(token)
+        return self.finish(request, response)
+
+    async def _acall(self, request):
+        token = _format.set(negotiate_format(request.headers.get("Accept", "")))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _format.reset(token)
+        return self.finish(request, response)
+
+    def finish(self, request, response):
+        if getattr(response, "negotiated", False):
+            patch_vary_headers(response, ("Accept",))
+        return self.compress(request, response)
+
+    def compress(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPES):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < getattr(settings, "PAYLOAD_COMPRESS_MIN_BYTES", 1024):
+            return response
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+        compressed = _compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        saved = len(response.content) - len(compressed)
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        if response.has_header("ETag"):
+            response["ETag"] = "W/" + response["ETag"].removeprefix("W/")
+        labels = (("encoding", encoding),)
+        metrics.registry.inc("responses_compressed_total", labels)
+        metrics.registry.inc("response_bytes_saved_total", labels, saved)
+        return response
@@ -0,0 +1,206 @@
+"""
+SQL instrumentation: slow-statement log, N+1 detector and query budgets.
+
+``QueryInspectorMiddleware`` watches every statement a request runs:
+
+* statements slower than ``DB_SLOW_QUERY_MS`` are logged with the view and
+  the first project frame that issued them (``db_slow_queries_total``);
+* a statement *shape* (the SQL with literals and ``IN (...)`` lists folded)
+  run more than ``DB_N_PLUS_ONE_THRESHOLD`` times in one request is an N+1,
+  reported with the call site of the repeats (``db_n_plus_one_total``);
+* views listed in ``DB_QUERY_BUDGETS`` must stay within that many statements
+  (``db_query_budget_exceeded_total``).
+
+With ``DB_N_PLUS_ONE_MODE = "raise"`` (the default under DEBUG and in tests)
+N+1s and budget overruns raise ``QueryProblem`` so they fail loudly; ``"warn"``
+(the production default) only logs and counts them; ``"off"`` skips the
+checks. Tests can also wrap any block in ``query_budget(n)``. Statements
+inside ``repeats_allowed()`` (a deliberate polling loop) are counted but
+never reported as an N+1.
+"""
+import contextvars
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.registry.describe("db_slow_queries_total", "counter", "Statements slower than DB_SLOW_QUERY_MS by view.")
+metrics.registry.describe("db_n_plus_one_total", "counter", "Requests with a repeated statement shape by view.")
+metrics.registry.describe(
+    "db_query_budget_exceeded_total", "counter", "Requests over their DB_QUERY_BUDGETS entry by view."
+)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:[^()]*)\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+_COLUMNS = re.compile(r"^SELECT .*? FROM ", re.IGNORECASE)
+_INSTRUMENTATION = os.path.dirname(os.path.abspath(__file__))
+
+_repeats_allowed = contextvars.ContextVar("query_repeats_allowed", default=False)
+
+
+class QueryProblem(AssertionError):
+    """An N+1 or a blown query budget, raised in strict mode."""
+
+
+def shape(sql):
+    """``sql`` with literals and IN lists folded, so repeats compare equal."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def _brief(key):
+    return _COLUMNS.sub("SELECT ... FROM ", key)[:300]
+
+
+def call_site():
+    """``file:line (function)`` of the innermost project frame outside the middleware."""
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base) and "site-packages" not in filename
+                and os.path.dirname(filename) != _INSTRUMENTATION):
+            return f"{filename[len(base):].lstrip('/')}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "?"
+
+
+def _mode():
+    return getattr(settings, "DB_N_PLUS_ONE_MODE", "warn")
+
+
+class QueryInspector:
+    """``execute_wrapper`` that counts statements per shape for one request."""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.count = 0
+        self.shapes = {}  # shape -> count
+        self.sites = {}  # shape -> call site, for shapes past the threshold
+        self.threshold = getattr(settings, "DB_N_PLUS_ONE_THRESHOLD", 8)
+        self.slow_seconds = getattr(settings, "DB_SLOW_QUERY_MS", 100) / 1000
+
+    @property
+    def view(self):
+        match = getattr(self.request, "resolver_match", None)
+        return (match.view_name if match else "") or "unmatched"
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            key = None if _repeats_allowed.get() else shape(sql)
+            if key is not None:
+                seen = self.shapes.get(key, 0) + 1
+                self.shapes[key] = seen
+                if seen == self.threshold + 1:
+                    self.sites[key] = call_site()
+            if duration >= self.slow_seconds:
+                view = self.view
+                metrics.registry.inc("db_slow_queries_total", (("view", view),))
+                logger.warning(
+                    "Slow query on %s (%.0f ms, db=%s) at %s: %s",
+                    view, duration * 1000, context["connection"].alias, call_site(), sql[:500],
+                )
+
+    def repeated(self):
+        """``[(shape, count, site)]`` for shapes run more than the threshold, worst first."""
+        rows = [(key, n, self.sites.get(key, "?")) for key, n in self.shapes.items() if n > self.threshold]
+        return sorted(rows, key=lambda row: row[1], reverse=True)
+
+    def problems(self):
+        view = self.view
+        found = []
+        for key, n, site in self.repeated():
+            found.append(("n_plus_one", f"N+1 on {view}: {n}x at {site}: {_brief(key)}"))
+        budget = getattr(settings, "DB_QUERY_BUDGETS", {}).get(view)
+        if budget is not None and self.count > budget:
+            found.append(("budget", f"{view} ran {self.count} queries (budget {budget})"))
+        return found
+
+
+class QueryInspectorMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self._acall(request)
+        if _mode() == "off":
+            return self.get_response(request)
+        inspector = QueryInspector(request)
+        with metrics.watch_queries(inspector):
+            response = self.get_response(request)
+        return self._check(request, inspector, response)
+
+    async def _acall(self, request):
+        if _mode() == "off":
+            return await self.get_response(request)
+        inspector = QueryInspector(request)
+        async with metrics.awatch_queries(inspector):
+            response = await self.get_response(request)
+        return self._check(request, inspector, response)
+
+    def _check(self, request, inspector, response):
+        problems = inspector.problems()
+        if problems:
+            view = inspector.view
+            for kind, message in problems:
+                name = "db_n_plus_one_total" if kind == "n_plus_one" else "db_query_budget_exceeded_total"
+                metrics.registry.inc(name, (("view", view),))
+                logger.warning("%s request_id=%s", message, getattr(request, "request_id", None))
+            if _mode() == "raise":
+                raise QueryProblem("; ".join(message for _, message in problems))
+        return response
+
+
+@contextmanager
+def query_budget(max_queries, *, allow_repeats=False):
+    """Fail if the block runs more than ``max_queries`` statements or any N+1.
+
+    For tests::
+
+        with query_budget(4):
+            self.client.get("/api/cars/")
+    """
+    inspector = QueryInspector()
+    with metrics.watch_queries(inspector):
+        yield inspector
+    if inspector.count > max_queries:
+        raise QueryProblem(f"{inspector.count} queries, budget {max_queries}")
+    repeated = inspector.repeated()
+    if repeated and not allow_repeats:
+        key, n, site = repeated[0]
+        raise QueryProblem(f"N+1: {n}x at {site}: {_brief(key)}")
+
+
+@contextmanager
+def repeats_allowed():
+    """Statements run in the block are not checked for N+1 (they still count towards budgets)."""
+    token = _repeats_allowed.set(True)
+    try:
+        yield
+    finally:
+        _repeats_allowed.reset(token)
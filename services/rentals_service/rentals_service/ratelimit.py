@@ -0,0 +1,205 @@
+"""
+Per-client rate limiting by route class (token buckets).
+
+``RATE_LIMIT_ROUTES`` maps URL names to a route class, optionally for one
+method only (``"POST create_booking"`` is tried before ``"create_booking"``);
+unlisted routes are not limited. ``RATE_LIMITS`` gives each class a rate
+(requests per second) and a burst. Every client has one bucket per class:
+
+* a signed-in user is keyed by user id: the gateway's ``request.user``, or
+  the verified ``Bearer`` token's ``user_id`` in the services;
+* anyone else by IP: ``REMOTE_ADDR``, or the ``X-Forwarded-For`` entry
+  ``RATE_LIMIT_NUM_PROXIES`` from the right when behind that many proxies.
+  The gateway forwards its own client's IP upstream (``propagation_headers``).
+
+A request over the limit gets a 429 with ``Retry-After`` and is counted in
+``rate_limited_total``. The buckets are kept in the GCRA form: one
+"theoretical arrival time" per key, so a check is a dict lookup and some
+arithmetic. ``RATE_LIMIT_STORE`` picks where they live:
+
+* ``LocalStore`` (default): this process's memory; every gunicorn worker
+  limits on its own, so a client gets up to ``workers`` times the rate;
+* ``CacheStore``: the ``RATE_LIMIT_CACHE`` Django cache (Redis, Memcached),
+  shared by all workers and replicas. Its read-then-write is not atomic, so
+  concurrent requests from one client may overshoot slightly, and under ASGI
+  its round trip blocks the event loop (the check runs there, not in a thread).
+"""
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+FORWARDED_FOR_HEADER = "X-Forwarded-For"
+TOKEN_CACHE_SIZE = 4096
+EPSILON = 1e-9  # float rounding in the arrival-time arithmetic
+
+metrics.registry.describe("rate_limited_total", "counter", "Requests rejected with 429, by route class and client kind.")
+
+_client_ip = contextvars.ContextVar("client_ip", default=None)
+_token_users = {}
+
+
+class LocalStore:
+    """Buckets in this process's memory, at most ``RATE_LIMIT_LOCAL_MAX_KEYS`` of them.
+
+    Past the limit the least recently used tenth is dropped in one go, so
+    eviction costs O(1) per request on average even while keys are sprayed.
+    """
+
+    def __init__(self):
+        self._tat = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key, interval, burst):
+        """0 if a request is allowed now, else the seconds until one is."""
+        now = time.monotonic()
+        with self._lock:
+            tat = max(self._tat.get(key, now), now) + interval
+            wait = tat - now - burst * interval
+            if wait > EPSILON:
+                return wait
+            self._tat[key] = tat
+            self._tat.move_to_end(key)
+            max_keys = getattr(settings, "RATE_LIMIT_LOCAL_MAX_KEYS", 100_000)
+            if len(self._tat) > max_keys:
+                # The oldest buckets have mostly refilled by now: forgetting them is (nearly) free
+                for _ in range(len(self._tat) - max_keys * 9 // 10):
+                    self._tat.popitem(last=False)
+        return 0.0
+
+
+class CacheStore:
+    """Buckets in a Django cache, shared by every process that uses it."""
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, "RATE_LIMIT_CACHE", "default")]
+
+    def acquire(self, key, interval, burst):
+        now = time.time()
+        key = f"ratelimit:{key}"
+        tat = max(self.cache.get(key) or now, now) + interval
+        wait = tat - now - burst * interval
+        if wait > EPSILON:
+            return wait
+        self.cache.set(key, tat, timeout=math.ceil(burst * interval) + 1)
+        return 0.0
+
+
+def client_ip(request):
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    num_proxies = getattr(settings, "RATE_LIMIT_NUM_PROXIES", 0)
+    if forwarded and num_proxies:
+        addrs = forwarded.split(",")
+        return addrs[-min(num_proxies, len(addrs))].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _jwt_algorithm():
+    # The rentals service calls it ACCOUNTS_JWT_ALGORITHM, the gateway ACCOUNTS_JWT_ALG
+    return getattr(settings, "ACCOUNTS_JWT_ALGORITHM", None) or getattr(settings, "ACCOUNTS_JWT_ALG", "HS256")
+
+
+def _token_user_id(authorization):
+    """The ``user_id`` of a validly signed ``Bearer`` token (cached), else None."""
+    if not authorization.lower().startswith("bearer "):
+        return None
+    token = authorization[7:].strip()
+    if token in _token_users:
+        return _token_users[token]
+    secret = getattr(settings, "ACCOUNTS_JWT_SECRET", None)
+    if not secret:
+        return None
+    try:
+        # Expiry is the view's business; only who signed it matters for the key
+        payload = jwt.decode(token, secret, algorithms=[_jwt_algorithm()], options={"verify_exp": False})
+        user_id = payload.get("user_id") or payload.get("sub")
+    except jwt.InvalidTokenError:
+        user_id = None
+    if len(_token_users) >= TOKEN_CACHE_SIZE:
+        _token_users.clear()
+    _token_users[token] = user_id
+    return user_id
+
+
+def client_key(request):
+    """``("user", id)`` or ``("ip", address)``."""
+    user = getattr(request, "user", None)
+    if getattr(user, "is_authenticated", False) and getattr(user, "id", None):
+        return "user", user.id
+    authorization = request.META.get("HTTP_AUTHORIZATION")
+    user_id = _token_user_id(authorization) if authorization else None
+    if user_id:
+        return "user", user_id
+    return "ip", _client_ip.get() or client_ip(request)
+
+
+def propagation_headers():
+    """Headers to add to an outgoing upstream request (empty outside a request)."""
+    ip = _client_ip.get()
+    return {FORWARDED_FOR_HEADER: ip} if ip else {}
+
+
+class RateLimitMiddleware:
+    """Answers 429 when the client's bucket for the route's class is empty."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "RATE_LIMIT_ENABLED", True)
+        self.routes = getattr(settings, "RATE_LIMIT_ROUTES", {})
+        # class -> (seconds per request, burst)
+        self.limits = {name: (1 / rate, burst) for name, (rate, burst) in getattr(settings, "RATE_LIMITS", {}).items()}
+        self.store = import_string(getattr(settings, "RATE_LIMIT_STORE", f"{__name__}.LocalStore"))()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Keep the check on the event loop instead of a thread hop
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self._acall(request)
+        token = _client_ip.set(client_ip(request))
+        try:
+            return self.get_response(request)
+        finally:
+            _client_ip.reset(token)
+
+    async def _acall(self, request):
+        token = _client_ip.set(client_ip(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            _client_ip.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.enabled:
+            return None
+        name = request.resolver_match.url_name
+        route_class = self.routes.get(f"{request.method} {name}") or self.routes.get(name)
+        if route_class is None:
+            return None
+        interval, burst = self.limits[route_class]
+        kind, ident = client_key(request)
+        wait = self.store.acquire(f"{route_class}:{kind}:{ident}", interval, burst)
+        if not wait:
+            return None
+        metrics.registry.inc("rate_limited_total", (("route_class", route_class), ("client", kind)))
+        response = JsonResponse({"detail": "Too many requests."}, status=429)
+        response["Retry-After"] = str(math.ceil(wait))
+        return response
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return RateLimitMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
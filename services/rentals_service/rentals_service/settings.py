@@ -1,4 +1,6 @@
 import os
+import sys
+from importlib.util import find_spec
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -10,6 +12,7 @@ def env_bool(name, default=False):
 
 SECRET_KEY = os.getenv("RENTALS_SECRET_KEY", "dev-rentals-secret-key")
 DEBUG = env_bool("DEBUG", False)
+TESTING = sys.argv[1:2] == ["test"]
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "*").split(",")
 
 INSTALLED_APPS = [
@@ -25,6 +28,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "rentals_service.metrics.MetricsMiddleware",
+    "rentals_service.payloads.PayloadMiddleware",
+    "rentals_service.tracing.RequestIdMiddleware",
+    "rentals_service.profiling.ProfilingMiddleware",
+    "rentals_service.querylog.QueryInspectorMiddleware",
+    "rentals_service.dbrouting.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -32,6 +41,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "rentals_service.ratelimit.RateLimitMiddleware",
+    "rentals_service.admission.AdmissionMiddleware",
 ]
 
 ROOT_URLCONF = "rentals_service.urls"
@@ -63,17 +74,65 @@ if os.getenv("DB_ENGINE", "postgres") == "postgres":
             "PASSWORD": os.getenv("POSTGRES_PASSWORD", "rentals"),
             "HOST": os.getenv("POSTGRES_HOST", "db_rentals"),
             "PORT": os.getenv("POSTGRES_PORT", "5432"),
-            "CONN_MAX_AGE": 60,
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
         }
     }
 else:
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
-            "NAME": BASE_DIR / "db.sqlite3",
+            "NAME": os.getenv("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {"timeout": 20},
+            # File-backed test DB so worker processes in the job tests share it
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
         }
     }
 
+# Connection pooling: DB_POOL=true keeps a psycopg pool per worker instead of one
+# CONN_MAX_AGE connection: DB_POOL_MIN_SIZE opened up front, at most DB_POOL_MAX_SIZE,
+# each checked on checkout and replaced after DB_POOL_MAX_LIFETIME seconds.
+if env_bool("DB_POOL", False) and DATABASES["default"]["ENGINE"].endswith("postgresql"):
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True  # Django passes check_connection to the pool
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "4")),
+            "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+            "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "5")),
+        }
+    }
+
+# Read replicas (rentals_service.dbrouting): comma-separated host[:port] for Postgres,
+# or SQLite file paths with DB_ENGINE=sqlite.
+for _i, _replica in enumerate(r.strip() for r in os.getenv("DB_REPLICAS", "").split(",") if r.strip()):
+    _db = {**DATABASES["default"], "CONN_HEALTH_CHECKS": True, "TEST": {"MIRROR": "default"}}
+    if _db["ENGINE"].endswith("sqlite3"):
+        _db["NAME"] = _replica
+    else:
+        _db["HOST"], _, _port = _replica.partition(":")
+        _db["PORT"] = _port or _db["PORT"]
+    DATABASES[f"replica_{_i}"] = _db
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith("replica_")]
+if TESTING:
+    # Routing tests opt in with override_settings(DATABASE_REPLICAS=["replica"]).
+    DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+DATABASE_ROUTERS = ["rentals_service.dbrouting.ReplicaRouter"]
+REPLICA_READ_VIEWS = {"api_cars", "api_car_detail", "api_favorites"}
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "10"))
+REPLICA_PIN_CACHE = "default"
+REPLICA_RETRY_SECONDS = int(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+# Shared across workers when CACHE_BACKEND/CACHE_LOCATION point at e.g. a file cache
+# directory or memcached; replica pins need that once there is more than one worker.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator", "OPTIONS": {"min_length": 9}},
@@ -92,6 +151,148 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Resized car image variants (rentals_api.imaging)
+IMAGE_PIPELINE_ASYNC = env_bool("IMAGE_PIPELINE_ASYNC", True)
+# "pool": in-process ProcessPoolExecutor; "jobs": durable job queue (run_worker)
+IMAGE_PIPELINE_BACKEND = os.getenv("IMAGE_PIPELINE_BACKEND", "pool")
+IMAGE_PIPELINE_WORKERS = int(os.getenv("IMAGE_PIPELINE_WORKERS", "2"))
+
+# Resumable chunked uploads (rentals_api.uploads)
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", "900"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Enforced by the chunk endpoint itself; DATA_UPLOAD_MAX_MEMORY_SIZE keeps Django's default elsewhere
+UPLOAD_MAX_CHUNK_BYTES = UPLOAD_CHUNK_BYTES * 4
+
+# Background jobs (rentals_api.jobs / manage.py run_worker)
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+JOBS_RETRY_BASE_SECONDS = float(os.getenv("JOBS_RETRY_BASE_SECONDS", "2"))
+JOBS_RETRY_MAX_SECONDS = float(os.getenv("JOBS_RETRY_MAX_SECONDS", "600"))
+JOBS_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOBS_LOCK_TIMEOUT_SECONDS", "900"))
+
+# Rows deleted per transaction when purging a soft-deleted car
+CAR_PURGE_BATCH_SIZE = int(os.getenv("CAR_PURGE_BATCH_SIZE", "500"))
+
+# Idempotency-Key on booking, favorite and dealer car POSTs (rentals_api.idempotency)
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "5"))
+IDEMPOTENCY_POLL_SECONDS = float(os.getenv("IDEMPOTENCY_POLL_SECONDS", "0.05"))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_PURGE_BATCH_SIZE = int(os.getenv("IDEMPOTENCY_PURGE_BATCH_SIZE", "1000"))
+
+# Metrics (/metrics, Prometheus text format)
+METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+# Shared by all gunicorn workers of this service so a scrape sees their combined totals
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+# Tracing: X-Request-ID propagation and span records (see rentals_service.tracing)
+SERVICE_NAME = "rentals"
+TRACE_SPANS = env_bool("TRACE_SPANS", False)
+# Append span records (JSON lines) here; empty = log them to stdout
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_SQL_THRESHOLD_MS = float(os.getenv("TRACE_SQL_THRESHOLD_MS", "25"))
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"raw": {"format": "%(message)s"}},
+    "handlers": {"spans": {"class": "logging.StreamHandler", "formatter": "raw"}},
+    "loggers": {
+        "spans": {"handlers": ["spans"], "level": "INFO", "propagate": False},
+        "rentals_service.warmup": {"handlers": ["spans"], "level": "INFO", "propagate": False},
+    },
+}
+
+# SQL instrumentation (rentals_service.querylog): slow statements, N+1 shapes, per-view budgets.
+# "raise" under DEBUG and in tests, "warn" in production, or "off".
+DB_N_PLUS_ONE_MODE = os.getenv("DB_N_PLUS_ONE_MODE", "raise" if DEBUG or TESTING else "warn")
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "8"))
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+DB_QUERY_BUDGETS = {
+    "api_cars": 4,
+    "api_car_detail": 5,
+    "api_favorites": 3,
+    "api_bookings_mine": 2,
+    "api_dealer_dashboard": 8,
+}
+
+# Profiling (rentals_service.profiling, manage.py profiles)
+PROFILING_DIR = os.getenv("PROFILING_DIR", f"/tmp/profiles/{SERVICE_NAME}")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+# Keep at most this many profiles; older ones are deleted as new ones land
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
+# Shared by all services so the gateway can forward X-Profile upstream.
+# Empty (the default) turns header-triggered profiling off.
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILING_TOKEN_MAX_AGE = int(os.getenv("PROFILING_TOKEN_MAX_AGE", "3600"))
+
+# Start-up warm-up (rentals_service.warmup, gunicorn.conf.py)
+STARTUP_WARMUP = env_bool("STARTUP_WARMUP", True)
+
+# Health endpoints (rentals_service.health): /healthz and /readyz
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "2"))
+
+# Response encodings (rentals_service.payloads): MessagePack via Accept, zstd/gzip via Accept-Encoding
+PAYLOAD_COMPRESS_MIN_BYTES = int(os.getenv("PAYLOAD_COMPRESS_MIN_BYTES", "1024"))
+PAYLOAD_GZIP_LEVEL = int(os.getenv("PAYLOAD_GZIP_LEVEL", "5"))
+PAYLOAD_ZSTD_LEVEL = int(os.getenv("PAYLOAD_ZSTD_LEVEL", "3"))
+
+# Rate limiting (rentals_service.ratelimit): token buckets per client and route class
+RATE_LIMIT_ENABLED = env_bool("RATE_LIMIT_ENABLED", True)
+# Requests per second and burst per client; override with RATE_LIMIT_<CLASS>="rate,burst"
+RATE_LIMITS = {
+    name: tuple(float(v) for v in os.getenv(f"RATE_LIMIT_{name.upper()}", default).split(","))
+    for name, default in {"browse": "10,60", "booking": "0.5,10", "dealer_write": "2,40"}.items()
+}
+RATE_LIMIT_ROUTES = {
+    "api_cars": "browse",
+    "api_car_detail": "browse",
+    "api_booking_create": "booking",
+    "api_favorites_toggle": "booking",
+    "api_dealer_apply": "dealer_write",
+    "POST api_dealer_cars": "dealer_write",
+    "PATCH api_dealer_car_update": "dealer_write",
+    "DELETE api_dealer_car_update": "dealer_write",
+    "api_dealer_car_price": "dealer_write",
+    "api_dealer_upload_create": "dealer_write",
+    "api_dealer_booking_status": "dealer_write",
+}
+# "rentals_service.ratelimit.CacheStore" shares the buckets through RATE_LIMIT_CACHE (e.g. Redis)
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "rentals_service.ratelimit.LocalStore")
+RATE_LIMIT_CACHE = os.getenv("RATE_LIMIT_CACHE", "default")
+# Anonymous clients are keyed by the X-Forwarded-For entry the gateway (or the ingress) adds
+RATE_LIMIT_NUM_PROXIES = int(os.getenv("RATE_LIMIT_NUM_PROXIES", "1"))
+
+# Admission control (rentals_service.admission): adaptive concurrency limits and deadlines
+ADMISSION_ENABLED = env_bool("ADMISSION_ENABLED", True)
+# Highest priority first: a class is shed while one above it is at its limit. A class's
+# limit shrinks when its responses take longer than target_ms, never below min.
+ADMISSION_CLASSES = {
+    "booking": {"target_ms": float(os.getenv("ADMISSION_BOOKING_TARGET_MS", "1000")), "min": 4},
+    "user": {"target_ms": float(os.getenv("ADMISSION_USER_TARGET_MS", "500")), "min": 2},
+    "browse": {"target_ms": float(os.getenv("ADMISSION_BROWSE_TARGET_MS", "250")), "min": 1},
+}
+ADMISSION_INITIAL_LIMIT = int(os.getenv("ADMISSION_INITIAL_LIMIT", "20"))
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", "100"))
+ADMISSION_BACKOFF = float(os.getenv("ADMISSION_BACKOFF", "0.9"))
+ADMISSION_ROUTES = {
+    "api_booking_create": "booking",
+    "api_cars": "browse",
+    "api_car_detail": "browse",
+    "api_bookings_mine": "user",
+    "api_favorites": "user",
+    "api_favorites_toggle": "user",
+    "api_dealer_apply": "user",
+    "api_dealer_dashboard": "user",
+    "api_dealer_cars": "user",
+    "api_dealer_car_update": "user",
+    "api_dealer_car_price": "user",
+    "api_dealer_car_bookings": "user",
+    "api_dealer_booking_status": "user",
+}
+# Browsing with a token is a signed-in user's request, not anonymous browsing
+ADMISSION_SIGNED_IN = {"browse": "user"}
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
@@ -101,6 +302,10 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.AllowAny",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ) + (("rentals_service.payloads.MessagePackRenderer",) if find_spec("msgpack") else ()),
 }
 
 ACCOUNTS_JWT_SECRET = os.getenv("ACCOUNTS_JWT_SECRET", SECRET_KEY)